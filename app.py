@@ -15,7 +15,7 @@ Security Notice:
 - See SECURITY.md for security considerations
 """
 
-from flask import Flask, render_template, request, jsonify, redirect, g
+from flask import Flask, render_template, request, jsonify, redirect, g, Response
 from flask_cors import CORS
 import m3u8
 import requests
@@ -23,12 +23,12 @@ import urllib3
 import subprocess
 import json
 import re
+import copy
 from urllib.parse import urljoin, urlparse
 import os
 import time
 import threading
 from datetime import datetime
-import psutil
 import logging
 
 # Import optimizations
@@ -36,38 +36,64 @@ from optimizations import (
     OptimizedHTTPSession, 
     timed_cache, 
     check_segments_concurrent,
-    CircularBuffer,
     optimized_ffprobe,
+    download_segment,
     process_segments_batch,
     performance_monitor,
-    AdaptiveRefresh,
-    cleanup_resources
+    cleanup_resources,
+    TTLCache
 )
+from monitor import MonitorEngine, HISTORY_COLUMNS
+from fetch_engine import AsyncFetchEngine
+from transport import dns_cache
+from config import config
+from monitor_service import MonitorService
+from service_ipc import ServiceClient
+from metrics_log import MetricsLog
+from system_sampler import SystemSampler
+from metrics_exporter import MetricsExporter, CONTENT_TYPE as METRICS_CONTENT_TYPE, define_metrics
+from events import EventBroker, format_sse
+from renditions import analyze_renditions
+from probe_service import ProbeService
+from media_parser import parse_segment
 
-# Disable SSL warnings
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+# Unverified HTTPS is the default for HLS streams; don't warn on every request
+if not config.VERIFY_SSL:
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Configure logging for better performance monitoring
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=config.LOG_LEVEL, format=config.LOG_FORMAT)
 
 app = Flask(__name__)
+app.config.update(
+    MAX_CONTENT_LENGTH=config.MAX_CONTENT_LENGTH,
+    SEND_FILE_MAX_AGE_DEFAULT=config.SEND_FILE_MAX_AGE_DEFAULT
+)
 CORS(app)  # Enable CORS for all routes
 
-# Global storage for live metrics (optimized)
-live_metrics = {
-    'current_playlist': None,
-    'segments': CircularBuffer(maxsize=100),  # Use circular buffer to limit memory
-    'stats': {
-        'total_segments': 0,
-        'failed_segments': 0,
-        'avg_bitrate': 0,
-        'avg_frame_rate': 0,
-        'total_duration': 0
-    },
-    'history': CircularBuffer(maxsize=50),  # Limit history size
-    'last_updated': None,
-    'adaptive_refresh': AdaptiveRefresh()
-}
+# Tuning settings (monitor, probes, events, history) live in config.py;
+# values read per call pick up reloads, the rest via apply_runtime_config
+EVENTS_TOPICS = ('performance', 'system')  # Non-stream topics clients may subscribe to
+EVENTS_RETRY_AFTER = 30  # Seconds a refused SSE client polls before trying again
+
+# Each SSE client holds a worker thread for its whole connection
+events_slots = threading.BoundedSemaphore(config.EVENTS_MAX_CLIENTS)
+
+METRICS_LOG_DIR = os.environ.get('HLS_METRICS_DIR')  # Unset: history stays in memory only
+
+# Process role: 'all' (default) polls and serves in one process; in production
+# one 'poller' process owns all stream state and 'web' workers query it
+SERVICE_ROLE = os.environ.get('HLS_ROLE', 'all')
+POLLER_ADDRESS = os.environ.get('HLS_POLLER_ADDRESS', '127.0.0.1:8182')  # host:port or Unix socket path
+POLLER_AUTHKEY = os.environ.get('HLS_POLLER_AUTHKEY', '').encode()
+if SERVICE_ROLE not in ('all', 'web', 'poller'):
+    raise RuntimeError(f"HLS_ROLE must be 'all', 'web' or 'poller', not {SERVICE_ROLE!r}")
+if SERVICE_ROLE != 'all' and not POLLER_AUTHKEY:
+    raise RuntimeError('HLS_POLLER_AUTHKEY must be set when web and poller processes are split')
+
+# Prometheus metrics: updated where the work happens, rendered from cache on scrape
+exporter = MetricsExporter(namespace='hls')
+define_metrics(exporter)
 
 # Add JSON filter for templates
 @app.template_filter('tojson')
@@ -82,14 +108,46 @@ def is_valid_url(url):
     except:
         return False
 
-@timed_cache(seconds=300)  # Cache for 5 minutes
-def get_ffprobe_info(segment_url):
-    """Get video and audio info from segment using ffprobe (optimized)"""
+@timed_cache(seconds=config.INIT_SECTION_CACHE_TTL, max_bytes=16 * 1024 * 1024)
+def get_init_section(init_url, byterange=None):
+    """Download an EXT-X-MAP initialization section (cached, shared by all segments)"""
+    headers = None
+    if byterange:
+        length, _, offset = byterange.partition('@')
+        offset, length = int(offset or 0), int(length)
+        # Ask for the init bytes only: the map often shares a file with the media
+        headers = {'Range': f'bytes={offset}-{offset + length - 1}'}
+    download = download_segment(init_url, headers=headers)
+    if download.status_code not in (200, 206):
+        raise Exception(f"HTTP {download.status_code} when downloading init section")
+    body = download.body
+    if byterange and download.status_code == 200:
+        # Range ignored: the origin sent the whole file
+        body = body[offset:offset + length]
+    return body
+
+@timed_cache(seconds=config.CACHE_TTL)
+def get_ffprobe_info(segment_url, init_url=None, init_byterange=None):
+    """Get video and audio info from segment, parsed in-process with ffprobe as fallback"""
     start_time = time.time()
+    download = None
+    analyzer = None
     
     try:
-        # Use optimized ffprobe function
-        data = optimized_ffprobe(segment_url)
+        # Download once through the pooled session and analyze from memory,
+        # so nothing transfers the segment a second time
+        download = download_segment(segment_url)
+        if download.status_code != 200:
+            raise Exception(f"HTTP {download.status_code} when downloading segment")
+        init_data = get_init_section(init_url, init_byterange) if init_url else None
+        
+        # Routine checks never fork: the header parser handles TS and fMP4,
+        # ffprobe only runs for segments it can't decide on
+        data = parse_segment(download.body, init_data)
+        analyzer = 'parser'
+        if data is None:
+            data = optimized_ffprobe(init_data + download.body if init_data else download.body)
+            analyzer = 'ffprobe'
         
         if data:
             # Extract stream info
@@ -165,7 +223,7 @@ def get_ffprobe_info(segment_url):
                 total_bitrate = int(format_info['bit_rate'])
             else:
                 # Estimate from file size and duration
-                size = format_info.get('size')
+                size = format_info.get('size') or download.size
                 duration = format_info.get('duration')
                 if size and duration:
                     try:
@@ -183,22 +241,35 @@ def get_ffprobe_info(segment_url):
                 'width': video_info['width'],
                 'height': video_info['height'],
                 'frame_rate': video_info['frame_rate'],
-                'bitrate': total_bitrate or video_info['bitrate']
+                'bitrate': total_bitrate or video_info['bitrate'],
+                'start_time': float(format_info['start_time']) if format_info.get('start_time') else None,
+                'analyzer': analyzer,
+                'download': download.get_metrics()
             }
             
-            performance_monitor.record_cache_hit()
             return result
         else:
-            logging.warning(f"ffprobe returned no data for {segment_url}")
+            logging.warning(f"No media info for {segment_url} from parser or ffprobe")
             
     except Exception as e:
         logging.error(f"Error getting ffprobe info: {e}")
     finally:
         duration = time.time() - start_time
-        performance_monitor.record_request_time(duration)
+        performance_monitor.record_latency('probe', duration)
+        exporter.observe('probe_duration_seconds', {'analyzer': analyzer or 'failed'}, duration)
     
-    performance_monitor.record_cache_miss()
-    return get_fallback_info()
+    fallback = get_fallback_info()
+    if download is not None:
+        fallback['download'] = download.get_metrics()
+    return fallback
+
+# Persistent probe pool: request handlers and polls never run ffprobe inline
+probe_service = ProbeService(
+    get_ffprobe_info,
+    workers=config.PROBE_WORKERS,
+    max_queue=config.PROBE_MAX_QUEUE,
+    max_age=config.PROBE_MAX_AGE
+)
 
 def get_fallback_info():
     """Fallback video and audio info when ffprobe fails"""
@@ -279,38 +350,46 @@ def live_monitor(playlist_url):
     import urllib.parse
     decoded_url = urllib.parse.unquote(playlist_url)
     print(f"Starting live monitoring session")
-    return render_template('live.html', playlist_url=decoded_url)
+    return render_template('live.html', playlist_url=decoded_url,
+                           max_chart_points=config.MAX_CHART_DATA_POINTS)
 def live_monitor(playlist_url):
     """Live monitoring page for a playlist"""
     print(f"Live monitor requested")
     import urllib.parse
     decoded_url = urllib.parse.unquote(playlist_url)
     print(f"Starting live monitoring session")
-    return render_template('live.html', playlist_url=decoded_url)
+    return render_template('live.html', playlist_url=decoded_url,
+                           max_chart_points=config.MAX_CHART_DATA_POINTS)
 
-@app.route('/api/live-metrics/<path:playlist_url>')
-def get_live_metrics(playlist_url):
-    """API endpoint for live metrics (optimized)"""
+def collect_live_metrics(playlist_url, stream):
+    """Fetch and analyze a playlist, returning a live metrics snapshot.
+
+    Runs on the background monitor workers with the stream's own state;
+    raises on failure.
+    """
     start_time = time.time()
     
     try:
-        # Decode the URL
-        import urllib.parse
-        playlist_url = urllib.parse.unquote(playlist_url)
         logging.info(f"Processing live metrics for: {playlist_url}")
         
-        # Use optimized session
-        session = OptimizedHTTPSession().get_session()
+        # Use optimized session (conditional requests, cached parse when unchanged)
+        http = OptimizedHTTPSession()
         
         logging.info("Fetching playlist...")
-        response = session.get(playlist_url, timeout=(5, 10))
-        logging.info(f"HTTP Status: {response.status_code}")
+        response = http.get_playlist(playlist_url, timeout=(5, 10))
+        logging.info(f"HTTP Status: {response.status_code} (unchanged: {response.from_cache})")
         
         if response.status_code != 200:
             raise Exception(f"HTTP {response.status_code} when fetching playlist")
         
-        # Parse with m3u8
-        playlist = m3u8.loads(response.text)
+        # Fast parser on the hot path; renditions need m3u8's full master model
+        playlist = response.playlist
+        performance_monitor.record_latency('playlist_fetch', response.elapsed)
+        exporter.observe('playlist_fetch_seconds', {
+            'stream': playlist_url, 'playlist': 'master' if playlist.is_variant else 'media'
+        }, response.elapsed)
+        if playlist.is_variant and stream.all_variants:
+            playlist = response.parse(full=True)
         logging.info(f"Playlist loaded successfully. Is variant: {playlist.is_variant}")
         
         analysis_url = playlist_url
@@ -331,20 +410,75 @@ def get_live_metrics(playlist_url):
                 variant_url = urljoin(playlist_url, first_variant.uri)
                 
                 # Load variant with optimized session
-                variant_response = session.get(variant_url, timeout=(5, 10))
+                variant_response = http.get_playlist(variant_url, timeout=(5, 10))
+                performance_monitor.record_latency('variant_fetch', variant_response.elapsed)
+                exporter.observe('playlist_fetch_seconds', {
+                    'stream': playlist_url, 'playlist': 'media'
+                }, variant_response.elapsed)
                 if variant_response.status_code == 200:
-                    playlist = m3u8.loads(variant_response.text)
+                    playlist = variant_response.playlist
                     analysis_url = variant_url
                 else:
                     logging.warning(f"Failed to load variant: HTTP {variant_response.status_code}")
         
-        # Analyze first segment for video details (cached)
+        # Per-rendition health for the whole ladder, bounded by one target duration
+        renditions = None
+        if original_playlist.is_variant and stream.all_variants:
+            previous = stream.snapshot or {}
+            budget = previous.get('target_duration') or playlist.target_duration or config.RENDITION_CHECK_TIMEOUT
+            renditions = analyze_renditions(
+                playlist_url, original_playlist, timeout=budget,
+                sample_bytes=config.THROUGHPUT_SAMPLE_BYTES, full_fraction=config.THROUGHPUT_FULL_FRACTION,
+                sample_share=config.THROUGHPUT_SAMPLE_SHARE
+            )
+            # Renditions dropped from the ladder stop being exported
+            current = {rendition['url'] for rendition in renditions['renditions']}
+            for rendition in previous.get('renditions') or ():
+                if rendition['url'] not in current:
+                    exporter.remove('rendition', rendition['url'], stream=playlist_url)
+            for rendition in renditions['renditions']:
+                throughput = rendition['throughput']
+                if not throughput or not (throughput['bytes'] or throughput['timed_out']):
+                    continue
+                labels = {'stream': playlist_url, 'rendition': rendition['url'], 'mode': throughput['mode']}
+                exporter.set('rendition_throughput_mbps', labels, throughput['throughput_mbps'])
+                if throughput['ttfb_ms'] is not None:
+                    exporter.observe('rendition_ttfb_seconds', {'stream': playlist_url}, throughput['ttfb_ms'] / 1000)
+                if throughput['bandwidth_ratio'] is not None:
+                    exporter.set('rendition_bandwidth_ratio', labels, throughput['bandwidth_ratio'])
+        
+        # Probe the live-edge segment on the probe pool; the poll uses the latest
+        # finished probe and only waits while the stream has none at all
         master_video_info = None
         if playlist.segments:
             base_url = analysis_url.rsplit('/', 1)[0] + '/'
-            first_segment_url = urljoin(base_url, playlist.segments[0].uri)
-            logging.info("Analyzing first segment...")
-            master_video_info = get_ffprobe_info(first_segment_url)
+            live_edge_url = urljoin(base_url, playlist.segments[-1].uri)
+            
+            def remember_media_info(job):
+                if job.result is not None and job.result is not stream.media_info:
+                    download = job.result.get('download') or {}
+                    if download.get('ttfb_ms'):
+                        exporter.observe('segment_ttfb_seconds', {'stream': playlist_url}, download['ttfb_ms'] / 1000)
+                    stream.media_info = job.result
+            
+            # fMP4 segments need their EXT-X-MAP init section to be parsed
+            init_section = getattr(playlist.segments[-1], 'init_section', None)
+            probe_options = None
+            if init_section is not None and init_section.uri:
+                probe_options = {
+                    'init_url': urljoin(base_url, init_section.uri),
+                    'init_byterange': init_section.byterange
+                }
+            
+            job = probe_service.submit(
+                live_edge_url, priority=ProbeService.PRIORITY_LIVE_EDGE,
+                callback=remember_media_info, options=probe_options
+            )
+            if stream.media_info is None:
+                job.wait(config.FIRST_PROBE_WAIT)
+            
+            # Copy: probe results are shared between polls and streams
+            master_video_info = copy.deepcopy(stream.media_info) if stream.media_info else get_fallback_info()
             
             # Use master playlist bitrate if available and ffprobe didn't find one
             if master_bitrate > 0:
@@ -367,16 +501,30 @@ def get_live_metrics(playlist_url):
                     master_video_info['video']['bitrate'] = max(0, int(estimated_video_bitrate))
                     logging.info(f"Estimated video bitrate: {master_video_info['video']['bitrate']}, audio bitrate: {master_video_info['audio']['bitrate']}")
         
-        # Fallback if analysis failed
+        # Fallback if the playlist had no segments
         if not master_video_info:
             master_video_info = get_fallback_info()
         
         # Analyze recent segments with batching (optimized)
         base_url = analysis_url.rsplit('/', 1)[0] + '/'
-        recent_segments = playlist.segments[-5:] if len(playlist.segments) > 5 else playlist.segments
+        tracker = stream.playlist_tracker
+        new_segments = tracker.update(
+            playlist.media_sequence, playlist.segments, source=analysis_url,
+            target_duration=playlist.target_duration, ended=playlist.is_endlist
+        )
+        
+        # Only segments appended since the last poll need checking
+        to_check = new_segments[-config.MAX_CONCURRENT_SEGMENTS:]
+        if to_check:
+            tracker.record_results(to_check, process_segments_batch(to_check, base_url))
+            for entry in to_check:
+                if entry.response_time:
+                    performance_monitor.record_latency('segment_head', entry.response_time / 1000)
+                    exporter.observe('segment_response_seconds', {'stream': playlist_url}, entry.response_time / 1000)
         
-        # Use optimized batch processing
-        segment_results = process_segments_batch(recent_segments, base_url, batch_size=3)
+        segment_results = [
+            entry.to_dict(i + 1) for i, entry in enumerate(tracker.recent(config.RECENT_SEGMENTS_WINDOW))
+        ]
         
         # Calculate statistics
         success_count = sum(1 for seg in segment_results if seg['status_code'] == 200)
@@ -384,16 +532,20 @@ def get_live_metrics(playlist_url):
         success_rate = (success_count / len(segment_results)) * 100 if segment_results else 0
         
         # Record success rate for adaptive refresh
-        live_metrics['adaptive_refresh'].record_success_rate(success_rate)
+        stream.adaptive_refresh.record_success_rate(success_rate)
         
         live_data = {
             'timestamp': datetime.now().isoformat(),
             'total_segments': len(playlist.segments),
+            'target_duration': playlist.target_duration,
+            'is_endlist': playlist.is_endlist,
             'recent_segments': segment_results,
+            'playlist_tracking': tracker.get_stats(),
+            'segment_download': master_video_info.get('download'),
             'stats': {
                 'avg_duration': total_duration / len(segment_results) if segment_results else 0,
                 'success_rate': success_rate,
-                'total_duration': sum(seg.duration for seg in playlist.segments),
+                'total_duration': tracker.window_duration,
                 'avg_bitrate': master_video_info['total_bitrate'] if master_video_info['total_bitrate'] > 0 else master_bitrate,
                 'video_bitrate': master_video_info['video']['bitrate'],
                 'audio_bitrate': master_video_info['audio']['bitrate']
@@ -416,26 +568,205 @@ def get_live_metrics(playlist_url):
                 'channel_layout': f"{master_video_info['audio']['channels']} ch" if master_video_info['audio']['channels'] > 0 else "Unknown"
             },
             'performance': {
-                'recommended_refresh_interval': live_metrics['adaptive_refresh'].get_optimal_interval()
+                'recommended_refresh_interval': stream.adaptive_refresh.get_optimal_interval()
             }
         }
-        
-        # Store in circular buffer
-        live_metrics['segments'].append(live_data)
-        live_metrics['last_updated'] = datetime.now()
+        if renditions is not None:
+            live_data['renditions'] = renditions['renditions']
+            live_data['renditions_summary'] = renditions['summary']
         
         processing_time = time.time() - start_time
         performance_monitor.record_request_time(processing_time)
         
+        labels = {'stream': playlist_url}
+        exporter.set('stream_success_ratio', labels, success_rate / 100)
+        exporter.set('stream_media_sequence', labels, tracker.last_sequence or 0)
+        exporter.set('stream_missed_segments', labels, tracker.missed_segments)
+        playlist_age = tracker.playlist_age()
+        if playlist_age is not None:
+            exporter.set('stream_playlist_age_seconds', labels, round(playlist_age, 3))
+            if playlist.target_duration:
+                exporter.set('stream_media_sequence_lag', labels, round(playlist_age / playlist.target_duration, 3))
+        if tracker.edge_latency is not None:
+            exporter.set('stream_edge_latency_seconds', labels, round(tracker.edge_latency, 3))
+        if tracker.update_interval_ewma is not None:
+            exporter.set('stream_update_interval_seconds', labels, round(tracker.update_interval_ewma, 3))
+        exporter.set('stream_stale', labels, int(tracker.stale))
+        exporter.set('stream_stale_events_total', labels, tracker.stale_events)
+        exporter.inc('stream_polls_total', {'stream': playlist_url, 'result': 'ok'})
+        
         logging.info(f"Live metrics processed in {processing_time:.2f}s. Success rate: {success_rate:.1f}%")
-        return jsonify(live_data)
+        return live_data
         
-    except Exception as e:
+    except Exception:
+        exporter.inc('stream_polls_total', {'stream': playlist_url, 'result': 'error'})
         performance_monitor.increment_error()
-        logging.error(f"Error in live-metrics: {str(e)}")
-        processing_time = time.time() - start_time
-        performance_monitor.record_request_time(processing_time)
-        return jsonify({'error': str(e), 'processing_time': processing_time})
+        performance_monitor.record_request_time(time.time() - start_time)
+        raise
+
+# Background monitor: one polling loop per playlist URL
+# Push updates: one SSE connection per browser, topics multiplexed on it
+event_broker = EventBroker()
+
+# Host/process metrics are sampled on one background thread, not per request
+system_sampler = SystemSampler(
+    interval=config.SYSTEM_METRICS_INTERVAL,
+    history=int(3600 / config.SYSTEM_METRICS_INTERVAL),  # One hour
+    enabled=config.ENABLE_SYSTEM_METRICS,
+    on_sample=lambda sample: performance_monitor.record_memory_usage(sample['memory']['percent'])
+)
+
+# Opt-in on-disk history: written only when HLS_METRICS_DIR is set
+metrics_log = MetricsLog(METRICS_LOG_DIR, HISTORY_COLUMNS) if METRICS_LOG_DIR else None
+
+stream_monitor = MonitorEngine(
+    collect_live_metrics,
+    idle_timeout=config.STREAM_IDLE_TIMEOUT,
+    max_workers=config.MONITOR_POLL_WORKERS,
+    first_poll_spread=config.MONITOR_FIRST_POLL_SPREAD,
+    broker=event_broker,
+    metrics_log=metrics_log,
+    on_remove=lambda url: exporter.remove('stream', url)
+)
+
+# Routes read state through the service: in-process by default, over a
+# local socket from web workers when a dedicated poller process runs it
+if SERVICE_ROLE == 'web':
+    monitor_service = ServiceClient(POLLER_ADDRESS, POLLER_AUTHKEY)
+else:
+    monitor_service = MonitorService(
+        stream_monitor, event_broker, probe_service, exporter, system_sampler,
+        metrics_log=metrics_log,
+        first_snapshot_timeout=config.FIRST_SNAPSHOT_TIMEOUT,
+        stats_interval=config.EVENTS_STATS_INTERVAL,
+        periodic_topics=EVENTS_TOPICS,
+        client_timeout=config.EVENTS_KEEPALIVE * 4
+    )
+
+# Concurrent dashboards reading the same stream share one service call and
+# one serialization, then the body for LIVE_METRICS_CACHE_TTL seconds
+live_metrics_cache = TTLCache(ttl=config.LIVE_METRICS_CACHE_TTL, maxsize=1000, name='live_metrics')
+performance_monitor.register_cache(live_metrics_cache)
+
+def apply_runtime_config(changed=None):
+    """Push reloadable settings into the running components; polls keep going"""
+    stream_monitor.idle_timeout = config.STREAM_IDLE_TIMEOUT
+    stream_monitor.first_poll_spread = config.MONITOR_FIRST_POLL_SPREAD
+    probe_service.max_queue = config.PROBE_MAX_QUEUE
+    probe_service.max_age = config.PROBE_MAX_AGE
+    system_sampler.interval = config.SYSTEM_METRICS_INTERVAL
+    system_sampler.enabled = config.ENABLE_SYSTEM_METRICS
+    if not system_sampler.enabled:
+        system_sampler.stop()
+    for histogram in list(performance_monitor.latency.values()):
+        histogram.window = config.LATENCY_WINDOW
+    get_ffprobe_info.cache.ttl = config.CACHE_TTL
+    get_init_section.cache.ttl = config.INIT_SECTION_CACHE_TTL
+    live_metrics_cache.ttl = config.LIVE_METRICS_CACHE_TTL
+    logging.getLogger().setLevel(config.LOG_LEVEL)
+    if isinstance(monitor_service, MonitorService):
+        monitor_service.first_snapshot_timeout = config.FIRST_SNAPSHOT_TIMEOUT
+        monitor_service.stats_interval = config.EVENTS_STATS_INTERVAL
+        monitor_service.client_timeout = config.EVENTS_KEEPALIVE * 4
+
+# Every process (poller and each web worker) follows edits to HLS_CONFIG_FILE
+config.on_reload(apply_runtime_config)
+config.watch()
+
+@app.route('/api/live-metrics/<path:playlist_url>')
+def get_live_metrics(playlist_url):
+    """API endpoint for live metrics (served from the background monitor).
+
+    Pass ``?all_variants=1`` to switch the stream to per-rendition analysis.
+    """
+    import urllib.parse
+    playlist_url = urllib.parse.unquote(playlist_url)
+    
+    all_variants = request.args.get('all_variants', '').lower() in ('1', 'true', 'yes')
+    key = (playlist_url, all_variants)
+    body = live_metrics_cache.get_or_load(key, lambda: load_live_metrics(playlist_url, all_variants))
+    if body is None:
+        # Still pending: let the next request ask again instead of caching it
+        live_metrics_cache.invalidate(key)
+        return jsonify({'error': 'Stream is being analyzed, first snapshot not ready yet', 'pending': True})
+    return app.response_class(body, mimetype=app.json.mimetype)
+
+def load_live_metrics(playlist_url, all_variants):
+    """Serialized live metrics, or None while the first poll runs"""
+    response = monitor_service.live_metrics(playlist_url, all_variants=all_variants)
+    return None if response is None else app.json.dumps(response)
+
+@app.route('/api/monitored-streams', methods=['GET', 'POST'])
+def monitored_streams():
+    """List streams polled by the background monitor, or register a new one.
+
+    Streams registered through POST are pinned: they keep being polled even
+    when no dashboard is reading them (fleet mode).
+    """
+    if request.method == 'POST':
+        payload = request.get_json(silent=True) or request.form
+        urls = payload.get('playlist_urls') or [payload.get('playlist_url', '')]
+        if isinstance(urls, str):
+            urls = [urls]
+        all_variants = str(payload.get('all_variants', '')).lower() in ('1', 'true', 'yes')
+        
+        registered = []
+        for url in urls:
+            url = (url or '').strip()
+            if not is_valid_url(url):
+                return jsonify({'error': f'Invalid playlist URL: {url}'}), 400
+            registered.append(url)
+        return jsonify({'registered': monitor_service.register(registered, all_variants=all_variants)})
+    
+    return jsonify(monitor_service.list_streams())
+
+@app.route('/api/monitored-streams/<path:playlist_url>', methods=['GET', 'DELETE'])
+def monitored_stream(playlist_url):
+    """Inspect or stop a single monitored stream"""
+    import urllib.parse
+    playlist_url = urllib.parse.unquote(playlist_url)
+    
+    if request.method == 'DELETE':
+        return jsonify({'removed': monitor_service.unregister(playlist_url)})
+    
+    # ?seconds= limits the window, ?max_points= thins it for charts,
+    # ?persistent=1 reads the on-disk log (survives restarts) when enabled
+    history = monitor_service.stream_history(
+        playlist_url,
+        seconds=request.args.get('seconds', type=float),
+        max_points=request.args.get('max_points', default=500, type=int),
+        persistent=request.args.get('persistent', '').lower() in ('1', 'true', 'yes')
+    )
+    if history is None:
+        return jsonify({'error': 'Stream is not monitored'}), 404
+    return jsonify(history)
+
+@app.route('/api/history/<path:playlist_url>')
+def stream_history(playlist_url):
+    """Rolled-up metric history for charts.
+
+    ``?seconds=`` sets the window (default 1 hour), ``?resolution=`` picks
+    1m, 5m or 1h buckets (default: the finest that fits ``?max_points=``),
+    ``?metrics=a,b`` limits the metrics. Each bucket has count, min, max,
+    avg and p95, maintained incrementally as samples arrive.
+    """
+    import urllib.parse
+    playlist_url = urllib.parse.unquote(playlist_url)
+    
+    metrics = request.args.get('metrics')
+    try:
+        history = monitor_service.rollup_history(
+            playlist_url,
+            seconds=request.args.get('seconds', default=config.HISTORY_DEFAULT_SECONDS, type=float),
+            max_points=request.args.get('max_points', default=config.HISTORY_MAX_POINTS, type=int),
+            resolution=request.args.get('resolution'),
+            metrics=metrics.split(',') if metrics else None
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if history is None:
+        return jsonify({'error': 'Stream is not monitored'}), 404
+    return jsonify(history)
 
 @app.route('/api/test-url/<path:playlist_url>')
 def test_url(playlist_url):
@@ -481,9 +812,11 @@ def get_segment_details(segment_url):
         import urllib.parse
         segment_url = urllib.parse.unquote(segment_url)
         
-        # Get detailed analysis
-        ffprobe_info = get_ffprobe_info(segment_url)
+        # Get detailed analysis (bounded wait, shared with in-flight probes)
         status_code = check_segment_status(segment_url)
+        ffprobe_info, status = monitor_service.probe_segment(segment_url, config.SEGMENT_DETAILS_TIMEOUT)
+        if ffprobe_info is None:
+            return jsonify({'error': f'Segment analysis still running ({status})', 'pending': True})
         
         return jsonify({
             'url': segment_url,
@@ -502,75 +835,147 @@ def get_segment_details(segment_url):
 
 @app.route('/api/health-check')
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (also fails while the poller process is unreachable)"""
     try:
-        # Record memory usage
-        memory_usage = psutil.virtual_memory().percent
-        performance_monitor.record_memory_usage(memory_usage)
+        # Sampled in the background; a health probe costs no psutil calls
+        health = monitor_service.health()
         
         return jsonify({
             'status': 'healthy',
+            'role': SERVICE_ROLE,
             'timestamp': datetime.now().isoformat(),
-            'memory_usage': f"{memory_usage:.1f}%",
-            'performance': performance_monitor.get_stats()
+            'memory_usage': f"{health['memory_usage']:.1f}%",
+            'performance': health['performance']
         })
     except Exception as e:
-        return jsonify({'status': 'error', 'error': str(e)})
+        return jsonify({'status': 'error', 'error': str(e)}), 503
 
 @app.route('/api/system-metrics')
 def get_system_metrics():
-    """Get system performance metrics"""
+    """Get system performance metrics (``?history=<seconds>`` adds recent samples)"""
     try:
-        cpu_percent = psutil.cpu_percent(interval=0.1)
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
-        
-        # Network info (if available)
-        network_info = {}
-        try:
-            network_stats = psutil.net_io_counters()
-            network_info = {
-                'bytes_sent': network_stats.bytes_sent,
-                'bytes_recv': network_stats.bytes_recv,
-                'packets_sent': network_stats.packets_sent,
-                'packets_recv': network_stats.packets_recv
-            }
-        except:
-            pass
-        
-        return jsonify({
-            'cpu': {
-                'usage_percent': cpu_percent,
-                'count': psutil.cpu_count()
-            },
-            'memory': {
-                'total': memory.total,
-                'available': memory.available,
-                'percent': memory.percent,
-                'used': memory.used
-            },
-            'disk': {
-                'total': disk.total,
-                'used': disk.used,
-                'free': disk.free,
-                'percent': (disk.used / disk.total) * 100
-            },
-            'network': network_info,
-            'timestamp': datetime.now().isoformat()
-        })
+        return jsonify(monitor_service.system_metrics(request.args.get('history', type=float)))
     except Exception as e:
         return jsonify({'error': str(e)})
 
+@app.route('/api/config')
+def get_config():
+    """Effective settings, where overrides came from and changes waiting for a restart"""
+    return jsonify(monitor_service.config_info())
+
+@app.route('/api/config/reload', methods=['POST'])
+def reload_config():
+    """Re-read HLS_CONFIG_FILE and the environment now instead of waiting for the watcher"""
+    try:
+        if SERVICE_ROLE == 'web':
+            config.reload()  # This worker's request-path settings; the poller reloads its own
+        return jsonify(monitor_service.reload_config())
+    except (OSError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
 @app.route('/api/performance-stats')
 def get_performance_stats():
     """Get application performance statistics"""
-    stats = performance_monitor.get_stats()
-    stats['adaptive_refresh_interval'] = live_metrics['adaptive_refresh'].get_optimal_interval()
-    stats['cache_size'] = len(live_metrics['segments'])
-    stats['last_updated'] = live_metrics['last_updated'].isoformat() if live_metrics['last_updated'] else None
-    
+    stats = monitor_service.performance_stats(request.args.get('url'))
+    if SERVICE_ROLE == 'web':
+        # The poller doesn't serve /api/live-metrics: report this worker's coalescing cache
+        stats['caches'][live_metrics_cache.name] = dict(live_metrics_cache.get_stats(), worker_pid=os.getpid())
     return jsonify(stats)
 
+@app.route('/api/events')
+def event_stream():
+    """Server-Sent Events push stream.
+
+    ``?stream=<playlist url>`` (repeatable) subscribes to snapshot deltas of
+    monitored streams, ``?topic=performance`` / ``?topic=system`` to the
+    periodic stats. Every event carries its ``topic`` so one connection
+    serves all of them.
+    """
+    playlist_urls = [url for url in request.args.getlist('stream') if is_valid_url(url)]
+    topics = [topic for topic in request.args.getlist('topic') if topic in EVENTS_TOPICS]
+    all_variants = request.args.get('all_variants', '').lower() in ('1', 'true', 'yes')
+    if not playlist_urls and not topics:
+        return jsonify({'error': 'Subscribe to at least one stream or topic'}), 400
+    if not events_slots.acquire(blocking=False):
+        # Full: the client falls back to polling and retries after a while
+        response = jsonify({
+            'error': 'Too many event stream clients',
+            'retry': EVENTS_RETRY_AFTER
+        })
+        response.headers['Retry-After'] = str(EVENTS_RETRY_AFTER)
+        return response, 503
+    
+    try:
+        client_id = monitor_service.subscribe(playlist_urls, topics, all_variants=all_variants)
+    except Exception:
+        events_slots.release()
+        raise
+    
+    def generate():
+        yield 'retry: 3000\n\n'
+        while True:
+            # Full snapshots come first, on connect and after an overflow
+            messages = monitor_service.next_events(client_id, config.EVENTS_KEEPALIVE)
+            if not messages:
+                yield ': keepalive\n\n'
+                continue
+            for event, data, seq in messages:
+                yield format_sse(event, data, seq)
+    
+    def release():
+        # The server closes the response even if the generator never started
+        try:
+            monitor_service.unsubscribe(client_id)
+        finally:
+            events_slots.release()
+    
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    response.call_on_close(release)
+    return response
+
+def collect_app_metrics(exporter):
+    """Scrape-time gauges: a handful of values, independent of stream count"""
+    for cache in performance_monitor.caches:
+        labels = {'cache': cache.name}
+        exporter.set('cache_hits_total', labels, cache.hits)
+        exporter.set('cache_misses_total', labels, cache.misses)
+        lookups = cache.hits + cache.misses
+        exporter.set('cache_hit_ratio', labels, round(cache.hits / lookups, 4) if lookups else 0)
+    sample = system_sampler.samples.last()
+    if sample is not None:
+        process = sample['process']
+        exporter.set('process_resident_bytes', None, process['rss'])
+        exporter.set('process_threads', None, process['threads'])
+        if process['open_fds'] is not None:
+            exporter.set('process_open_fds', None, process['open_fds'])
+        exporter.set('ffprobe_processes', None, process['ffprobe']['count'])
+    exporter.set('monitored_streams', None, len(stream_monitor.streams))
+    exporter.set('probe_queue_depth', None, probe_service.queue_depth())
+    pools = (
+        ('sync', OptimizedHTTPSession().get_pool_stats()['origins']),
+        ('async', AsyncFetchEngine().get_pool_stats()['origins'])
+    )
+    for transport, origins in pools:
+        for origin, counters in origins.items():
+            labels = {'transport': transport, 'origin': origin}
+            exporter.set('http_pool_requests_total', labels, counters['requests'])
+            exporter.set('http_pool_new_connections_total', labels, counters['new_connections'])
+            exporter.set('http_pool_reused_total', labels, counters['reused'])
+            exporter.set('http_pool_in_use', labels, counters['in_use'])
+            exporter.set('http_pool_waits_total', labels, counters['waits'])
+            exporter.set('http_pool_overflow_total', labels, counters['overflow'])
+    exporter.set('dns_cache_hits_total', None, dns_cache.hits)
+
+exporter.add_collector(collect_app_metrics)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text exposition of stream and app metrics"""
+    return Response(monitor_service.metrics_text(), content_type=METRICS_CONTENT_TYPE)
+
 # Cleanup function
 @app.teardown_appcontext
 def cleanup(error):
@@ -580,9 +985,14 @@ def cleanup(error):
 
 # Register cleanup on app shutdown
 import atexit
+atexit.register(stream_monitor.stop_all)
+atexit.register(probe_service.shutdown)
+atexit.register(system_sampler.stop)
+if metrics_log is not None:
+    atexit.register(metrics_log.close)
 atexit.register(cleanup_resources)
 
 if __name__ == '__main__':
     # Security: Binds to localhost only by default
-    # For production deployment, set debug=False and configure proper security
+    # Development server; for production use gunicorn -c gunicorn.conf.py wsgi:app
     app.run(host='127.0.0.1', port=8181, debug=True)
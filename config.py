@@ -1,4 +1,29 @@
 # HLS Stream Monitor - Optimized Configuration
+#
+# Defaults live on OptimizedConfig. Any of them can be overridden by a JSON
+# file named in HLS_CONFIG_FILE and then by HLS_<NAME> environment variables
+# (JSON for dicts/lists). Editing the file (or POST /api/config/reload)
+# applies new values at runtime, except RESTART_REQUIRED ones.
+
+import os
+import json
+import time
+import logging
+import threading
+
+ENV_PREFIX = 'HLS_'
+ENV_ALIASES = {'HLS_SYSTEM_SAMPLE_INTERVAL': 'SYSTEM_METRICS_INTERVAL'}  # Older variable names
+
+# Read once when a component is built; a reload reports them as pending
+RESTART_REQUIRED = frozenset({
+    'DEBUG', 'TESTING', 'MAX_CONTENT_LENGTH', 'SEND_FILE_MAX_AGE_DEFAULT',
+    'MAX_SEGMENTS_HISTORY', 'MAX_METRICS_HISTORY', 'MONITOR_POLL_WORKERS', 'PROBE_WORKERS',
+    'CONNECTION_POOL_SIZE', 'CONNECTION_POOL_MAXSIZE', 'CONNECTION_POOL_BLOCK',
+    'CONNECTION_RETRY_TOTAL', 'CONNECTION_RETRY_BACKOFF', 'HOST_POOL_MAXSIZE',
+    'ASYNC_MAX_CONNECTIONS', 'ASYNC_PER_HOST_LIMIT', 'DNS_CACHE_TTL', 'HTTP2_ENABLED',
+    'CONNECT_TIMEOUT', 'VERIFY_SSL', 'LOG_FORMAT', 'CONFIG_RELOAD_INTERVAL', 'EVENTS_MAX_CLIENTS'
+})
+
 
 class OptimizedConfig:
     """Configuration for optimized HLS Stream Monitor"""
@@ -12,37 +37,69 @@ class OptimizedConfig:
     SEND_FILE_MAX_AGE_DEFAULT = 3600  # Cache static files for 1 hour
     
     # HLS Processing Settings
-    DEFAULT_TIMEOUT = 10  # seconds
-    MAX_CONCURRENT_SEGMENTS = 5  # Concurrent segment checks
-    SEGMENT_BATCH_SIZE = 3  # Segments to process in each batch
-    CACHE_TTL = 300  # Cache TTL in seconds (5 minutes)
+    CONNECT_TIMEOUT = 5.0  # seconds
+    DEFAULT_TIMEOUT = 10.0  # Read timeout in seconds
+    MAX_CONCURRENT_SEGMENTS = 5  # New live-edge segments checked concurrently per poll
+    RECENT_SEGMENTS_WINDOW = 5  # Live-edge segments reported per stream
+    CACHE_TTL = 300.0  # Segment analysis cache TTL in seconds (5 minutes)
+    INIT_SECTION_CACHE_TTL = 600.0  # EXT-X-MAP init sections (10 minutes)
+    LIVE_METRICS_CACHE_TTL = 1.0  # /api/live-metrics responses shared across clients (0: coalesce only)
+    RENDITION_CHECK_TIMEOUT = 10.0  # Per-rendition budget when the target duration is unknown
+    THROUGHPUT_SAMPLE_BYTES = 256 * 1024  # Ranged GET size per rendition's live edge (0: off)
+    THROUGHPUT_FULL_FRACTION = 0.1  # Share of samples that download the whole segment
+    THROUGHPUT_SAMPLE_SHARE = 0.5  # Share of the per-poll rendition budget kept for the sample (0-1)
+    
+    # Background Monitor
+    STREAM_IDLE_TIMEOUT = 300.0  # Stop polling streams nobody has read for 5 minutes
+    FIRST_SNAPSHOT_TIMEOUT = 30.0  # Max wait for the first poll of a new stream
+    MONITOR_POLL_WORKERS = 8  # Concurrent polls across the whole fleet
+    MONITOR_FIRST_POLL_SPREAD = 2.0  # Seconds over which pinned streams' first polls are spread
+    
+    # Probe Pool
+    PROBE_WORKERS = 2  # Concurrent ffprobe processes
+    PROBE_MAX_QUEUE = 256  # Queued probes before low-priority ones are dropped
+    PROBE_MAX_AGE = 30.0  # Queued probes older than this are cancelled as stale
+    FIRST_PROBE_WAIT = 10.0  # Max wait for a stream's first probe result
+    SEGMENT_DETAILS_TIMEOUT = 20.0  # Max wait in /api/segment-details
+    
+    # Events and History
+    EVENTS_KEEPALIVE = 15.0  # Seconds between SSE keepalive comments
+    EVENTS_STATS_INTERVAL = 5.0  # Publish period for the performance/system topics
+    EVENTS_MAX_CLIENTS = 8  # SSE connections per web process; more get 503 and poll instead
+    HISTORY_DEFAULT_SECONDS = 3600.0  # /api/history window when none is given
+    HISTORY_MAX_POINTS = 300  # Buckets per metric before a coarser resolution is chosen
     
     # Memory Management
-    MAX_SEGMENTS_HISTORY = 100  # Maximum segments to keep in memory
-    MAX_METRICS_HISTORY = 50   # Maximum metrics entries to keep
-    CLEANUP_INTERVAL = 300     # Cleanup interval in seconds (5 minutes)
+    MAX_SEGMENTS_HISTORY = 100  # Request times kept for averages
+    MAX_METRICS_HISTORY = 50   # Memory usage samples kept for averages
     
     # Adaptive Refresh Settings
-    MIN_REFRESH_INTERVAL = 5   # Minimum refresh interval in seconds
-    MAX_REFRESH_INTERVAL = 60  # Maximum refresh interval in seconds
-    DEFAULT_REFRESH_INTERVAL = 10  # Default refresh interval
+    MIN_REFRESH_INTERVAL = 5.0   # Minimum refresh interval in seconds
+    MAX_REFRESH_INTERVAL = 60.0  # Maximum refresh interval in seconds
+    DEFAULT_REFRESH_INTERVAL = 10.0  # Default refresh interval
     
     # Performance Monitoring
     ENABLE_PERFORMANCE_MONITORING = True
-    PERFORMANCE_LOG_INTERVAL = 60  # Log performance stats every 60 seconds
+    PERFORMANCE_LOG_INTERVAL = 60.0  # Log performance stats every 60 seconds
     
     # Connection Pooling
-    CONNECTION_POOL_SIZE = 10
-    CONNECTION_POOL_MAXSIZE = 20
+    CONNECTION_POOL_SIZE = 10      # Origins whose pools are kept (requests session)
+    CONNECTION_POOL_MAXSIZE = 20   # Keep-alive connections per origin
+    CONNECTION_POOL_BLOCK = False  # True: wait for a free connection instead of opening extra ones
     CONNECTION_RETRY_TOTAL = 3
     CONNECTION_RETRY_BACKOFF = 0.3
+    HOST_POOL_MAXSIZE = {}         # Per-origin overrides, e.g. {'https://cdn.example.com': 64}
+    ASYNC_MAX_CONNECTIONS = 200    # Fetch engine sockets across all origins
+    ASYNC_PER_HOST_LIMIT = 20      # Fetch engine concurrent requests per origin (overridden by HOST_POOL_MAXSIZE)
+    DNS_CACHE_TTL = 60.0             # Seconds DNS answers are reused
+    HTTP2_ENABLED = False          # HTTPS playlist/segment GETs over HTTP/2 (needs httpx[http2])
     
     # SSL/TLS Settings
-    VERIFY_SSL = False  # Disabled for HLS streams with self-signed certs
+    VERIFY_SSL = False  # Off for HLS streams with self-signed certs; applies to all HTTP clients
     
     # Logging Configuration
     LOG_LEVEL = 'INFO'
-    LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
     
     # API Rate Limiting
     API_RATE_LIMIT_PER_MINUTE = 120  # Max API calls per minute
@@ -52,16 +109,170 @@ class OptimizedConfig:
     CHART_UPDATE_ANIMATION = False  # Disable animations for performance
     
     # System Metrics
-    ENABLE_SYSTEM_METRICS = True
-    SYSTEM_METRICS_INTERVAL = 30  # Update system metrics every 30 seconds
+    ENABLE_SYSTEM_METRICS = True  # Background sampler thread; off: sampled on request instead
+    SYSTEM_METRICS_INTERVAL = 5.0  # Background sampler period in seconds
+    LATENCY_WINDOW = 300.0  # /api/performance-stats percentiles cover the last 1-2 windows
+    
+    # Config Reload
+    CONFIG_RELOAD_INTERVAL = 5.0  # Seconds between config file checks (0: no watching)
+    
+    def __init__(self, path=None, environ=None):
+        self.path = path if path is not None else os.environ.get('HLS_CONFIG_FILE')
+        self.environ = os.environ if environ is None else environ
+        self.sources = {}  # Overridden setting -> 'file' or 'env'
+        self.pending_restart = {}  # Changed settings that apply on the next start
+        self.reloads = 0
+        self.loaded_at = None
+        self._mtime = None
+        self._listeners = []
+        self._watcher = None
+        self._lock = threading.Lock()
+        for key, value in self._read().items():
+            setattr(self, key, value)
+        self.loaded_at = time.time()
     
     @classmethod
-    def get_config_dict(cls):
-        """Get configuration as dictionary"""
+    def defaults(cls):
+        return {
+            key: value for key, value in vars(cls).items()
+            if key.isupper() and not callable(value)
+        }
+    
+    def get_config_dict(self):
+        """Get configuration as dictionary (current values)"""
+        return {key: getattr(self, key) for key in self.defaults()}
+    
+    def _read(self):
+        """Defaults overlaid with the file and the environment; ValueError if invalid"""
+        defaults = self.defaults()
+        values = dict(defaults)
+        sources = {}
+        
+        if self.path:
+            with open(self.path) as f:
+                overrides = json.load(f)
+            if not isinstance(overrides, dict):
+                raise ValueError(f'{self.path} must hold a JSON object')
+            self._mtime = os.path.getmtime(self.path)
+            for key, raw in overrides.items():
+                if key not in defaults:
+                    logging.warning(f"Ignoring unknown setting {key} in {self.path}")
+                    continue
+                values[key] = _coerce(key, defaults[key], raw)
+                sources[key] = 'file'
+        
+        for name, raw in self.environ.items():
+            key = ENV_ALIASES.get(name) or (name[len(ENV_PREFIX):] if name.startswith(ENV_PREFIX) else None)
+            if key in defaults:
+                values[key] = _coerce(key, defaults[key], raw)
+                sources[key] = 'env'
+        
+        self.sources = sources
+        return values
+    
+    def on_reload(self, callback):
+        """Call ``callback(changed)`` with {name: new value} after each reload that changes something"""
+        self._listeners.append(callback)
+    
+    def reload(self):
+        """Re-read the file and environment and apply what changed.
+        
+        Returns {'changed': {...}, 'pending_restart': {...}}; raises
+        ValueError (or OSError) and keeps the current values if the new
+        ones are invalid.
+        """
+        with self._lock:
+            values = self._read()
+            changed = {}
+            for key, value in values.items():
+                if value == getattr(self, key):
+                    self.pending_restart.pop(key, None)
+                elif key in RESTART_REQUIRED:
+                    self.pending_restart[key] = value
+                else:
+                    setattr(self, key, value)
+                    changed[key] = value
+            self.reloads += 1
+            self.loaded_at = time.time()
+            pending = dict(self.pending_restart)
+        
+        if changed:
+            logging.info(f"Config reloaded: {changed}")
+            for callback in self._listeners:
+                try:
+                    callback(changed)
+                except Exception as e:
+                    logging.error(f"Config reload listener failed: {e}")
+        if pending:
+            logging.warning(f"Config changes applied on restart only: {sorted(pending)}")
+        return {'changed': changed, 'pending_restart': pending}
+    
+    def get_info(self):
         return {
-            key: value for key, value in cls.__dict__.items()
-            if not key.startswith('_') and not callable(value)
+            'values': self.get_config_dict(),
+            'sources': dict(self.sources),
+            'pending_restart': dict(self.pending_restart),
+            'file': self.path,
+            'reloads': self.reloads,
+            'loaded_at': self.loaded_at
         }
+    
+    def watch(self, interval=None):
+        """Reload whenever the config file changes (checked on a daemon thread)"""
+        interval = self.CONFIG_RELOAD_INTERVAL if interval is None else interval
+        if not self.path or not interval:
+            return
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(
+                target=self._watch, args=(interval,), name="hls-config-watcher", daemon=True
+            )
+            self._watcher.start()
+    
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                if os.path.getmtime(self.path) != self._mtime:
+                    self.reload()
+            except (OSError, ValueError) as e:
+                # Keep running on the last good values until the file is fixed
+                logging.error(f"Config reload from {self.path} failed: {e}")
+                try:
+                    self._mtime = os.path.getmtime(self.path)
+                except OSError:
+                    pass
+
+
+def _coerce(key, default, raw):
+    """Convert an override to the type of its default (ints must be whole numbers)"""
+    try:
+        if isinstance(raw, str) and not isinstance(default, str):
+            if isinstance(default, bool):
+                if raw.strip().lower() not in ('1', 'true', 'yes', 'on', '0', 'false', 'no', 'off'):
+                    raise ValueError(raw)
+                return raw.strip().lower() in ('1', 'true', 'yes', 'on')
+            if isinstance(default, (int, float)):
+                raw = float(raw)
+            else:
+                raw = json.loads(raw)
+        if isinstance(default, bool):
+            if not isinstance(raw, bool):
+                raise ValueError(raw)
+        elif isinstance(default, (int, float)):
+            if isinstance(raw, bool) or not isinstance(raw, (int, float)):
+                raise ValueError(raw)
+            if isinstance(default, float):
+                return float(raw)
+            if raw != int(raw):
+                raise ValueError(raw)
+            return int(raw)
+        elif not isinstance(raw, type(default)):
+            raise ValueError(raw)
+    except (ValueError, OverflowError):
+        raise ValueError(f'Invalid value for {key}: {raw!r} (expected {type(default).__name__})') from None
+    return raw
 
 # Export the configuration
 config = OptimizedConfig()
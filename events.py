@@ -0,0 +1,133 @@
+"""
+Push events for HLS Stream Monitor
+
+A small in-process pub/sub broker. The monitor publishes a delta after
+every poll and the SSE endpoint multiplexes all topics a browser is
+interested in over one connection, instead of each page polling every
+endpoint on its own timer.
+"""
+
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+
+def snapshot_delta(previous, current):
+    """Top-level keys of ``current`` that changed since ``previous``"""
+    if previous is None:
+        return dict(current), []
+    changed = {key: value for key, value in current.items() if previous.get(key) != value}
+    removed = [key for key in previous if key not in current]
+    return changed, removed
+
+
+def format_sse(event, data, event_id=None):
+    """Encode one Server-Sent Events message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'), default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """Bounded event queue for one connected client"""
+    def __init__(self, broker, topics, max_pending=100):
+        self.broker = broker
+        self.topics = set(topics)
+        self.max_pending = max_pending
+        self.created_at = time.time()
+        self.delivered = 0
+        self.dropped = 0
+        self.resync = False  # Queue overflowed: client needs full snapshots again
+        self.closed = False
+        self._queue = deque()
+        self._cond = threading.Condition()
+
+    def _put(self, event):
+        with self._cond:
+            if len(self._queue) >= self.max_pending:
+                # A slow client gets a fresh full state instead of a backlog
+                self.dropped += len(self._queue)
+                self._queue.clear()
+                self.resync = True
+            self._queue.append(event)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Wait for pending events; returns a (possibly empty) list"""
+        with self._cond:
+            if not self._queue and not self.closed:
+                self._cond.wait(timeout)
+            events = list(self._queue)
+            self._queue.clear()
+        self.delivered += len(events)
+        return events
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    """Topic-based fan-out from publishers to client subscriptions"""
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self._topics = {}
+        self._lock = threading.Lock()
+        self._seq = 0
+        self.stats = {
+            'published': 0,
+            'delivered': 0,
+            'subscriptions': 0
+        }
+
+    def subscribe(self, topics):
+        subscription = Subscription(self, topics, max_pending=self.max_pending)
+        with self._lock:
+            for topic in subscription.topics:
+                self._topics.setdefault(topic, set()).add(subscription)
+            self.stats['subscriptions'] += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._topics[topic]
+
+    def has_subscribers(self, topic):
+        with self._lock:
+            return topic in self._topics
+
+    def publish(self, topic, event, data):
+        """Queue ``data`` for every subscriber of ``topic``"""
+        with self._lock:
+            subscribers = list(self._topics.get(topic, ()))
+            if not subscribers:
+                return 0
+            self._seq += 1
+            message = (self._seq, topic, event, data)
+            self.stats['published'] += 1
+            self.stats['delivered'] += len(subscribers)
+        for subscription in subscribers:
+            try:
+                subscription._put(message)
+            except Exception as e:
+                logging.error(f"Event delivery failed for {topic}: {e}")
+        return len(subscribers)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['topics'] = len(self._topics)
+            stats['connected'] = len(set().union(*self._topics.values())) if self._topics else 0
+        return stats
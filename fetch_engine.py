@@ -0,0 +1,193 @@
+"""
+Async fetch engine for HLS Stream Monitor
+
+A single asyncio event loop running on a background thread with one shared
+aiohttp connection pool, per-host concurrency limits and explicit timeouts.
+Synchronous callers (Flask handlers, monitor threads) submit coroutines via
+``run()``; async code can await the ``*_async`` helpers directly.
+"""
+
+import time
+import asyncio
+import threading
+
+import aiohttp
+
+from config import config
+from transport import PoolStats, aiohttp_trace_config, origin_of
+
+
+class AsyncFetchEngine:
+    """Singleton event loop + shared aiohttp session"""
+    _instance = None
+    _lock = threading.Lock()
+
+    # Pool and timeout settings
+    MAX_CONNECTIONS = config.ASYNC_MAX_CONNECTIONS  # Total sockets across all hosts
+    PER_HOST_LIMIT = config.ASYNC_PER_HOST_LIMIT    # Concurrent requests per origin (config.HOST_POOL_MAXSIZE overrides)
+    CONNECT_TIMEOUT = config.CONNECT_TIMEOUT
+    READ_TIMEOUT = config.DEFAULT_TIMEOUT
+    HEAD_TIMEOUT = 5
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    # Publish only once the loop is running
+                    instance = super().__new__(cls)
+                    instance._initialize()
+                    cls._instance = instance
+        return cls._instance
+
+    def _initialize(self):
+        self.loop = asyncio.new_event_loop()
+        self._session = None
+        self._host_semaphores = {}
+        self.pool_stats = PoolStats()
+        self._ready = threading.Event()
+
+        self.thread = threading.Thread(target=self._run_loop, name="hls-fetch-engine", daemon=True)
+        self.thread.start()
+        self._ready.wait()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._ready.set)
+        self.loop.run_forever()
+
+    def _get_session(self):
+        # Created lazily on the engine loop, which owns the connector
+        if self._session is None or self._session.closed:
+            # Per-origin limits are the semaphores alone (0: no connector cap),
+            # so a request never waits in two queues
+            connector = aiohttp.TCPConnector(
+                limit=self.MAX_CONNECTIONS,
+                limit_per_host=0,
+                ttl_dns_cache=config.DNS_CACHE_TTL,
+                ssl=None if config.VERIFY_SSL else False  # None: default verification
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                trace_configs=[aiohttp_trace_config(self.pool_stats)],
+                timeout=aiohttp.ClientTimeout(
+                    total=self.CONNECT_TIMEOUT + self.READ_TIMEOUT,
+                    connect=self.CONNECT_TIMEOUT,
+                    sock_read=self.READ_TIMEOUT
+                )
+            )
+        return self._session
+
+    def _host_semaphore(self, url):
+        origin = origin_of(url)
+        semaphore = self._host_semaphores.get(origin)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(config.HOST_POOL_MAXSIZE.get(origin, self.PER_HOST_LIMIT))
+            self._host_semaphores[origin] = semaphore
+        return semaphore
+
+    def get_pool_stats(self):
+        return {'origins': self.pool_stats.get_stats(), 'dns_ttl': config.DNS_CACHE_TTL}
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the engine loop and block for its result"""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except Exception:
+            future.cancel()
+            raise
+
+    async def head_async(self, url, timeout=None):
+        """HEAD a URL, returning (status_code, elapsed_seconds); status 0 on failure.
+
+        Elapsed time starts once the origin's semaphore is held, so it
+        excludes queueing behind other requests to the same origin.
+        """
+        try:
+            async with self._host_semaphore(url):
+                start = time.perf_counter()
+                session = self._get_session()
+                request_timeout = aiohttp.ClientTimeout(total=timeout or self.HEAD_TIMEOUT)
+                async with session.head(url, timeout=request_timeout, allow_redirects=True) as response:
+                    return response.status, time.perf_counter() - start
+        except Exception:
+            return 0, 0
+
+    async def get_text_async(self, url, timeout=None):
+        """GET a URL, returning (status_code, body_text, elapsed_seconds); timed like head_async"""
+        async with self._host_semaphore(url):
+            start = time.perf_counter()
+            session = self._get_session()
+            request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
+            async with session.get(url, timeout=request_timeout) as response:
+                body = await response.read()
+                return response.status, body.decode('utf-8', errors='replace'), time.perf_counter() - start
+
+    async def sample_download_async(self, url, max_bytes=None, timeout=None):
+        """GET a URL (only its first ``max_bytes`` when given) and time the delivery.
+
+        Body chunks are counted and dropped as they arrive, never kept.
+        Returns status_code, bytes, ttfb (first body byte), duration and
+        timed_out, times in seconds; status 0 on failure. Times start once
+        the origin's semaphore is held, but ``timeout`` also covers waiting
+        for it; a sample cut off by it keeps the bytes received until then.
+        """
+        result = {'status_code': 0, 'bytes': 0, 'ttfb': None, 'duration': 0, 'timed_out': False}
+        try:
+            await asyncio.wait_for(self._sample(url, max_bytes, timeout, result), timeout)
+        except asyncio.TimeoutError:
+            result['timed_out'] = True
+        except Exception:
+            result['status_code'] = result['status_code'] or 0
+        start = result.pop('start', None)  # None: never got past the semaphore
+        if start is not None:
+            result['duration'] = time.perf_counter() - start
+        return result
+
+    async def _sample(self, url, max_bytes, timeout, result):
+        headers = {'Range': f'bytes=0-{max_bytes - 1}'} if max_bytes else None
+        async with self._host_semaphore(url):
+            start = result['start'] = time.perf_counter()
+            session = self._get_session()
+            request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
+            async with session.get(url, headers=headers, timeout=request_timeout) as response:
+                result['status_code'] = response.status
+                if response.status not in (200, 206):
+                    return
+                size = 0
+                while True:
+                    chunk = await response.content.readany()
+                    if not chunk:
+                        break
+                    if result['ttfb'] is None:
+                        result['ttfb'] = time.perf_counter() - start
+                    size += len(chunk)
+                    result['bytes'] = min(size, max_bytes) if max_bytes else size
+                    if max_bytes and size >= max_bytes:
+                        if response.status == 200:
+                            response.close()  # Range ignored: don't pull the whole body
+                        break
+
+    async def check_segments_async(self, segment_urls, timeout=None):
+        """HEAD all segment URLs concurrently"""
+        unique_urls = list(dict.fromkeys(segment_urls))
+        responses = await asyncio.gather(*(self.head_async(url, timeout) for url in unique_urls))
+
+        results = {}
+        for url, (status, elapsed) in zip(unique_urls, responses):
+            results[url] = {
+                'status_code': status,
+                'response_time': elapsed * 1000  # Convert to ms
+            }
+        return results
+
+    async def _close_async(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def close(self):
+        """Close the shared session (the loop keeps running for reuse)"""
+        try:
+            self.run(self._close_async(), timeout=5)
+        except Exception:
+            pass
@@ -0,0 +1,43 @@
+"""
+Gunicorn settings for HLS Stream Monitor
+
+Starts one poller process (poller.py) that owns all polling and stream
+state, and HLS_WEB_WORKERS web workers that read it over a local socket.
+"""
+
+import os
+import sys
+import secrets
+import subprocess
+
+bind = os.environ.get('HLS_BIND', '127.0.0.1:8181')  # Localhost unless asked (see SECURITY.md)
+workers = int(os.environ.get('HLS_WEB_WORKERS', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('HLS_WEB_THREADS', 16))  # Each SSE client holds a thread
+keepalive = 5
+accesslog = '-'
+
+# Workers inherit this environment: they query the poller instead of polling
+os.environ['HLS_ROLE'] = 'web'
+# SSE clients beyond half the threads are refused so plain requests keep a thread
+os.environ.setdefault('HLS_EVENTS_MAX_CLIENTS', str(max(1, threads // 2)))
+os.environ.setdefault('HLS_POLLER_AUTHKEY', secrets.token_hex(16))
+
+_poller = {}
+
+
+def on_starting(server):
+    env = dict(os.environ, HLS_ROLE='poller')
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'poller.py')
+    _poller['process'] = subprocess.Popen([sys.executable, script], env=env)
+    server.log.info(f"Started poller process {_poller['process'].pid}")
+
+
+def on_exit(server):
+    process = _poller.get('process')
+    if process is not None and process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
@@ -0,0 +1,592 @@
+"""
+In-process MPEG-TS / fMP4 header parser for HLS Stream Monitor
+
+Extracts codec, resolution, frame rate, PTS range and sizes from segment
+bytes without forking ffprobe. Boxes and packets are walked with struct
+offsets into a memoryview; the first elementary-stream bytes of each
+track are gathered to find its parameter sets. ``parse_segment`` returns
+a dict shaped like ``ffprobe -of json`` output, or None when it can't
+decide and the caller should fall back to ffprobe.
+"""
+
+import struct
+
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = 0x47
+PTS_CLOCK = 90000
+PTS_WRAP = 1 << 33
+
+# PMT stream_type -> (codec_type, codec_name)
+TS_STREAM_TYPES = {
+    0x01: ('video', 'mpeg1video'),
+    0x02: ('video', 'mpeg2video'),
+    0x1B: ('video', 'h264'),
+    0x24: ('video', 'hevc'),
+    0x03: ('audio', 'mp3'),
+    0x04: ('audio', 'mp3'),
+    0x0F: ('audio', 'aac'),
+    0x11: ('audio', 'aac_latm'),
+    0x81: ('audio', 'ac3'),
+    0x87: ('audio', 'eac3')
+}
+
+# Descriptors identifying audio carried as private data (stream_type 0x06)
+TS_PRIVATE_DESCRIPTORS = {
+    0x6A: ('audio', 'ac3'),
+    0x7A: ('audio', 'eac3')
+}
+
+# ISO BMFF sample entry -> codec_name
+MP4_SAMPLE_ENTRIES = {
+    'avc1': 'h264', 'avc3': 'h264',
+    'hvc1': 'hevc', 'hev1': 'hevc',
+    'vp09': 'vp9', 'av01': 'av1',
+    'mp4a': 'aac', 'ac-3': 'ac3', 'ec-3': 'eac3',
+    'Opus': 'opus', 'fLaC': 'flac',
+    'wvtt': 'webvtt', 'stpp': 'ttml'
+}
+
+MP4_HANDLERS = {'vide': 'video', 'soun': 'audio', 'text': 'subtitle', 'subt': 'subtitle'}
+MP4_CONTAINERS = {'moov', 'trak', 'mdia', 'minf', 'stbl', 'mvex', 'moof', 'traf', 'edts', 'dinf'}
+
+ADTS_SAMPLE_RATES = (96000, 88200, 64000, 48000, 44100, 32000, 24000,
+                     22050, 16000, 12000, 11025, 8000, 7350)
+AC3_SAMPLE_RATES = (48000, 44100, 32000)
+
+
+class BitReader:
+    """MSB-first bit reader with Exp-Golomb support for parameter sets"""
+    __slots__ = ('data', 'pos')
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def u(self, bits):
+        value = 0
+        for _ in range(bits):
+            byte = self.data[self.pos >> 3]
+            value = (value << 1) | ((byte >> (7 - (self.pos & 7))) & 1)
+            self.pos += 1
+        return value
+
+    def skip(self, bits):
+        self.pos += bits
+
+    def ue(self):
+        zeros = 0
+        while self.u(1) == 0:
+            zeros += 1
+            if zeros > 31:
+                raise ValueError('Invalid Exp-Golomb code')
+        return (1 << zeros) - 1 + (self.u(zeros) if zeros else 0)
+
+    def se(self):
+        value = self.ue()
+        return (value + 1) // 2 if value & 1 else -(value // 2)
+
+
+def _unescape_rbsp(nal):
+    # Drop emulation prevention bytes (00 00 03 -> 00 00)
+    if b'\x00\x00\x03' not in nal:
+        return nal
+    out = bytearray()
+    zeros = 0
+    for byte in nal:
+        if zeros >= 2 and byte == 3:
+            zeros = 0
+            continue
+        out.append(byte)
+        zeros = zeros + 1 if byte == 0 else 0
+    return out
+
+
+def _iter_nal_units(data):
+    start = data.find(b'\x00\x00\x01')
+    while start != -1:
+        start += 3
+        end = data.find(b'\x00\x00\x01', start)
+        nal = data[start:end if end != -1 else len(data)]
+        yield nal.rstrip(b'\x00') if end != -1 else nal
+        start = end
+
+
+def parse_h264_sps(nal):
+    """Return (width, height) from an H.264 SPS NAL unit"""
+    reader = BitReader(_unescape_rbsp(nal[1:]))
+    profile_idc = reader.u(8)
+    reader.skip(16)  # constraint flags + level_idc
+    reader.ue()  # seq_parameter_set_id
+
+    chroma_format_idc = 1
+    separate_colour_plane = 0
+    if profile_idc in (100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135):
+        chroma_format_idc = reader.ue()
+        if chroma_format_idc == 3:
+            separate_colour_plane = reader.u(1)
+        reader.ue()  # bit_depth_luma_minus8
+        reader.ue()  # bit_depth_chroma_minus8
+        reader.skip(1)  # qpprime_y_zero_transform_bypass_flag
+        if reader.u(1):  # seq_scaling_matrix_present_flag
+            for i in range(8 if chroma_format_idc != 3 else 12):
+                if reader.u(1):
+                    size = 16 if i < 6 else 64
+                    last_scale = next_scale = 8
+                    for _ in range(size):
+                        if next_scale != 0:
+                            next_scale = (last_scale + reader.se() + 256) % 256
+                        last_scale = next_scale if next_scale != 0 else last_scale
+
+    reader.ue()  # log2_max_frame_num_minus4
+    pic_order_cnt_type = reader.ue()
+    if pic_order_cnt_type == 0:
+        reader.ue()
+    elif pic_order_cnt_type == 1:
+        reader.skip(1)
+        reader.se()
+        reader.se()
+        for _ in range(reader.ue()):
+            reader.se()
+    reader.ue()  # max_num_ref_frames
+    reader.skip(1)  # gaps_in_frame_num_value_allowed_flag
+    width_in_mbs = reader.ue() + 1
+    height_in_map_units = reader.ue() + 1
+    frame_mbs_only = reader.u(1)
+    if not frame_mbs_only:
+        reader.skip(1)  # mb_adaptive_frame_field_flag
+    reader.skip(1)  # direct_8x8_inference_flag
+
+    width = width_in_mbs * 16
+    height = (2 - frame_mbs_only) * height_in_map_units * 16
+    if reader.u(1):  # frame_cropping_flag
+        left, right, top, bottom = reader.ue(), reader.ue(), reader.ue(), reader.ue()
+        chroma_array_type = 0 if separate_colour_plane else chroma_format_idc
+        crop_x = 1 if chroma_array_type in (0, 3) else 2
+        crop_y = (2 - frame_mbs_only) * (2 if chroma_array_type == 1 else 1)
+        width -= crop_x * (left + right)
+        height -= crop_y * (top + bottom)
+    return width, height
+
+
+def parse_hevc_sps(nal):
+    """Return (width, height) from an HEVC SPS NAL unit"""
+    reader = BitReader(_unescape_rbsp(nal[2:]))
+    reader.skip(4)  # sps_video_parameter_set_id
+    max_sub_layers_minus1 = reader.u(3)
+    reader.skip(1)  # sps_temporal_id_nesting_flag
+
+    # profile_tier_level(1, max_sub_layers_minus1)
+    reader.skip(88 + 8)  # general profile fields + general_level_idc
+    sub_layer_flags = [(reader.u(1), reader.u(1)) for _ in range(max_sub_layers_minus1)]
+    if max_sub_layers_minus1 > 0:
+        reader.skip(2 * (8 - max_sub_layers_minus1))
+    for profile_present, level_present in sub_layer_flags:
+        reader.skip((88 if profile_present else 0) + (8 if level_present else 0))
+
+    reader.ue()  # sps_seq_parameter_set_id
+    chroma_format_idc = reader.ue()
+    if chroma_format_idc == 3:
+        reader.skip(1)  # separate_colour_plane_flag
+    width = reader.ue()
+    height = reader.ue()
+    if reader.u(1):  # conformance_window_flag
+        left, right, top, bottom = reader.ue(), reader.ue(), reader.ue(), reader.ue()
+        sub_width = 2 if chroma_format_idc in (1, 2) else 1
+        sub_height = 2 if chroma_format_idc == 1 else 1
+        width -= sub_width * (left + right)
+        height -= sub_height * (top + bottom)
+    return width, height
+
+
+def _video_dimensions(codec, head):
+    for nal in _iter_nal_units(head):
+        if not nal:
+            continue
+        try:
+            if codec == 'h264' and nal[0] & 0x1F == 7:
+                return parse_h264_sps(nal)
+            if codec == 'hevc' and (nal[0] >> 1) & 0x3F == 33:
+                return parse_hevc_sps(nal)
+        except (IndexError, ValueError):
+            return None
+    return None
+
+
+def _audio_format(codec, head):
+    """Return (sample_rate, channels) from the first audio frame header"""
+    if codec == 'aac':
+        for i in range(len(head) - 4):
+            if head[i] == 0xFF and head[i + 1] & 0xF6 == 0xF0:
+                sample_rate_index = (head[i + 2] >> 2) & 0x0F
+                channels = ((head[i + 2] & 0x01) << 2) | (head[i + 3] >> 6)
+                if sample_rate_index < len(ADTS_SAMPLE_RATES):
+                    return ADTS_SAMPLE_RATES[sample_rate_index], channels
+                return None
+    elif codec in ('ac3', 'eac3'):
+        index = head.find(b'\x0b\x77')
+        if index != -1 and index + 5 < len(head):
+            fscod = head[index + 4] >> 6
+            if fscod < len(AC3_SAMPLE_RATES):
+                return AC3_SAMPLE_RATES[fscod], 0
+    return None
+
+
+def _read_pts(payload, offset):
+    return (((payload[offset] >> 1) & 0x07) << 30 | payload[offset + 1] << 22 |
+            (payload[offset + 2] >> 1) << 15 | payload[offset + 3] << 7 | payload[offset + 4] >> 1)
+
+
+def _psi_section(payload):
+    pointer = payload[0]
+    section = payload[1 + pointer:]
+    if len(section) < 3:
+        return None
+    section_length = ((section[1] & 0x0F) << 8) | section[2]
+    return section[:3 + section_length]
+
+
+def _median_delta(values):
+    deltas = sorted(b - a for a, b in zip(values, values[1:]) if b > a)
+    return deltas[len(deltas) // 2] if deltas else 0
+
+
+def parse_ts(data, head_bytes=64 * 1024):
+    """Parse an MPEG-TS segment"""
+    view = memoryview(data)
+    size = len(view)
+    offset = 0
+    while offset < min(size, TS_PACKET_SIZE) and view[offset] != TS_SYNC_BYTE:
+        offset += 1
+
+    pmt_pid = None
+    tracks = {}
+    for offset in range(offset, size - TS_PACKET_SIZE + 1, TS_PACKET_SIZE):
+        if view[offset] != TS_SYNC_BYTE:
+            return None  # Lost sync: not a clean TS segment
+        pusi = view[offset + 1] & 0x40
+        pid = ((view[offset + 1] & 0x1F) << 8) | view[offset + 2]
+        adaptation = (view[offset + 3] >> 4) & 0x03
+        start = offset + 4
+        if adaptation & 0x02:
+            start += 1 + view[offset + 4]
+        if not adaptation & 0x01 or start >= offset + TS_PACKET_SIZE:
+            continue
+        payload = view[start:offset + TS_PACKET_SIZE]
+
+        if pid == 0 and pusi and pmt_pid is None:
+            section = _psi_section(payload)
+            if section is not None:
+                for i in range(8, len(section) - 4, 4):
+                    if (section[i] << 8) | section[i + 1]:
+                        pmt_pid = ((section[i + 2] & 0x1F) << 8) | section[i + 3]
+                        break
+        elif pid == pmt_pid and pusi and not tracks:
+            section = _psi_section(payload)
+            if section is None or len(section) < 16:
+                continue
+            i = 12 + (((section[10] & 0x0F) << 8) | section[11])
+            while i + 5 <= len(section) - 4:
+                stream_type = section[i]
+                es_pid = ((section[i + 1] & 0x1F) << 8) | section[i + 2]
+                info_length = ((section[i + 3] & 0x0F) << 8) | section[i + 4]
+                kind = TS_STREAM_TYPES.get(stream_type)
+                if kind is None and stream_type == 0x06:
+                    j = i + 5
+                    while j + 2 <= i + 5 + info_length and kind is None:
+                        kind = TS_PRIVATE_DESCRIPTORS.get(section[j])
+                        j += 2 + section[j + 1]
+                if kind is not None:
+                    tracks[es_pid] = {
+                        'codec_type': kind[0], 'codec_name': kind[1],
+                        'pts': [], 'bytes': 0, 'head': bytearray()
+                    }
+                i += 5 + info_length
+        elif pid in tracks:
+            track = tracks[pid]
+            es_data = payload
+            if pusi and len(payload) >= 9 and payload[0] == 0 and payload[1] == 0 and payload[2] == 1:
+                header_length = payload[8]
+                if payload[7] & 0x80 and len(payload) >= 14:
+                    track['pts'].append(_read_pts(payload, 9))
+                es_data = payload[9 + header_length:]
+            track['bytes'] += len(es_data)
+            if len(track['head']) < head_bytes:
+                track['head'] += es_data
+
+    return _ts_result(tracks, size) if tracks else None
+
+
+def _ts_result(tracks, size):
+    streams = []
+    start_pts = None
+    end_pts = None
+    for track in tracks.values():
+        pts = sorted(set(track['pts']))
+        if not pts:
+            continue
+        if pts[-1] - pts[0] > PTS_WRAP // 2:
+            # The 33-bit clock wrapped inside this segment
+            pts = sorted(value + PTS_WRAP if value < PTS_WRAP // 2 else value for value in pts)
+        frame_delta = _median_delta(pts)
+        duration = (pts[-1] - pts[0] + frame_delta) / PTS_CLOCK
+        start_pts = pts[0] if start_pts is None else min(start_pts, pts[0])
+        end_pts = pts[-1] + frame_delta if end_pts is None else max(end_pts, pts[-1] + frame_delta)
+
+        stream = {'codec_name': track['codec_name'], 'codec_type': track['codec_type']}
+        if duration > 0:
+            stream['bit_rate'] = str(int(track['bytes'] * 8 / duration))
+        head = bytes(track['head'])
+        if track['codec_type'] == 'video':
+            dimensions = _video_dimensions(track['codec_name'], head)
+            if dimensions:
+                stream['width'], stream['height'] = dimensions
+            if frame_delta:
+                stream['r_frame_rate'] = f"{PTS_CLOCK}/{frame_delta}"
+        else:
+            audio = _audio_format(track['codec_name'], head)
+            if audio:
+                stream['sample_rate'] = str(audio[0])
+                stream['channels'] = audio[1]
+        streams.append(stream)
+
+    if not streams or start_pts is None:
+        return None
+    duration = (end_pts - start_pts) / PTS_CLOCK
+    return {
+        'streams': streams,
+        'format': {
+            'format_name': 'mpegts',
+            'start_time': f"{start_pts / PTS_CLOCK:.6f}",
+            'duration': f"{duration:.6f}",
+            'size': str(size),
+            'bit_rate': str(int(size * 8 / duration)) if duration > 0 else None
+        }
+    }
+
+
+def _iter_boxes(view, start, end):
+    while start + 8 <= end:
+        size = struct.unpack_from('>I', view, start)[0]
+        box_type = bytes(view[start + 4:start + 8]).decode('latin-1')
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', view, start + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - start
+        if size < header or start + size > end:
+            return  # Truncated box
+        yield box_type, start + header, start + size
+        start += size
+
+
+def _walk_boxes(view, start, end, handlers, context):
+    for box_type, payload, box_end in _iter_boxes(view, start, end):
+        handler = handlers.get(box_type)
+        if handler:
+            handler(view, payload, box_end, context)
+        if box_type in MP4_CONTAINERS:
+            if box_type in ('trak', 'traf'):
+                context['current'] = {}
+            _walk_boxes(view, payload, box_end, handlers, context)
+            if box_type == 'trak':
+                track = context.pop('current')
+                if 'track_id' in track:
+                    context['tracks'].setdefault(track['track_id'], {}).update(track)
+            elif box_type == 'traf':
+                fragment = context.pop('current')
+                if 'track_id' in fragment:
+                    context['fragments'].append(fragment)
+
+
+def _mp4_tkhd(view, payload, end, context):
+    version = view[payload]
+    context['current']['track_id'] = struct.unpack_from('>I', view, payload + (20 if version == 1 else 12))[0]
+
+
+def _mp4_mdhd(view, payload, end, context):
+    version = view[payload]
+    context['current']['timescale'] = struct.unpack_from('>I', view, payload + (20 if version == 1 else 12))[0]
+
+
+def _mp4_hdlr(view, payload, end, context):
+    handler = bytes(view[payload + 8:payload + 12]).decode('latin-1')
+    context['current']['codec_type'] = MP4_HANDLERS.get(handler, handler)
+
+
+def _mp4_stsd(view, payload, end, context):
+    for entry_type, entry, entry_end in _iter_boxes(view, payload + 8, end):
+        track = context['current']
+        track['codec_name'] = MP4_SAMPLE_ENTRIES.get(entry_type, entry_type)
+        if track.get('codec_type') == 'video' and entry + 28 <= entry_end:
+            track['width'], track['height'] = struct.unpack_from('>HH', view, entry + 24)
+        elif track.get('codec_type') == 'audio' and entry + 28 <= entry_end:
+            track['channels'] = struct.unpack_from('>H', view, entry + 16)[0]
+            track['sample_rate'] = struct.unpack_from('>I', view, entry + 24)[0] >> 16
+        break  # First sample entry describes the track
+
+
+def _mp4_trex(view, payload, end, context):
+    track_id, _, duration, size = struct.unpack_from('>IIII', view, payload + 4)
+    context['tracks'].setdefault(track_id, {}).update(default_duration=duration, default_size=size)
+
+
+def _mp4_tfhd(view, payload, end, context):
+    flags = (view[payload + 1] << 16) | (view[payload + 2] << 8) | view[payload + 3]
+    fragment = context['current']
+    fragment['track_id'] = struct.unpack_from('>I', view, payload + 4)[0]
+    offset = payload + 8
+    if flags & 0x01:
+        offset += 8
+    if flags & 0x02:
+        offset += 4
+    if flags & 0x08:
+        fragment['default_duration'] = struct.unpack_from('>I', view, offset)[0]
+        offset += 4
+    if flags & 0x10:
+        fragment['default_size'] = struct.unpack_from('>I', view, offset)[0]
+
+
+def _mp4_tfdt(view, payload, end, context):
+    fmt = '>Q' if view[payload] == 1 else '>I'
+    context['current']['decode_time'] = struct.unpack_from(fmt, view, payload + 4)[0]
+
+
+def _mp4_trun(view, payload, end, context):
+    flags = (view[payload + 1] << 16) | (view[payload + 2] << 8) | view[payload + 3]
+    sample_count = struct.unpack_from('>I', view, payload + 4)[0]
+    offset = payload + 8 + (4 if flags & 0x01 else 0) + (4 if flags & 0x04 else 0)
+    fields = [flag for flag in (0x100, 0x200, 0x400, 0x800) if flags & flag]
+
+    durations = sizes = None
+    if flags & 0x300:
+        durations = 0 if flags & 0x100 else None
+        sizes = 0 if flags & 0x200 else None
+        stride = 4 * len(fields)
+        if offset + stride * sample_count > end:
+            return
+        for i in range(sample_count):
+            position = offset + i * stride
+            if flags & 0x100:
+                durations += struct.unpack_from('>I', view, position)[0]
+                position += 4
+            if flags & 0x200:
+                sizes += struct.unpack_from('>I', view, position)[0]
+
+    fragment = context['current']
+    fragment['samples'] = fragment.get('samples', 0) + sample_count
+    if durations is not None:
+        fragment['duration'] = fragment.get('duration', 0) + durations
+    if sizes is not None:
+        fragment['size'] = fragment.get('size', 0) + sizes
+
+
+MP4_BOX_HANDLERS = {
+    'tkhd': _mp4_tkhd, 'mdhd': _mp4_mdhd, 'hdlr': _mp4_hdlr, 'stsd': _mp4_stsd,
+    'trex': _mp4_trex, 'tfhd': _mp4_tfhd, 'tfdt': _mp4_tfdt, 'trun': _mp4_trun
+}
+
+
+def parse_fmp4(data, init_data=None):
+    """Parse a fragmented MP4 media segment (plus its EXT-X-MAP init section)"""
+    context = {'tracks': {}, 'fragments': []}
+    for chunk in (init_data, data):
+        if chunk:
+            view = memoryview(chunk)
+            _walk_boxes(view, 0, len(view), MP4_BOX_HANDLERS, context)
+
+    tracks = context['tracks']
+    totals = {}
+    for fragment in context['fragments']:
+        track = tracks.get(fragment['track_id'])
+        if track is None or 'codec_name' not in track:
+            continue  # moof without a matching moov: need the init section
+        samples = fragment.get('samples', 0)
+        duration = fragment.get('duration')
+        if duration is None:
+            duration = samples * fragment.get('default_duration', track.get('default_duration', 0))
+        size = fragment.get('size')
+        if size is None:
+            size = samples * fragment.get('default_size', track.get('default_size', 0))
+
+        total = totals.setdefault(fragment['track_id'], {'samples': 0, 'duration': 0, 'size': 0, 'start': None})
+        total['samples'] += samples
+        total['duration'] += duration
+        total['size'] += size
+        if 'decode_time' in fragment and (total['start'] is None or fragment['decode_time'] < total['start']):
+            total['start'] = fragment['decode_time']
+
+    streams = []
+    durations = []
+    starts = []
+    for track_id, total in totals.items():
+        track = tracks[track_id]
+        timescale = track.get('timescale') or 0
+        if not timescale or not total['duration']:
+            continue
+        seconds = total['duration'] / timescale
+        durations.append(seconds)
+        if total['start'] is not None:
+            starts.append(total['start'] / timescale)
+
+        stream = {'codec_name': track['codec_name'], 'codec_type': track.get('codec_type', 'unknown')}
+        if total['size']:
+            stream['bit_rate'] = str(int(total['size'] * 8 / seconds))
+        if stream['codec_type'] == 'video':
+            stream['width'] = track.get('width', 0)
+            stream['height'] = track.get('height', 0)
+            stream['r_frame_rate'] = f"{total['samples'] * timescale}/{total['duration']}"
+        elif stream['codec_type'] == 'audio':
+            stream['sample_rate'] = str(track.get('sample_rate', 0))
+            stream['channels'] = track.get('channels', 0)
+        streams.append(stream)
+
+    if not streams:
+        return None
+    duration = max(durations)
+    return {
+        'streams': streams,
+        'format': {
+            'format_name': 'mp4',
+            'start_time': f"{min(starts):.6f}" if starts else None,
+            'duration': f"{duration:.6f}",
+            'size': str(len(data)),
+            'bit_rate': str(int(len(data) * 8 / duration))
+        }
+    }
+
+
+def detect_container(data):
+    """Return 'mpegts', 'mp4' or None for segment bytes"""
+    if len(data) >= TS_PACKET_SIZE and data[0] == TS_SYNC_BYTE and (
+            len(data) < 2 * TS_PACKET_SIZE or data[TS_PACKET_SIZE] == TS_SYNC_BYTE):
+        return 'mpegts'
+    if len(data) >= 8 and bytes(data[4:8]) in (b'ftyp', b'styp', b'moof', b'moov', b'sidx', b'emsg', b'prft'):
+        return 'mp4'
+    return None
+
+
+def _is_decided(result):
+    # Every video stream needs dimensions and a frame rate, every stream a codec
+    for stream in result['streams']:
+        if stream['codec_name'] in (None, '', 'unknown'):
+            return False
+        if stream['codec_type'] == 'video' and not (
+                stream.get('width') and stream.get('height') and stream.get('r_frame_rate')):
+            return False
+    return float(result['format']['duration'] or 0) > 0
+
+
+def parse_segment(data, init_data=None):
+    """Parse segment bytes in-process; None means "ask ffprobe" """
+    try:
+        container = detect_container(data)
+        if container == 'mpegts':
+            result = parse_ts(data)
+        elif container == 'mp4':
+            result = parse_fmp4(data, init_data)
+        else:
+            return None
+    except (IndexError, ValueError, struct.error):
+        return None
+    return result if result and _is_decided(result) else None
@@ -0,0 +1,186 @@
+"""
+Prometheus exporter for HLS Stream Monitor
+
+Counters, gauges and histograms are updated where the work happens (poll,
+probe, fetch) and each series caches its rendered text lines until it
+changes again. A scrape joins cached strings instead of recomputing
+anything, so its cost is independent of how busy the monitor is.
+"""
+
+import bisect
+import threading
+from collections import OrderedDict
+
+# Seconds; covers a 5 ms HEAD up to a 10 s ffprobe run
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Histogram:
+    """Cumulative-bucket histogram state for one series"""
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            cumulative += count
+            bucket_labels = labels + (('le', _format_value(float(bound))),)
+            lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {self.count}")
+        return '\n'.join(lines)
+
+
+class MetricsExporter:
+    """Registry of metric families rendered in the Prometheus text format"""
+    def __init__(self, namespace='hls'):
+        self.namespace = namespace
+        self._families = OrderedDict()  # name -> [type, help, buckets, {labels: [state, text]}]
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _family(self, name, kind, help_text, buckets=None):
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = [kind, help_text, buckets, {}]
+        return family
+
+    def define(self, name, kind, help_text, buckets=DEFAULT_BUCKETS):
+        """Declare a family up front so it appears (empty) before first use"""
+        with self._lock:
+            self._family(f"{self.namespace}_{name}", kind, help_text,
+                         tuple(buckets) if kind == 'histogram' else None)
+
+    def _series(self, name, labels):
+        family = self._families[f"{self.namespace}_{name}"]
+        key = tuple(sorted(labels.items())) if labels else ()
+        series = family[3].get(key)
+        if series is None:
+            state = _Histogram(family[2]) if family[0] == 'histogram' else 0
+            series = family[3][key] = [state, None]
+        return series
+
+    def inc(self, name, labels=None, amount=1):
+        with self._lock:
+            series = self._series(name, labels)
+            series[0] += amount
+            series[1] = None
+
+    def set(self, name, labels=None, value=0):
+        with self._lock:
+            series = self._series(name, labels)
+            series[0] = value
+            series[1] = None
+
+    def observe(self, name, labels=None, value=0):
+        with self._lock:
+            series = self._series(name, labels)
+            series[0].observe(value)
+            series[1] = None
+
+    def remove(self, label, value, **labels):
+        """Drop every series carrying ``label=value`` (e.g. a removed stream),
+        narrowed to series that also carry all of ``labels``"""
+        match = {(label, value), *labels.items()}
+        with self._lock:
+            for family in self._families.values():
+                for key in [key for key in family[3] if match.issubset(key)]:
+                    del family[3][key]
+
+    def label_values(self, label):
+        with self._lock:
+            return {
+                value for family in self._families.values()
+                for key in family[3] for name, value in key if name == label
+            }
+
+    def add_collector(self, collector):
+        """``collector(exporter)`` runs at scrape time for cheap app-level gauges"""
+        self._collectors.append(collector)
+
+    def render(self):
+        for collector in self._collectors:
+            collector(self)
+
+        output = []
+        with self._lock:
+            for name, (kind, help_text, _, series) in self._families.items():
+                output.append(f"# HELP {name} {help_text}")
+                output.append(f"# TYPE {name} {kind}")
+                for key, entry in series.items():
+                    if entry[1] is None:
+                        if kind == 'histogram':
+                            entry[1] = entry[0].render(name, key)
+                        else:
+                            entry[1] = f"{name}{_format_labels(key)} {_format_value(entry[0])}"
+                    output.append(entry[1])
+        output.append('')
+        return '\n'.join(output)
+
+
+def define_metrics(exporter):
+    """Declare the monitor's metric families on ``exporter``"""
+    exporter.define('playlist_fetch_seconds', 'histogram', 'Playlist fetch latency by playlist kind')
+    exporter.define('segment_response_seconds', 'histogram', 'Latency of segment availability checks')
+    exporter.define('segment_ttfb_seconds', 'histogram', 'Time to first byte of probed live-edge segments')
+    exporter.define('probe_duration_seconds', 'histogram', 'Segment analysis time by analyzer')
+    exporter.define('stream_success_ratio', 'gauge', 'Share of recent segments answering HTTP 200')
+    exporter.define('stream_media_sequence', 'gauge', 'Last media sequence number seen')
+    exporter.define('stream_media_sequence_lag', 'gauge', 'Target durations since the media sequence last advanced')
+    exporter.define('stream_missed_segments', 'gauge', 'Segments that expired between two polls since tracking started')
+    exporter.define('stream_playlist_age_seconds', 'gauge', 'Seconds since the media sequence last advanced')
+    exporter.define('stream_edge_latency_seconds', 'gauge', 'Wall clock minus PROGRAM-DATE-TIME end of the newest segment')
+    exporter.define('stream_update_interval_seconds', 'gauge', 'Smoothed interval between playlist advances')
+    exporter.define('stream_stale', 'gauge', '1 while the playlist has not advanced for 1.5x its target duration')
+    exporter.define('stream_stale_events_total', 'counter', 'Times the playlist went stale since tracking started')
+    exporter.define('stream_polls_total', 'counter', 'Monitor polls by result')
+    exporter.define('rendition_throughput_mbps', 'gauge', 'Sampled live-edge delivery speed per rendition')
+    exporter.define('rendition_bandwidth_ratio', 'gauge', 'Sampled delivery speed divided by declared BANDWIDTH')
+    exporter.define('rendition_ttfb_seconds', 'histogram', 'Time to first byte of sampled rendition segments')
+    exporter.define('cache_hits_total', 'counter', 'Cache hits by cache')
+    exporter.define('cache_misses_total', 'counter', 'Cache misses by cache')
+    exporter.define('cache_hit_ratio', 'gauge', 'Cache hit ratio by cache')
+    exporter.define('monitored_streams', 'gauge', 'Streams registered with the background monitor')
+    exporter.define('probe_queue_depth', 'gauge', 'Probes waiting for a worker')
+    exporter.define('process_resident_bytes', 'gauge', 'Resident memory of the monitor process')
+    exporter.define('process_threads', 'gauge', 'Threads in the monitor process')
+    exporter.define('process_open_fds', 'gauge', 'Open file descriptors of the monitor process')
+    exporter.define('ffprobe_processes', 'gauge', 'Running ffprobe child processes')
+    exporter.define('http_pool_requests_total', 'counter', 'Requests through the connection pools by transport and origin')
+    exporter.define('http_pool_new_connections_total', 'counter', 'Connections opened by transport and origin')
+    exporter.define('http_pool_reused_total', 'counter', 'Requests served on a kept-alive connection')
+    exporter.define('http_pool_in_use', 'gauge', 'Connections currently checked out of the pool')
+    exporter.define('http_pool_waits_total', 'counter', 'Requests that waited for a free pooled connection')
+    exporter.define('http_pool_overflow_total', 'counter', 'Connections closed because the pool was full')
+    exporter.define('dns_cache_hits_total', 'counter', 'DNS lookups answered from the cache')
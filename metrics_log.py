@@ -0,0 +1,395 @@
+"""
+Optional on-disk metrics history for HLS Stream Monitor
+
+Every monitor sample is appended as one fixed-size binary record (float64
+timestamp + float32 per column) to a per-stream log file, rotated by size
+and age and pruned by retention. Reads memory-map the files and binary
+search the timestamps, so a downsampled 24 h range only touches the
+records it returns. A block index next to each file keeps count, min,
+max, sum and last value per column for every BLOCK_RECORDS records, so
+aggregates over a range only read the records of its two edge blocks.
+
+Disabled unless a directory is configured: by default nothing is written
+to disk (see PRIVACY.md).
+"""
+
+import os
+import mmap
+import time
+import struct
+import hashlib
+import logging
+import threading
+
+MAGIC = b'HLSM'
+VERSION = 1
+HEADER_SIZE = 512  # magic, version, column count, column names (padded)
+BLOCK_RECORDS = 256  # Records summarized by one block-index entry
+
+
+def _header(columns):
+    names = ','.join(columns).encode('utf-8')
+    header = MAGIC + struct.pack('<HH', VERSION, len(columns)) + names
+    if len(header) > HEADER_SIZE:
+        raise ValueError('Too many metric columns for the log header')
+    return header.ljust(HEADER_SIZE, b'\x00')
+
+
+def _block_struct(count):
+    # Per column: present values, min, max, sum and last present value
+    return struct.Struct('<' + 'Iffdf' * count)
+
+
+def _empty_totals():
+    return [0, None, None, 0.0, None]
+
+
+def _add(totals, value):
+    if value != value:
+        return  # Missing
+    if totals[0]:
+        totals[1] = min(totals[1], value)
+        totals[2] = max(totals[2], value)
+    else:
+        totals[1] = totals[2] = value
+    totals[0] += 1
+    totals[3] += value
+    totals[4] = value
+
+
+def _merge(totals, count, low, high, total, last):
+    if not count:
+        return
+    if totals[0]:
+        totals[1] = min(totals[1], low)
+        totals[2] = max(totals[2], high)
+    else:
+        totals[1], totals[2] = low, high
+    totals[0] += count
+    totals[3] += total
+    totals[4] = last
+
+
+def _summary(totals):
+    # Same shape as timeseries.summarize()
+    count, low, high, total, last = totals
+    if not count:
+        return {'count': 0, 'min': None, 'max': None, 'avg': None, 'last': None}
+    return {'count': count, 'min': low, 'max': high, 'avg': total / count, 'last': last}
+
+
+class StreamLog:
+    """Append-only, rotated record files for one stream"""
+    def __init__(self, directory, url, columns, max_file_bytes, max_file_age, retention):
+        self.directory = directory
+        self.url = url
+        self.columns = tuple(columns)
+        self.record = struct.Struct('<d' + 'f' * len(self.columns))
+        self.block = _block_struct(len(self.columns))
+        self.max_file_bytes = max_file_bytes
+        self.max_file_age = max_file_age
+        self.retention = retention
+        self._file = None
+        self._file_started = None
+        self._file_size = 0
+        self._index = None
+        self._block_totals = None
+        self._block_records = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        url_path = os.path.join(directory, 'stream.url')
+        if not os.path.exists(url_path):
+            with open(url_path, 'w', encoding='utf-8') as f:
+                f.write(url)
+
+    def _files(self):
+        # (start timestamp, path) for every log file, oldest first
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.log'):
+                try:
+                    files.append((float(name[:-4]), os.path.join(self.directory, name)))
+                except ValueError:
+                    continue
+        return sorted(files)
+
+    def _rotate(self, timestamp):
+        if self._file is not None:
+            self._file.close()
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+        path = os.path.join(self.directory, f"{timestamp:.3f}.log")
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(_header(self.columns))
+            # Only a file indexed from its first record gets an index
+            self._index = open(path[:-4] + '.idx', 'wb')
+        self._block_totals = [_empty_totals() for _ in self.columns]
+        self._block_records = 0
+        self._file_started = timestamp
+        self._file_size = self._file.tell()
+        self._prune(timestamp)
+
+    def _prune(self, now):
+        # A file is expired once the file after it started before the cutoff
+        files = self._files()
+        for (started, path), (next_started, _) in zip(files, files[1:]):
+            if next_started < now - self.retention:
+                try:
+                    os.remove(path)
+                    if os.path.exists(path[:-4] + '.idx'):
+                        os.remove(path[:-4] + '.idx')
+                except OSError as e:
+                    logging.warning(f"Could not remove expired metrics log {path}: {e}")
+
+    def append(self, timestamp, values):
+        data = self.record.pack(timestamp, *[
+            _float(values.get(name)) for name in self.columns
+        ])
+        with self._lock:
+            if (self._file is None or self._file_size + len(data) > self.max_file_bytes or
+                    timestamp - self._file_started > self.max_file_age):
+                self._rotate(timestamp)
+            self._file.write(data)
+            self._file.flush()
+            self._file_size += len(data)
+            if self._index is not None:
+                self._add_to_block(self.record.unpack(data)[1:])
+
+    def _add_to_block(self, values):
+        # Values as stored (float32), so the index agrees with the records
+        for totals, value in zip(self._block_totals, values):
+            _add(totals, value)
+        self._block_records += 1
+        if self._block_records == BLOCK_RECORDS:
+            nan = float('nan')
+            self._index.write(self.block.pack(*[
+                nan if value is None else value for totals in self._block_totals for value in totals
+            ]))
+            self._index.flush()
+            self._block_totals = [_empty_totals() for _ in self.columns]
+            self._block_records = 0
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self._index is not None:
+                self._index.close()
+                self._index = None
+
+    def query(self, start=None, end=None, columns=None, max_points=None):
+        """Samples in [start, end] as {'timestamp': [...], column: [...]}.
+
+        With ``max_points`` the range is split into that many equal time
+        buckets and the first sample of each bucket is returned.
+        """
+        columns = [name for name in (columns or self.columns) if name in self.columns]
+        result = {'timestamp': [], **{name: [] for name in columns}}
+        files = self._files()
+        if not files:
+            return result
+        end = end if end is not None else time.time()
+        # File names are rounded to the millisecond: without a start, take everything
+        step = (end - (files[0][0] if start is None else start)) / max_points if max_points else 0
+        start = float('-inf') if start is None else start
+
+        for i, (started, path) in enumerate(files):
+            if started > end or (i + 1 < len(files) and files[i + 1][0] < start):
+                continue
+            self._read_file(path, start, end, step, columns, result)
+        return result
+
+    def aggregate(self, start=None, end=None, columns=None):
+        """count/min/max/avg/last per column over [start, end], ignoring
+        missing values, plus the (oldest, newest) timestamps in the range.
+
+        Whole blocks come from the block index; only records of partly
+        covered blocks (or of files without an index) are read.
+        """
+        columns = [name for name in (columns or self.columns) if name in self.columns]
+        totals = {name: _empty_totals() for name in columns}
+        span = [None, None]
+        end = end if end is not None else time.time()
+        start = float('-inf') if start is None else start
+        files = self._files()
+        for i, (started, path) in enumerate(files):
+            if started > end or (i + 1 < len(files) and files[i + 1][0] < start):
+                continue
+            self._aggregate_file(path, start, end, columns, totals, span)
+        return {name: _summary(totals[name]) for name in columns}, tuple(span)
+
+    def _aggregate_file(self, path, start, end, columns, totals, span):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= HEADER_SIZE:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                if view[:4] != MAGIC:
+                    return
+                file_columns = bytes(view[8:HEADER_SIZE]).rstrip(b'\x00').decode('utf-8').split(',')
+                record = struct.Struct('<d' + 'f' * len(file_columns))
+                count = (size - HEADER_SIZE) // record.size
+                indexes = [(name, file_columns.index(name)) for name in columns if name in file_columns]
+
+                def timestamp_at(i):
+                    return struct.unpack_from('<d', view, HEADER_SIZE + i * record.size)[0]
+
+                low = _bisect(timestamp_at, count, start)
+                high = _bisect(timestamp_at, count, end, low, right=True)
+                if low >= high:
+                    return
+                if span[0] is None:
+                    span[0] = timestamp_at(low)
+                span[1] = timestamp_at(high - 1)
+
+                def read_records(first, last):
+                    for position in range(first, last):
+                        row = record.unpack_from(view, HEADER_SIZE + position * record.size)
+                        for name, index in indexes:
+                            _add(totals[name], row[index + 1])
+
+                block = _block_struct(len(file_columns))
+                try:
+                    with open(path[:-4] + '.idx', 'rb') as f:
+                        entries = f.read()
+                except OSError:
+                    entries = b''
+                blocks = min(len(entries) // block.size, count // BLOCK_RECORDS)
+                first_block = -(-low // BLOCK_RECORDS)
+                last_block = min(high // BLOCK_RECORDS, blocks)
+                if first_block >= last_block:
+                    read_records(low, high)
+                    return
+                read_records(low, first_block * BLOCK_RECORDS)
+                for number in range(first_block, last_block):
+                    entry = block.unpack_from(entries, number * block.size)
+                    for name, index in indexes:
+                        _merge(totals[name], *entry[index * 5:index * 5 + 5])
+                read_records(last_block * BLOCK_RECORDS, high)
+
+    def _read_file(self, path, start, end, step, columns, result):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= HEADER_SIZE:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                if view[:4] != MAGIC:
+                    return
+                file_columns = bytes(view[8:HEADER_SIZE]).rstrip(b'\x00').decode('utf-8').split(',')
+                record = struct.Struct('<d' + 'f' * len(file_columns))
+                count = (size - HEADER_SIZE) // record.size
+                indexes = [file_columns.index(name) + 1 if name in file_columns else None for name in columns]
+
+                def timestamp_at(i):
+                    return struct.unpack_from('<d', view, HEADER_SIZE + i * record.size)[0]
+
+                position = _bisect(timestamp_at, count, start)
+                while position < count:
+                    row = record.unpack_from(view, HEADER_SIZE + position * record.size)
+                    if row[0] > end:
+                        break
+                    result['timestamp'].append(row[0])
+                    for name, index in zip(columns, indexes):
+                        value = row[index] if index is not None else None
+                        result[name].append(None if value is None or value != value else value)
+                    if step:
+                        # Jump straight to the next time bucket
+                        position = max(position + 1, _bisect(timestamp_at, count, row[0] + step, position + 1))
+                    else:
+                        position += 1
+
+
+class MetricsLog:
+    """Per-stream StreamLogs under one directory"""
+    def __init__(self, directory, columns, max_file_bytes=16 * 1024 * 1024,
+                 max_file_age=86400, retention=7 * 86400):
+        self.directory = directory
+        self.columns = tuple(columns)
+        self.max_file_bytes = max_file_bytes
+        self.max_file_age = max_file_age
+        self.retention = retention
+        self._streams = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _stream(self, url):
+        with self._lock:
+            log = self._streams.get(url)
+            if log is None:
+                log = StreamLog(os.path.join(self.directory, _stream_key(url)), url, self.columns,
+                                self.max_file_bytes, self.max_file_age, self.retention)
+                self._streams[url] = log
+            return log
+
+    def append(self, url, timestamp, values):
+        try:
+            self._stream(url).append(timestamp, values)
+        except OSError as e:
+            logging.error(f"Could not write metrics log for {url}: {e}")
+
+    def _reader(self, url):
+        with self._lock:
+            log = self._streams.get(url)
+        if log is None:
+            directory = os.path.join(self.directory, _stream_key(url))
+            if not os.path.isdir(directory):
+                return None
+            # Read-only: not registered, so no file is opened for appending
+            log = StreamLog(directory, url, self.columns, self.max_file_bytes, self.max_file_age, self.retention)
+        return log
+
+    def query(self, url, start=None, end=None, columns=None, max_points=None):
+        """Logged samples of a stream, monitored right now or not"""
+        log = self._reader(url)
+        if log is None:
+            columns = [name for name in (columns or self.columns) if name in self.columns]
+            return {'timestamp': [], **{name: [] for name in columns}}
+        return log.query(start, end, columns, max_points)
+
+    def aggregate(self, url, start=None, end=None, columns=None):
+        """Per-column aggregates and (oldest, newest) of a stream's logged samples"""
+        log = self._reader(url)
+        if log is None:
+            columns = [name for name in (columns or self.columns) if name in self.columns]
+            return {name: _summary(_empty_totals()) for name in columns}, (None, None)
+        return log.aggregate(start, end, columns)
+
+    def release(self, url):
+        """Close a stream's log file once it is no longer monitored (its data stays on disk)"""
+        with self._lock:
+            log = self._streams.pop(url, None)
+        if log is not None:
+            log.close()
+
+    def close(self):
+        with self._lock:
+            logs = list(self._streams.values())
+        for log in logs:
+            log.close()
+
+
+def _stream_key(url):
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+
+
+def _bisect(timestamp_at, count, timestamp, low=0, right=False):
+    # First record index with a timestamp >= ``timestamp`` (> with ``right``)
+    high = count
+    while low < high:
+        middle = (low + high) // 2
+        value = timestamp_at(middle)
+        if value < timestamp or (right and value == timestamp):
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def _float(value):
+    try:
+        return float(value) if value is not None else float('nan')
+    except (TypeError, ValueError):
+        return float('nan')
@@ -0,0 +1,307 @@
+"""
+Background stream monitor for HLS Stream Monitor
+
+Keeps a registry of playlist URLs, each with its own state, history and
+adaptive refresh interval. A single heap-based scheduler drives the polls
+for the whole fleet; each stream polls at its own hashed phase of its
+refresh interval, so streams sharing a target duration never fire at once;
+API endpoints read the latest in-memory snapshot instead of refetching,
+and subscribers of an EventBroker get a delta as soon as a poll finishes.
+"""
+
+import time
+import zlib
+import heapq
+import logging
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from optimizations import AdaptiveRefresh
+from playlist_tracker import PlaylistTracker
+from events import snapshot_delta
+from timeseries import TimeSeries
+from rollups import StreamRollups
+
+
+class PollScheduler:
+    """Single timer heap dispatching due polls to a bounded worker pool"""
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._executor = None
+        self._thread = None
+        self._running = False
+
+    def _start(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="hls-poll")
+        self._thread = threading.Thread(target=self._run, name="hls-poll-scheduler", daemon=True)
+        self._running = True
+        self._thread.start()
+
+    def schedule(self, due, callback):
+        """Run ``callback`` on the worker pool at (or just after) ``due``"""
+        with self._cond:
+            if not self._running:
+                self._start()
+            heapq.heappush(self._heap, (due, next(self._seq), callback))
+            self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return len(self._heap)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running:
+                    now = time.time()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+                if not self._running:
+                    return
+                _, _, callback = heapq.heappop(self._heap)
+            self._executor.submit(callback)
+
+    def shutdown(self):
+        with self._cond:
+            self._running = False
+            self._heap.clear()
+            self._cond.notify_all()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+
+# Per-poll metrics kept in each stream's columnar history
+HISTORY_COLUMNS = (
+    'success_rate', 'avg_response_time', 'avg_bitrate', 'video_bitrate', 'audio_bitrate',
+    'avg_duration', 'total_segments', 'segment_ttfb', 'segment_throughput', 'edge_latency',
+    'playlist_age', 'error'
+)
+HISTORY_ROWS = 24 * 3600  # Per stream: a day of 1 s samples, 56 B each (about 4.6 MiB)
+
+
+def snapshot_metrics(snapshot):
+    """Flatten a collector snapshot into HISTORY_COLUMNS values"""
+    if snapshot.get('error'):
+        return {'error': 1}
+    stats = snapshot.get('stats') or {}
+    segments = snapshot.get('recent_segments') or []
+    download = snapshot.get('segment_download') or {}
+    live_edge = (snapshot.get('playlist_tracking') or {}).get('live_edge') or {}
+    response_times = [segment['response_time'] for segment in segments if segment.get('response_time')]
+    return {
+        'success_rate': stats.get('success_rate'),
+        'avg_response_time': sum(response_times) / len(response_times) if response_times else None,
+        'avg_bitrate': stats.get('avg_bitrate'),
+        'video_bitrate': stats.get('video_bitrate'),
+        'audio_bitrate': stats.get('audio_bitrate'),
+        'avg_duration': stats.get('avg_duration'),
+        'total_segments': snapshot.get('total_segments'),
+        'segment_ttfb': download.get('ttfb_ms'),
+        'segment_throughput': download.get('throughput_mbps'),
+        'edge_latency': live_edge.get('edge_latency'),
+        'playlist_age': live_edge.get('playlist_age'),
+        'error': 0
+    }
+
+
+class MonitoredStream:
+    """State for a single registered playlist URL"""
+    def __init__(self, url, pinned=False, all_variants=False):
+        self.url = url
+        self.pinned = pinned  # Pinned streams are never stopped for being idle
+        self.all_variants = all_variants  # Analyze every rendition, not just the first
+        self.phase = poll_phase(url)
+        self.active = True
+        self.snapshot = None
+        self.updated_at = None
+        self.next_poll_at = None
+        self.poll_count = 0
+        self.error_count = 0
+        self.last_access = time.time()
+        self.ready = threading.Event()
+        self.history = TimeSeries(HISTORY_COLUMNS, capacity=HISTORY_ROWS)
+        self.rollups = StreamRollups(HISTORY_COLUMNS)  # 1m/5m/1h chart buckets
+        self.adaptive_refresh = AdaptiveRefresh()
+        self.playlist_tracker = PlaylistTracker()
+        self.media_info = None  # Latest probe result for the live edge
+
+    def touch(self):
+        self.last_access = time.time()
+
+    def get_info(self):
+        now = time.time()
+        return {
+            'url': self.url,
+            'pinned': self.pinned,
+            'all_variants': self.all_variants,
+            'poll_count': self.poll_count,
+            'error_count': self.error_count,
+            'updated_at': self.updated_at,
+            'age': round(now - self.updated_at, 3) if self.updated_at else None,
+            'next_poll_in': round(max(0, self.next_poll_at - now), 3) if self.next_poll_at else None,
+            'idle_for': round(now - self.last_access, 3),
+            'refresh_interval': self.adaptive_refresh.get_optimal_interval(),
+            'history_size': len(self.history)
+        }
+
+
+def poll_phase(url):
+    """Stable offset in [0, 1) of a stream's polls within its refresh interval"""
+    # crc32, not hash(): the same in every process and across restarts
+    return zlib.crc32(url.encode('utf-8')) / 2 ** 32
+
+
+def stream_topic(url):
+    """Event topic carrying snapshot deltas for a playlist URL"""
+    return f"stream:{url}"
+
+
+class MonitorEngine:
+    """Fleet registry whose polls are driven by one shared scheduler"""
+    def __init__(self, collector, idle_timeout=300, max_workers=8, first_poll_spread=2.0, broker=None,
+                 metrics_log=None, on_remove=None):
+        # collector(url, stream) -> snapshot dict, raises on failure
+        self.collector = collector
+        self.idle_timeout = idle_timeout
+        self.broker = broker  # Optional EventBroker receiving per-poll deltas
+        self.metrics_log = metrics_log  # Optional MetricsLog persisting history samples
+        self.on_remove = on_remove  # on_remove(url) after a stream stops being monitored
+        self.first_poll_spread = first_poll_spread  # Seconds over which pinned streams start
+        self.scheduler = PollScheduler(max_workers=max_workers)
+        self.streams = {}
+        self._lock = threading.Lock()
+
+    def register(self, url, pinned=False, all_variants=False):
+        """Start polling a playlist URL (no-op if already registered)"""
+        with self._lock:
+            stream = self.streams.get(url)
+            if stream is None:
+                stream = MonitoredStream(url, pinned=pinned, all_variants=all_variants)
+                self.streams[url] = stream
+                # Readers wait for the first poll of an on-demand stream; pinned
+                # ones often arrive in bulk, so they start at their phase
+                delay = stream.phase * self.first_poll_spread if pinned else 0
+                self.scheduler.schedule(time.time() + delay, lambda: self._poll(stream))
+                logging.info(f"Monitor registered stream: {url}")
+            else:
+                stream.pinned = stream.pinned or pinned
+                stream.all_variants = stream.all_variants or all_variants
+            stream.touch()
+            return stream
+
+    def unregister(self, url):
+        """Stop polling a playlist URL"""
+        with self._lock:
+            stream = self.streams.pop(url, None)
+        if stream:
+            stream.active = False
+            logging.info(f"Monitor unregistered stream: {url}")
+            self._removed(url)
+        return stream is not None
+
+    def get_stream(self, url):
+        with self._lock:
+            return self.streams.get(url)
+
+    def get_snapshot(self, url, wait=0, all_variants=False):
+        """Return the latest snapshot for a URL, registering it if needed.
+
+        Only the very first read of a stream waits (up to ``wait`` seconds)
+        for the initial poll; every later read is a plain memory lookup.
+        """
+        stream = self.register(url, all_variants=all_variants)
+        if stream.snapshot is None and wait:
+            stream.ready.wait(wait)
+        return stream.snapshot, stream
+
+    def list_streams(self):
+        with self._lock:
+            streams = list(self.streams.values())
+        return [stream.get_info() for stream in streams]
+
+    def stop_all(self):
+        with self._lock:
+            streams = list(self.streams.values())
+            self.streams.clear()
+        for stream in streams:
+            stream.active = False
+        self.scheduler.shutdown()
+
+    def _removed(self, url):
+        if self.metrics_log is not None:
+            self.metrics_log.release(url)
+        if self.on_remove is not None:
+            try:
+                self.on_remove(url)
+            except Exception as e:
+                logging.error(f"Stream removal hook failed for {url}: {e}")
+
+    def _next_interval(self, stream, snapshot):
+        """Reload every target duration for live playlists, adaptive otherwise"""
+        refresh = stream.adaptive_refresh
+        interval = refresh.get_optimal_interval()
+        if snapshot and not snapshot.get('error') and not snapshot.get('is_endlist'):
+            target_duration = snapshot.get('target_duration') or 0
+            if target_duration > 0:
+                interval = min(refresh.max_interval, max(1, target_duration))
+        return interval
+
+    def _next_poll_at(self, stream, interval):
+        """Nearest tick of the stream's phase grid to one interval from now"""
+        # Snapping keeps the cadence from drifting by the poll duration and
+        # spreads streams sharing an interval evenly across it
+        offset = stream.phase * interval
+        return offset + round((stream.updated_at + interval - offset) / interval) * interval
+
+    def _publish(self, stream, previous, snapshot):
+        topic = stream_topic(stream.url)
+        if self.broker is None or not self.broker.has_subscribers(topic):
+            return
+        changed, removed = snapshot_delta(previous, snapshot)
+        self.broker.publish(topic, 'snapshot', {
+            'topic': topic,
+            'full': previous is None,
+            'changed': changed,
+            'removed': removed,
+            'monitor': stream.get_info()
+        })
+
+    def _poll(self, stream):
+        if not stream.active:
+            return
+        if not stream.pinned and time.time() - stream.last_access > self.idle_timeout:
+            logging.info(f"Monitor stopping idle stream: {stream.url}")
+            with self._lock:
+                if self.streams.get(stream.url) is stream:
+                    del self.streams[stream.url]
+            stream.active = False
+            self._removed(stream.url)
+            return
+
+        try:
+            snapshot = self.collector(stream.url, stream)
+        except Exception as e:
+            stream.error_count += 1
+            logging.error(f"Monitor poll failed for {stream.url}: {e}")
+            snapshot = {'error': str(e)}
+
+        stream.poll_count += 1
+        previous = stream.snapshot
+        stream.snapshot = snapshot
+        stream.updated_at = time.time()
+        metrics = snapshot_metrics(snapshot)
+        stream.history.append(stream.updated_at, metrics)
+        stream.rollups.add(stream.updated_at, metrics)
+        if self.metrics_log is not None and stream.active:  # Removed streams' logs are released
+            self.metrics_log.append(stream.url, stream.updated_at, metrics)
+        stream.ready.set()
+
+        if stream.active:
+            stream.next_poll_at = self._next_poll_at(stream, self._next_interval(stream, snapshot))
+            self.scheduler.schedule(stream.next_poll_at, lambda: self._poll(stream))
+        self._publish(stream, previous, snapshot)
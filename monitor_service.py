@@ -0,0 +1,280 @@
+"""
+Monitor service for HLS Stream Monitor
+
+The one place routes get stream state from. Every argument and return
+value is plain, picklable data, so the same object answers calls made
+directly in a single process and calls arriving over the local socket
+from web workers when polling runs in a dedicated process
+(see service_ipc.py and poller.py).
+"""
+
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime
+
+from optimizations import OptimizedHTTPSession, AdaptiveRefresh, performance_monitor
+from fetch_engine import AsyncFetchEngine
+from config import config
+from monitor import stream_topic
+from probe_service import ProbeService
+
+
+class _EventClient:
+    """Server-side state of one event stream connection"""
+    __slots__ = ('subscription', 'streams', 'send_full', 'last_read')
+
+    def __init__(self, subscription, streams):
+        self.subscription = subscription
+        self.streams = streams
+        self.send_full = True
+        self.last_read = time.time()
+
+
+class MonitorService:
+    """Plain-data API over the monitor, probes, events and metrics"""
+    AGGREGATE_COLUMNS = ('success_rate', 'avg_response_time', 'avg_bitrate', 'segment_ttfb')
+
+    def __init__(self, monitor, broker, probes, exporter, sampler, metrics_log=None,
+                 first_snapshot_timeout=30, stats_interval=5, periodic_topics=('performance', 'system'),
+                 client_timeout=60):
+        self.monitor = monitor
+        self.broker = broker
+        self.probes = probes
+        self.exporter = exporter
+        self.sampler = sampler
+        self.metrics_log = metrics_log
+        self.first_snapshot_timeout = first_snapshot_timeout
+        self.stats_interval = stats_interval
+        self.periodic_topics = tuple(periodic_topics)
+        self.client_timeout = client_timeout  # Event clients silent this long are dropped
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+        self._periodic_running = False
+        self._periodic_lock = threading.Lock()
+
+    # Streams
+
+    def live_metrics(self, url, all_variants=False):
+        """Latest snapshot plus monitor info, or None while the first poll runs"""
+        snapshot, stream = self.monitor.get_snapshot(
+            url, wait=self.first_snapshot_timeout, all_variants=all_variants
+        )
+        if snapshot is None:
+            return None
+        response = dict(snapshot)
+        response['monitor'] = stream.get_info()
+        return response
+
+    def register(self, urls, all_variants=False):
+        """Pin streams for fleet monitoring"""
+        for url in urls:
+            self.monitor.register(url, pinned=True, all_variants=all_variants)
+        return list(urls)
+
+    def unregister(self, url):
+        return self.monitor.unregister(url)
+
+    def list_streams(self):
+        return {
+            'streams': self.monitor.list_streams(),
+            'scheduled_polls': self.monitor.scheduler.pending()
+        }
+
+    def stream_history(self, url, seconds=None, max_points=500, persistent=False):
+        """Raw metric history with aggregates, or None if there is none for the stream.
+
+        ``persistent`` reads the on-disk log, which outlives restarts and
+        the stream being monitored at all.
+        """
+        stream = self.monitor.get_stream(url)
+        start = time.time() - seconds if seconds else None
+        if self.metrics_log is not None and persistent:
+            history = self.metrics_log.query(url, start=start, max_points=max_points)
+            if stream is None and not history['timestamp']:
+                return None
+            # From the log's block index: no second pass over every logged record
+            aggregates, (oldest, newest) = self.metrics_log.aggregate(
+                url, start=start, columns=self.AGGREGATE_COLUMNS
+            )
+            span = {'oldest': oldest, 'newest': newest}
+        else:
+            if stream is None:
+                return None
+            history = stream.history.query(start=start, max_points=max_points)
+            aggregates = {
+                column: stream.history.aggregate(column, start=start)
+                for column in self.AGGREGATE_COLUMNS
+            }
+            oldest, newest = stream.history.span()
+            span = {'oldest': oldest, 'newest': newest, 'bytes': stream.history.memory_bytes}
+        return {
+            'stream': stream.get_info() if stream is not None else None,
+            'history': history,
+            'aggregates': aggregates,
+            'history_span': span
+        }
+
+    def rollup_history(self, url, seconds, max_points, resolution=None, metrics=None):
+        """Rolled-up chart history; None if not monitored, ValueError for a bad resolution"""
+        stream = self.monitor.get_stream(url)
+        if stream is None:
+            return None
+        resolution = resolution or stream.rollups.pick_resolution(seconds, max_points)
+        if resolution not in stream.rollups.resolutions:
+            raise ValueError(f'Unknown resolution: {resolution}')
+        end = time.time()
+        history = stream.rollups.query(resolution, start=end - seconds, end=end, metrics=metrics)
+        history['url'] = url
+        history['seconds'] = seconds
+        return history
+
+    def probe_segment(self, url, timeout):
+        """Interactive segment analysis; (info or None, job status)"""
+        job = self.probes.submit(url, priority=ProbeService.PRIORITY_INTERACTIVE)
+        return job.wait(timeout), job.status
+
+    # Stats
+
+    def health(self):
+        memory_usage = self.sampler.latest()['memory']['percent']
+        return {'memory_usage': memory_usage, 'performance': performance_monitor.get_stats()}
+
+    def system_metrics(self, history_seconds=None):
+        """Latest host and process sample from the background sampler"""
+        sample = self.sampler.latest()
+        if sample is None:
+            raise RuntimeError('No system sample available')
+        metrics = dict(sample, sample_age=round(time.time() - sample['sampled_at'], 3))
+        if history_seconds:
+            metrics['history'] = self.sampler.history(history_seconds)
+        return metrics
+
+    def performance_stats(self, url=None):
+        """Application performance statistics, optionally for one stream"""
+        stats = performance_monitor.get_stats()
+        streams = self.monitor.list_streams()
+        if url:
+            streams = [info for info in streams if info['url'] == url]
+
+        updated = [info['updated_at'] for info in streams if info['updated_at']]
+        stats['adaptive_refresh_interval'] = min(
+            (info['refresh_interval'] for info in streams), default=AdaptiveRefresh().base_interval
+        )
+        stats['monitored_streams'] = len(streams)
+        stats['cache_size'] = sum(info['history_size'] for info in streams)
+        stats['last_updated'] = datetime.fromtimestamp(max(updated)).isoformat() if updated else None
+        stats['playlist_fetch'] = dict(OptimizedHTTPSession().playlist_stats)
+        stats['http_pools'] = {
+            'sync': OptimizedHTTPSession().get_pool_stats(),
+            'async': AsyncFetchEngine().get_pool_stats()
+        }
+        stats['probe_service'] = self.probes.get_stats()
+        stats['events'] = self.broker.get_stats()
+        with self._clients_lock:
+            stats['events']['clients'] = len(self._clients)
+        return stats
+
+    # Config
+
+    def config_info(self):
+        return config.get_info()
+
+    def reload_config(self):
+        """Re-read the config file and environment; ValueError keeps the current values"""
+        return config.reload()
+
+    def metrics_text(self):
+        """Prometheus text exposition"""
+        return self.exporter.render()
+
+    # Events
+
+    def subscribe(self, urls, topics, all_variants=False):
+        """Open an event stream; returns the id to pass to next_events()"""
+        self._drop_stale_clients()
+        # Subscribe before registering so the first poll can't be missed
+        subscription = self.broker.subscribe([stream_topic(url) for url in urls] + list(topics))
+        streams = [self.monitor.register(url, all_variants=all_variants) for url in urls]
+        client_id = uuid.uuid4().hex
+        with self._clients_lock:
+            self._clients[client_id] = _EventClient(subscription, streams)
+        if any(topic in self.periodic_topics for topic in topics):
+            self._start_periodic()
+        return client_id
+
+    def next_events(self, client_id, timeout):
+        """Events for a client as (event, data, id) tuples, waiting up to ``timeout``.
+
+        The first call (and the first after the client's queue overflowed)
+        returns full snapshots of its streams.
+        """
+        with self._clients_lock:
+            client = self._clients.get(client_id)
+        if client is None:
+            raise KeyError(f'Unknown event client: {client_id}')
+        client.last_read = time.time()
+        subscription = client.subscription
+
+        messages = []
+        if client.send_full or subscription.resync:
+            client.send_full = subscription.resync = False
+            for stream in client.streams:
+                if stream.snapshot is not None:
+                    messages.append(('snapshot', {
+                        'topic': stream_topic(stream.url),
+                        'full': True,
+                        'changed': stream.snapshot,
+                        'removed': [],
+                        'monitor': stream.get_info()
+                    }, None))
+
+        events = subscription.get(timeout=0 if messages else timeout)
+        for stream in client.streams:
+            stream.touch()  # A connected browser keeps its streams alive
+        client.last_read = time.time()
+        messages.extend((event, data, seq) for seq, topic, event, data in events)
+        return messages
+
+    def unsubscribe(self, client_id):
+        with self._clients_lock:
+            client = self._clients.pop(client_id, None)
+        if client is not None:
+            client.subscription.close()
+
+    def _drop_stale_clients(self):
+        # Clients of a web worker that died never unsubscribe
+        cutoff = time.time() - self.client_timeout
+        with self._clients_lock:
+            stale = [client_id for client_id, client in self._clients.items() if client.last_read < cutoff]
+        for client_id in stale:
+            self.unsubscribe(client_id)
+
+    def _start_periodic(self):
+        with self._periodic_lock:
+            if self._periodic_running:
+                return
+            self._periodic_running = True
+        self.monitor.scheduler.schedule(time.time(), self._publish_periodic)
+
+    def _publish_periodic(self):
+        """Publish the performance and system topics, rescheduling while subscribed"""
+        try:
+            if self.broker.has_subscribers('performance'):
+                self.broker.publish('performance', 'performance', {
+                    'topic': 'performance', 'data': self.performance_stats()
+                })
+            if self.broker.has_subscribers('system'):
+                self.broker.publish('system', 'system', {
+                    'topic': 'system', 'data': self.system_metrics()
+                })
+        except Exception as e:
+            logging.error(f"Publishing periodic events failed: {e}")
+
+        self._drop_stale_clients()
+        with self._periodic_lock:
+            if any(self.broker.has_subscribers(topic) for topic in self.periodic_topics):
+                self.monitor.scheduler.schedule(time.time() + self.stats_interval, self._publish_periodic)
+            else:
+                self._periodic_running = False
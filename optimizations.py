@@ -3,13 +3,22 @@ Performance optimizations for HLS Stream Monitor
 """
 
 import time
+import hashlib
 import functools
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import math
+from collections import OrderedDict, deque
 import requests
-from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import json
+from contextlib import contextmanager
+
+from fetch_engine import AsyncFetchEngine
+from playlist_parser import load_playlist
+from config import config
+from transport import (
+    TrackingHTTPAdapter, create_http2_client, httpx_timeout, dns_cache, sync_pool_stats, RETRY_STATUSES
+)
 
 # Connection pooling and session management
 class OptimizedHTTPSession:
@@ -17,136 +26,554 @@ class OptimizedHTTPSession:
     _instance = None
     _lock = threading.Lock()
     
+    # Playlists remembered for conditional requests
+    PLAYLIST_CACHE_SIZE = 1000
+    
     def __new__(cls):
         if cls._instance is None:
             with cls._lock:
                 if cls._instance is None:
-                    cls._instance = super().__new__(cls)
-                    cls._instance._initialize()
+                    # Publish only once fully initialized
+                    instance = super().__new__(cls)
+                    instance._initialize()
+                    cls._instance = instance
         return cls._instance
     
     def _initialize(self):
         self.session = requests.Session()
+        self._playlist_cache = OrderedDict()
+        self._playlist_lock = threading.Lock()
+        self.playlist_stats = {'fetches': 0, 'not_modified': 0, 'unchanged_body': 0}
+        dns_cache.ttl = config.DNS_CACHE_TTL
         
         # Retry strategy
         retry_strategy = Retry(
-            total=3,
-            backoff_factor=0.3,
-            status_forcelist=[429, 500, 502, 503, 504],
+            total=config.CONNECTION_RETRY_TOTAL,
+            backoff_factor=config.CONNECTION_RETRY_BACKOFF,
+            status_forcelist=RETRY_STATUSES,
         )
         
-        # Mount adapter with retry strategy
-        adapter = HTTPAdapter(
-            max_retries=retry_strategy,
-            pool_connections=10,
-            pool_maxsize=20
-        )
+        # Pools are per origin; the longest matching mount prefix wins, so
+        # HOST_POOL_MAXSIZE entries override the default size for their origin
+        def adapter(maxsize):
+            return TrackingHTTPAdapter(
+                max_retries=retry_strategy,
+                pool_connections=config.CONNECTION_POOL_SIZE,
+                pool_maxsize=maxsize,
+                pool_block=config.CONNECTION_POOL_BLOCK
+            )
         
-        self.session.mount("http://", adapter)
-        self.session.mount("https://", adapter)
+        default = adapter(config.CONNECTION_POOL_MAXSIZE)
+        self.session.mount("http://", default)
+        self.session.mount("https://", default)
+        for origin, maxsize in config.HOST_POOL_MAXSIZE.items():
+            self.session.mount(origin.rstrip('/') + '/', adapter(maxsize))
         
-        # Disable SSL verification for HLS streams
-        self.session.verify = False
+        # SSL verification is off by default for HLS streams (config.VERIFY_SSL)
+        self.session.verify = config.VERIFY_SSL
         
         # Set reasonable timeouts
-        self.session.timeout = (5, 10)  # (connect, read)
+        self.session.timeout = (config.CONNECT_TIMEOUT, config.DEFAULT_TIMEOUT)  # (connect, read)
+        
+        # HTTPS GETs multiplex over HTTP/2 when the origin negotiates it
+        self.http2 = create_http2_client(
+            max([config.CONNECTION_POOL_MAXSIZE, *config.HOST_POOL_MAXSIZE.values()]),
+            retries=config.CONNECTION_RETRY_TOTAL,
+            verify=config.VERIFY_SSL
+        ) if config.HTTP2_ENABLED else None
         
     def get_session(self):
         return self.session
+    
+    def _use_http2(self, url):
+        return self.http2 is not None and url.startswith('https://')
+    
+    def _http2_send(self, url, headers=None, timeout=None, stream=False):
+        """GET on the HTTP/2 client, retrying the statuses the session's Retry does"""
+        request = self.http2.build_request('GET', url, headers=headers, timeout=httpx_timeout(timeout))
+        retries = config.CONNECTION_RETRY_TOTAL
+        for attempt in range(retries + 1):
+            response = self.http2.send(request, stream=stream)
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response
+            response.close()
+            time.sleep(config.CONNECTION_RETRY_BACKOFF * (2 ** attempt))
+    
+    def get(self, url, headers=None, timeout=None):
+        """GET through the HTTP/2 client for HTTPS origins when enabled, else the pooled session"""
+        timeout = timeout or (config.CONNECT_TIMEOUT, config.DEFAULT_TIMEOUT)
+        if self._use_http2(url):
+            return self._http2_send(url, headers=headers, timeout=timeout)
+        return self.session.get(url, headers=headers, timeout=timeout)
+    
+    @contextmanager
+    def stream(self, url, headers=None, timeout=None):
+        """Streamed GET yielding (status_code, iter_chunks(chunk_size=...))"""
+        timeout = timeout or (config.CONNECT_TIMEOUT, 2 * config.DEFAULT_TIMEOUT)
+        if self._use_http2(url):
+            response = self._http2_send(url, headers=headers, timeout=timeout, stream=True)
+            try:
+                yield response.status_code, response.iter_bytes
+            finally:
+                response.close()
+        else:
+            with self.session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                yield response.status_code, response.iter_content
+    
+    def get_pool_stats(self):
+        return {
+            'origins': sync_pool_stats.get_stats(),
+            'dns': dns_cache.get_stats(),
+            # HTTPS requests on the HTTP/2 client are counted in 'origins' but
+            # resolve names without the DNS cache
+            'http2': {'enabled': self.http2 is not None, 'dns_cache': False}
+        }
+    
+    def get_playlist(self, url, full=False, timeout=None):
+        """Fetch and parse a playlist, reusing the previous result when unchanged.
+        
+        Sends If-None-Match / If-Modified-Since from the last response and
+        short-circuits on 304 or an identical body hash, returning the cached
+        parsed playlist without reparsing.
+        """
+        with self._playlist_lock:
+            entry = self._playlist_cache.get(url)
+            self.playlist_stats['fetches'] += 1
+        
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        
+        response = self.get(url, headers=headers, timeout=timeout)
+        
+        if response.status_code == 304 and entry is not None:
+            with self._playlist_lock:
+                self.playlist_stats['not_modified'] += 1
+                self._playlist_cache.move_to_end(url)
+            return PlaylistResponse(response, entry, full, from_cache=True)
+        
+        if response.status_code != 200:
+            return PlaylistResponse(response, None)
+        
+        body = response.content
+        digest = hashlib.sha1(body).digest()
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        
+        if entry is not None and entry.digest == digest:
+            entry.etag, entry.last_modified = etag, last_modified
+            with self._playlist_lock:
+                self.playlist_stats['unchanged_body'] += 1
+                self._playlist_cache.move_to_end(url)
+            return PlaylistResponse(response, entry, full, from_cache=True)
+        
+        # HLS playlists are always UTF-8; skip requests' charset detection
+        entry = CachedPlaylist(body.decode('utf-8', errors='replace'), digest, etag, last_modified)
+        with self._playlist_lock:
+            self._playlist_cache[url] = entry
+            self._playlist_cache.move_to_end(url)
+            while len(self._playlist_cache) > self.PLAYLIST_CACHE_SIZE:
+                self._playlist_cache.popitem(last=False)
+        return PlaylistResponse(response, entry, full)
+
+class CachedPlaylist:
+    """Last playlist body seen for a URL, with validators and parsed forms"""
+    __slots__ = ('text', 'digest', 'etag', 'last_modified', 'parsed')
+    
+    def __init__(self, text, digest, etag=None, last_modified=None):
+        self.text = text
+        self.digest = digest
+        self.etag = etag
+        self.last_modified = last_modified
+        self.parsed = {}
+    
+    def parse(self, full=False):
+        playlist = self.parsed.get(full)
+        if playlist is None:
+            playlist = self.parsed[full] = load_playlist(self.text, full=full)
+        return playlist
+
+class PlaylistResponse:
+    """Result of OptimizedHTTPSession.get_playlist"""
+    __slots__ = ('status_code', 'entry', 'playlist', 'from_cache', 'elapsed')
+    
+    def __init__(self, response, entry, full=False, from_cache=False):
+        # A 304 still means the cached playlist is current
+        self.status_code = 200 if from_cache else response.status_code
+        self.entry = entry
+        self.playlist = entry.parse(full) if entry is not None else None
+        self.from_cache = from_cache
+        self.elapsed = response.elapsed.total_seconds()
+    
+    @property
+    def text(self):
+        return self.entry.text if self.entry is not None else None
+    
+    def parse(self, full=False):
+        """Parsed playlist in the requested form (cached per body)"""
+        return self.entry.parse(full) if self.entry is not None else None
+
+# Caching
+def estimate_size(value):
+    """Rough in-memory size of a cached value in bytes"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return 64 + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return 56 + sum(estimate_size(item) for item in value)
+    return 16
+
+
+class _Flight:
+    """A computation in progress that concurrent misses for the same key wait on"""
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry TTL, byte budget and single-flight loads.
+    
+    Entries live in an OrderedDict in LRU order, so lookups, inserts and
+    evictions are O(1). The lock is only held for bookkeeping: ``get_or_load``
+    runs the loader outside it, and concurrent misses for the same key wait
+    on the one computation instead of repeating it.
+    """
+    def __init__(self, ttl=300, maxsize=100, max_bytes=None, sizeof=estimate_size, name=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.name = name
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+    
+    def _lookup(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        if entry[0] <= now:
+            self._remove(key)
+            self.expirations += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, entry[2]
+    
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+    
+    def get(self, key, default=None):
+        with self._lock:
+            found, value = self._lookup(key, time.time())
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return default
+    
+    def set(self, key, value, ttl=None):
+        size = self.sizeof(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return  # Never worth evicting everything for one entry
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time() + (self.ttl if ttl is None else ttl), size, value)
+            self.bytes += size
+            while self._entries and (
+                    len(self._entries) > self.maxsize or
+                    (self.max_bytes and self.bytes > self.max_bytes)):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def get_or_load(self, key, loader):
+        """Return the cached value for ``key``, computing it once on a miss"""
+        with self._lock:
+            found, value = self._lookup(key, time.time())
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+        
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        
+        try:
+            flight.value = loader()
+            self.set(key, flight.value)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.event.set()
+    
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / lookups * 100, 2) if lookups else 0
+            }
+
+
+def _cache_key(args, kwargs):
+    key = (args, tuple(sorted(kwargs.items()))) if kwargs else args
+    try:
+        hash(key)
+    except TypeError:
+        key = repr(key)
+    return key
+
 
 # Caching decorator
-def timed_cache(seconds=300):
-    """Cache results for specified seconds"""
+def timed_cache(seconds=300, maxsize=100, max_bytes=None):
+    """Cache results for specified seconds (LRU, single-flight per key)"""
     def decorator(func):
-        cache = {}
-        cache_times = {}
-        lock = threading.Lock()
+        cache = TTLCache(ttl=seconds, maxsize=maxsize, max_bytes=max_bytes, name=func.__name__)
+        performance_monitor.register_cache(cache)
         
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            # Create cache key
-            key = str(args) + str(sorted(kwargs.items()))
-            
-            with lock:
-                # Check if cached and not expired
-                if key in cache and time.time() - cache_times[key] < seconds:
-                    return cache[key]
-                
-                # Execute function and cache result
-                result = func(*args, **kwargs)
-                cache[key] = result
-                cache_times[key] = time.time()
-                
-                # Clean old entries (keep cache size manageable)
-                if len(cache) > 100:
-                    oldest_key = min(cache_times.keys(), key=lambda k: cache_times[k])
-                    del cache[oldest_key]
-                    del cache_times[oldest_key]
-                
-                return result
+            return cache.get_or_load(_cache_key(args, kwargs), lambda: func(*args, **kwargs))
         
+        wrapper.cache = cache
         return wrapper
     return decorator
 
 # Concurrent segment checking
-def check_segments_concurrent(segment_urls, max_workers=5):
-    """Check multiple segments concurrently"""
-    session = OptimizedHTTPSession().get_session()
-    results = {}
-    
-    def check_single_segment(url):
-        try:
-            response = session.head(url, timeout=(2, 5))
-            return url, response.status_code, response.elapsed.total_seconds()
-        except Exception:
-            return url, 0, 0
-    
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_url = {executor.submit(check_single_segment, url): url for url in segment_urls}
-        
-        for future in as_completed(future_to_url, timeout=10):
-            try:
-                url, status, response_time = future.result()
-                results[url] = {
-                    'status_code': status,
-                    'response_time': response_time * 1000  # Convert to ms
-                }
-            except Exception:
-                url = future_to_url[future]
-                results[url] = {'status_code': 0, 'response_time': 0}
-    
-    return results
+def check_segments_concurrent(segment_urls, timeout=None):
+    """Check multiple segments concurrently on the shared async fetch engine"""
+    engine = AsyncFetchEngine()
+    try:
+        return engine.run(engine.check_segments_async(segment_urls), timeout=timeout or config.DEFAULT_TIMEOUT)
+    except Exception:
+        return {url: {'status_code': 0, 'response_time': 0} for url in segment_urls}
 
 # Memory-efficient data structures
 class CircularBuffer:
-    """Memory-efficient circular buffer for metrics history"""
-    def __init__(self, maxsize=50):
+    """Preallocated ring buffer with chronological views and running aggregates.
+    
+    Numeric items update sum, min, max and an EWMA as they are appended, so
+    reading stats never copies or rescans the buffer. Min and max use
+    monotonic deques (amortized O(1)); the running sum is re-derived once
+    per lap to stop float drift. Non-numeric items are stored but ignored
+    by the aggregates.
+    """
+    __slots__ = ('maxsize', 'alpha', '_items', '_index', '_count', '_appended',
+                 '_sum', '_numeric', '_min', '_max', '_ewma', '_lock')
+    
+    def __init__(self, maxsize=50, alpha=0.2):
         self.maxsize = maxsize
-        self.data = []
-        self.index = 0
+        self.alpha = alpha  # EWMA smoothing factor
+        self._items = [None] * maxsize
+        self._index = 0  # Next write position
+        self._count = 0
+        self._appended = 0
+        self._sum = 0.0
+        self._numeric = 0
+        self._min = deque()  # (sequence, value), values increasing
+        self._max = deque()  # (sequence, value), values decreasing
+        self._ewma = None
+        self._lock = threading.Lock()
     
     def append(self, item):
-        if len(self.data) < self.maxsize:
-            self.data.append(item)
-        else:
-            self.data[self.index] = item
-            self.index = (self.index + 1) % self.maxsize
+        with self._lock:
+            if self._count == self.maxsize:
+                old = self._items[self._index]
+                if _is_number(old):
+                    self._sum -= old
+                    self._numeric -= 1
+            else:
+                self._count += 1
+            self._items[self._index] = item
+            self._index = (self._index + 1) % self.maxsize
+            sequence = self._appended
+            self._appended += 1
+            
+            if _is_number(item):
+                self._sum += item
+                self._numeric += 1
+                self._ewma = item if self._ewma is None else self._ewma + self.alpha * (item - self._ewma)
+                while self._min and self._min[-1][1] >= item:
+                    self._min.pop()
+                self._min.append((sequence, item))
+                while self._max and self._max[-1][1] <= item:
+                    self._max.pop()
+                self._max.append((sequence, item))
+            
+            oldest = self._appended - self._count
+            while self._min and self._min[0][0] < oldest:
+                self._min.popleft()
+            while self._max and self._max[0][0] < oldest:
+                self._max.popleft()
+            if self._index == 0:
+                self._sum = math.fsum(value for value in self._items if _is_number(value))
     
     def get_recent(self, n=None):
-        if n is None:
-            return self.data[:]
-        return self.data[-n:] if len(self.data) >= n else self.data[:]
+        """Items in insertion order, oldest first (last ``n`` if given)"""
+        with self._lock:
+            if self._count < self.maxsize:
+                items = self._items[:self._count]
+            else:
+                items = self._items[self._index:] + self._items[:self._index]
+        if n is None or n >= len(items):
+            return items
+        return items[len(items) - n:] if n > 0 else []
+    
+    def last(self):
+        with self._lock:
+            return self._items[self._index - 1] if self._count else None
+    
+    def sum(self):
+        return self._sum
+    
+    def mean(self):
+        with self._lock:
+            return self._sum / self._numeric if self._numeric else 0
+    
+    def min(self):
+        with self._lock:
+            return self._min[0][1] if self._min else 0
+    
+    def max(self):
+        with self._lock:
+            return self._max[0][1] if self._max else 0
+    
+    @property
+    def ewma(self):
+        return self._ewma if self._ewma is not None else 0
+    
+    def clear(self):
+        with self._lock:
+            self._items = [None] * self.maxsize
+            self._index = self._count = self._numeric = 0
+            self._sum = 0.0
+            self._min.clear()
+            self._max.clear()
+            self._ewma = None
     
     def __len__(self):
-        return len(self.data)
+        return self._count
+    
+    def __iter__(self):
+        return iter(self.get_recent())
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+# Single-download segment fetching
+MAX_SEGMENT_BYTES = 64 * 1024 * 1024  # Refuse to buffer segments larger than this
+
+class SegmentDownload:
+    """A segment body fetched once, with delivery timings"""
+    __slots__ = ('url', 'status_code', 'body', 'size', 'ttfb', 'duration')
+    
+    def __init__(self, url, status_code, body, ttfb, duration):
+        self.url = url
+        self.status_code = status_code
+        self.body = body
+        self.size = len(body)
+        self.ttfb = ttfb          # Seconds until response headers
+        self.duration = duration  # Seconds until the last byte
+    
+    @property
+    def throughput_mbps(self):
+        transfer_time = self.duration - self.ttfb
+        if self.size == 0 or transfer_time <= 0:
+            return 0
+        return (self.size * 8) / transfer_time / 1_000_000
+    
+    def get_metrics(self):
+        return {
+            'status_code': self.status_code,
+            'bytes': self.size,
+            'ttfb_ms': round(self.ttfb * 1000, 2),
+            'download_ms': round(self.duration * 1000, 2),
+            'throughput_mbps': round(self.throughput_mbps, 3)
+        }
+
+def download_segment(segment_url, timeout=None, max_bytes=MAX_SEGMENT_BYTES, headers=None):
+    """Download a segment body through the pooled session, timing TTFB and transfer.
+    
+    ``headers`` may carry a Range; a 206 body is kept like a 200 one.
+    """
+    start = time.perf_counter()
+    
+    with OptimizedHTTPSession().stream(segment_url, headers=headers, timeout=timeout) as (status_code, iter_chunks):
+        ttfb = time.perf_counter() - start
+        chunks = []
+        size = 0
+        if status_code in (200, 206):
+            for chunk in iter_chunks(chunk_size=64 * 1024):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"Segment larger than {max_bytes} bytes")
+        body = b''.join(chunks)
+    
+    return SegmentDownload(segment_url, status_code, body, ttfb, time.perf_counter() - start)
 
 # Optimized ffprobe execution
-@timed_cache(seconds=600)  # Cache ffprobe results for 10 minutes
-def optimized_ffprobe(segment_url):
-    """Optimized ffprobe with caching and reduced command complexity"""
+def optimized_ffprobe(source):
+    """Optimized ffprobe with reduced command complexity.
+    
+    ``source`` is either a URL or the segment bytes; bytes are piped to
+    ffprobe on stdin so an already downloaded segment isn't fetched again.
+    """
     import subprocess
     import json
     
+    from_memory = isinstance(source, (bytes, bytearray, memoryview))
     try:
         # Enhanced ffprobe command with all necessary fields
         cmd = [
@@ -156,69 +583,233 @@ def optimized_ffprobe(segment_url):
             '-of', 'json',
             '-analyzeduration', '2000000',  # Analyze first 2 seconds for better accuracy
             '-probesize', '2000000',        # Increase probe size slightly
-            segment_url
+            'pipe:0' if from_memory else source
         ]
         
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=20)
+        result = subprocess.run(
+            cmd, input=bytes(source) if from_memory else None, capture_output=True, timeout=20
+        )
         
         if result.returncode == 0:
-            return json.loads(result.stdout)
+            return json.loads(result.stdout.decode('utf-8', errors='replace'))
         else:
-            print(f"ffprobe failed with return code {result.returncode}: {result.stderr}")
+            print(f"ffprobe failed with return code {result.returncode}: {result.stderr.decode('utf-8', errors='replace')}")
             return None
             
     except subprocess.TimeoutExpired:
-        print(f"ffprobe timeout for {segment_url}")
+        print(f"ffprobe timeout for {'piped segment' if from_memory else source}")
         return None
     except Exception as e:
         print(f"ffprobe error: {e}")
         return None
 
 # Batch processing for segments
-def process_segments_batch(segments, base_url, batch_size=3):
-    """Process segments in batches to avoid overwhelming the server"""
-    results = []
+def process_segments_batch(segments, base_url):
+    """Check a batch of segments in one concurrent round trip.
+
+    Politeness towards the origin is enforced by the fetch engine's
+    per-host concurrency limit rather than by sleeping between batches.
+    """
+    segment_urls = [base_url + seg.uri for seg in segments]
+    status_results = check_segments_concurrent(segment_urls)
     
-    for i in range(0, len(segments), batch_size):
-        batch = segments[i:i + batch_size]
-        segment_urls = [base_url + seg.uri for seg in batch]
-        
-        # Check status concurrently
-        status_results = check_segments_concurrent(segment_urls)
-        
-        for j, segment in enumerate(batch):
-            segment_url = segment_urls[j]
-            status_info = status_results.get(segment_url, {'status_code': 0, 'response_time': 0})
-            
-            results.append({
-                'index': i + j + 1,
-                'uri': segment.uri,
-                'duration': segment.duration,
-                'status_code': status_info['status_code'],
-                'response_time': status_info['response_time'],
-                'timestamp': time.time()
-            })
-        
-        # Small delay between batches to be respectful
-        if i + batch_size < len(segments):
-            time.sleep(0.1)
+    results = []
+    for i, segment in enumerate(segments):
+        status_info = status_results.get(segment_urls[i], {'status_code': 0, 'response_time': 0})
+        results.append({
+            'index': i + 1,
+            'uri': segment.uri,
+            'duration': segment.duration,
+            'status_code': status_info['status_code'],
+            'response_time': status_info['response_time'],
+            'timestamp': time.time()
+        })
     
     return results
 
+# Latency histograms
+class _LatencyShard:
+    """One thread's bucket counts; only its owner thread writes to it"""
+    __slots__ = ('thread', 'counts', 'count', 'total', 'max')
+
+    def __init__(self, thread, buckets):
+        self.thread = thread
+        self.counts = [0] * buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def merge(self, other):
+        counts = self.counts
+        for index, count in enumerate(other.counts):
+            if count:
+                counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+
+class _LatencyGeneration:
+    """Shards recorded during one window"""
+    __slots__ = ('shards', 'retired')
+
+    def __init__(self, buckets):
+        self.shards = []
+        self.retired = _LatencyShard(None, buckets)  # Shards of finished threads
+
+
+class LatencyHistogram:
+    """Log-bucketed latency histogram (seconds) with per-thread shards.
+
+    Each recording thread writes to its own shard, so the hot path takes
+    no lock; readers merge the shards into one view. Buckets grow by
+    GAMMA, which bounds the relative error of any reported quantile.
+    Recordings go to the current of two generations, swapped every
+    ``window`` seconds, so reads cover the last one to two windows
+    instead of the whole uptime (cumulative histograms are the exporter's).
+    """
+    GAMMA = 1.04          # ~2% relative error
+    MIN_VALUE = 1e-5      # 10 µs; anything faster lands in bucket 0
+    MAX_VALUE = 600.0     # Anything slower lands in the last bucket
+    LOG_GAMMA = math.log(GAMMA)
+    BUCKETS = int(math.ceil(math.log(MAX_VALUE / MIN_VALUE) / LOG_GAMMA)) + 1
+
+    def __init__(self, window=300.0):
+        self.window = window
+        self._local = threading.local()
+        self._current = _LatencyGeneration(self.BUCKETS)
+        self._previous = _LatencyGeneration(self.BUCKETS)
+        self._rotated_at = time.monotonic()
+        self._lock = threading.Lock()  # Taken once per thread and window, on rotation and on reads
+
+    def _rotate(self, now):
+        if now - self._rotated_at < self.window:
+            return
+        with self._lock:
+            elapsed = now - self._rotated_at
+            if elapsed < self.window:
+                return
+            # Idle for two windows or more: the previous one is stale too
+            self._previous = self._current if elapsed < 2 * self.window else _LatencyGeneration(self.BUCKETS)
+            self._current = _LatencyGeneration(self.BUCKETS)
+            self._rotated_at = now
+
+    def _shard(self):
+        self._rotate(time.monotonic())
+        generation = self._current
+        local = self._local
+        if getattr(local, 'generation', None) is not generation:
+            shard = _LatencyShard(threading.current_thread(), self.BUCKETS)
+            with self._lock:
+                # Fold shards of threads that have exited so they don't pile up
+                alive = []
+                for old in generation.shards:
+                    if old.thread.is_alive():
+                        alive.append(old)
+                    else:
+                        generation.retired.merge(old)
+                alive.append(shard)
+                generation.shards = alive
+            local.generation = generation
+            local.shard = shard
+        return local.shard
+
+    @classmethod
+    def bucket_index(cls, value):
+        if value <= cls.MIN_VALUE:
+            return 0
+        return min(cls.BUCKETS - 1, int(math.ceil(math.log(value / cls.MIN_VALUE) / cls.LOG_GAMMA)))
+
+    @classmethod
+    def bucket_value(cls, index):
+        # Midpoint of (MIN * GAMMA^(i-1), MIN * GAMMA^i]
+        if index == 0:
+            return cls.MIN_VALUE
+        return 2 * cls.MIN_VALUE * cls.GAMMA ** index / (cls.GAMMA + 1)
+
+    def record(self, duration):
+        shard = self._shard()
+        shard.counts[self.bucket_index(duration)] += 1
+        shard.count += 1
+        shard.total += duration
+        if duration > shard.max:
+            shard.max = duration
+
+    def merged(self):
+        """Both generations' shards folded into one (a snapshot; writers are not blocked)"""
+        self._rotate(time.monotonic())
+        result = _LatencyShard(None, self.BUCKETS)
+        with self._lock:
+            shards = [self._previous.retired, self._current.retired] + self._previous.shards + self._current.shards
+        for shard in shards:
+            result.merge(shard)
+        return result
+
+    def merge(self, other):
+        """Add another histogram's recordings into the current window"""
+        recordings = other.merged()
+        with self._lock:
+            self._current.retired.merge(recordings)
+
+    @classmethod
+    def _quantile(cls, shard, q):
+        rank = q * (shard.count - 1)
+        seen = 0
+        for index, count in enumerate(shard.counts):
+            seen += count
+            if rank < seen:
+                return min(shard.max, cls.bucket_value(index))
+        return shard.max
+
+    def quantiles(self, qs=(0.5, 0.9, 0.99)):
+        shard = self.merged()
+        if not shard.count:
+            return {q: None for q in qs}
+        return {q: self._quantile(shard, q) for q in qs}
+
+    def summary(self):
+        shard = self.merged()
+        if not shard.count:
+            return {'count': 0, 'mean': None, 'p50': None, 'p90': None, 'p99': None, 'max': None}
+        return {
+            'count': shard.count,
+            'mean': round(shard.total / shard.count, 6),
+            'p50': round(self._quantile(shard, 0.5), 6),
+            'p90': round(self._quantile(shard, 0.9), 6),
+            'p99': round(self._quantile(shard, 0.99), 6),
+            'max': round(shard.max, 6)
+        }
+
+
 # Performance monitoring
+LATENCY_OPERATIONS = ('request', 'playlist_fetch', 'variant_fetch', 'segment_head', 'probe')
+
 class PerformanceMonitor:
     """Monitor application performance metrics"""
     def __init__(self):
         self.metrics = {
-            'request_times': CircularBuffer(100),
-            'memory_usage': CircularBuffer(50),
+            'request_times': CircularBuffer(config.MAX_SEGMENTS_HISTORY),
+            'memory_usage': CircularBuffer(config.MAX_METRICS_HISTORY),
             'error_count': 0,
             'cache_hits': 0,
             'cache_misses': 0
         }
+        self.caches = []
+        self.latency = {operation: LatencyHistogram(config.LATENCY_WINDOW) for operation in LATENCY_OPERATIONS}
+        self._lock = threading.Lock()
+    
+    def record_latency(self, operation, duration):
+        """Record one ``operation`` duration (seconds) in its histogram"""
+        histogram = self.latency.get(operation)
+        if histogram is None:
+            with self._lock:
+                histogram = self.latency.setdefault(operation, LatencyHistogram(config.LATENCY_WINDOW))
+        histogram.record(duration)
     
     def record_request_time(self, duration):
+        """Duration of a whole request/poll (segment analysis is recorded as 'probe')"""
         self.metrics['request_times'].append(duration)
+        self.record_latency('request', duration)
     
     def record_memory_usage(self, usage_mb):
         self.metrics['memory_usage'].append(usage_mb)
@@ -232,19 +823,27 @@ class PerformanceMonitor:
     def record_cache_miss(self):
         self.metrics['cache_misses'] += 1
     
+    def register_cache(self, cache):
+        """Report a TTLCache's counters with the other metrics"""
+        self.caches.append(cache)
+    
     def get_stats(self):
-        request_times = self.metrics['request_times'].get_recent()
-        memory_usage = self.metrics['memory_usage'].get_recent()
+        request_times = self.metrics['request_times']
+        memory_usage = self.metrics['memory_usage']
+        caches = {cache.name: cache.get_stats() for cache in self.caches}
+        hits = self.metrics['cache_hits'] + sum(stats['hits'] for stats in caches.values())
+        misses = self.metrics['cache_misses'] + sum(stats['misses'] for stats in caches.values())
         
         return {
-            'avg_request_time': sum(request_times) / len(request_times) if request_times else 0,
-            'max_request_time': max(request_times) if request_times else 0,
-            'avg_memory_usage': sum(memory_usage) / len(memory_usage) if memory_usage else 0,
+            'avg_request_time': request_times.mean(),
+            'max_request_time': request_times.max(),
+            'ewma_request_time': request_times.ewma,
+            'avg_memory_usage': memory_usage.mean(),
             'error_count': self.metrics['error_count'],
-            'cache_hit_rate': (
-                self.metrics['cache_hits'] / 
-                max(1, self.metrics['cache_hits'] + self.metrics['cache_misses'])
-            ) * 100
+            'cache_hit_rate': (hits / max(1, hits + misses)) * 100,
+            'cache_evictions': sum(stats['evictions'] for stats in caches.values()),
+            'caches': caches,
+            'latency': {operation: histogram.summary() for operation, histogram in list(self.latency.items())}
         }
 
 # Global performance monitor instance
@@ -254,20 +853,29 @@ performance_monitor = PerformanceMonitor()
 class AdaptiveRefresh:
     """Automatically adjust refresh rates based on stream stability"""
     def __init__(self):
-        self.success_history = CircularBuffer(20)
-        self.base_interval = 10  # seconds
-        self.min_interval = 5
-        self.max_interval = 60
+        self.success_history = CircularBuffer(10)  # The window the decision averages over
+    
+    # Read per call so config reloads apply to streams already being polled
+    @property
+    def base_interval(self):
+        return config.DEFAULT_REFRESH_INTERVAL
+    
+    @property
+    def min_interval(self):
+        return config.MIN_REFRESH_INTERVAL
+    
+    @property
+    def max_interval(self):
+        return config.MAX_REFRESH_INTERVAL
     
     def record_success_rate(self, rate):
         self.success_history.append(rate)
     
     def get_optimal_interval(self):
-        recent_rates = self.success_history.get_recent(10)
-        if not recent_rates:
+        if not len(self.success_history):
             return self.base_interval
         
-        avg_success = sum(recent_rates) / len(recent_rates)
+        avg_success = self.success_history.mean()
         
         # Adjust interval based on stability
         if avg_success > 95:
@@ -287,6 +895,9 @@ def cleanup_resources():
         session.close()
     except Exception:
         pass
+    
+    if AsyncFetchEngine._instance is not None:
+        AsyncFetchEngine._instance.close()
 
 # Response compression
 def compress_response_data(data):
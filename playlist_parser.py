@@ -0,0 +1,252 @@
+"""
+Fast HLS playlist parser for the polling hot path
+
+A line-oriented tag scanner that extracts only what the monitor uses
+(EXTINF, MEDIA-SEQUENCE, TARGETDURATION, DISCONTINUITY, PROGRAM-DATE-TIME,
+MAP, STREAM-INF, ENDLIST) instead of building the full m3u8 object model.
+Parsed objects mirror the m3u8 attribute names, and ``load_playlist``
+falls back to ``m3u8.loads`` for anything the fast path can't handle,
+including playlists carrying tags that change segment semantics
+(byte ranges, encryption, low-latency parts).
+
+Run ``python playlist_parser.py`` to benchmark both parsers on a
+10k-segment playlist.
+"""
+
+import re
+import logging
+from datetime import datetime
+
+import m3u8
+
+
+class PlaylistParseError(ValueError):
+    """Raised when the fast parser can't handle a playlist"""
+
+
+# Tags the fast parser doesn't model but can't safely skip either
+UNSUPPORTED_TAGS = (
+    '#EXT-X-BYTERANGE', '#EXT-X-KEY', '#EXT-X-SESSION-KEY', '#EXT-X-PART',
+    '#EXT-X-PRELOAD-HINT', '#EXT-X-SKIP'
+)
+
+
+def parse_program_date_time(value):
+    """Parse an EXT-X-PROGRAM-DATE-TIME value into an aware datetime"""
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    # fromisoformat before 3.11 only accepts 3 or 6 fractional digits
+    match = re.match(r'^(.*T\d\d:\d\d:\d\d)(?:\.(\d+))?(.*)$', value)
+    if match and match.group(2) is not None:
+        fraction = (match.group(2) + '000000')[:6]
+        value = f"{match.group(1)}.{fraction}{match.group(3)}"
+    return datetime.fromisoformat(value)
+
+
+_ATTRIBUTE_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+def parse_attributes(value):
+    """Parse an HLS attribute list (KEY=VALUE,KEY="VALUE",...)"""
+    return {key: raw.strip('"') for key, raw in _ATTRIBUTE_RE.findall(value)}
+
+
+class InitSection:
+    """EXT-X-MAP media initialization section (subset of ``m3u8.InitializationSection``)"""
+    __slots__ = ('uri', 'byterange')
+
+    def __init__(self, attributes):
+        self.uri = attributes.get('URI')
+        self.byterange = attributes.get('BYTERANGE')
+
+
+class Segment:
+    """Media segment (subset of ``m3u8.Segment``)"""
+    __slots__ = ('uri', 'duration', 'title', 'discontinuity', 'init_section', '_program_date_time')
+
+    def __init__(self, uri, duration, title=None, discontinuity=False, program_date_time=None,
+                 init_section=None):
+        self.uri = uri
+        self.duration = duration
+        self.title = title
+        self.discontinuity = discontinuity
+        self.init_section = init_section  # Shared by every segment until the next EXT-X-MAP
+        self._program_date_time = program_date_time  # Raw string, parsed on access
+
+    @property
+    def program_date_time(self):
+        if self._program_date_time is None:
+            return None
+        try:
+            return parse_program_date_time(self._program_date_time)
+        except ValueError:
+            return None
+
+
+class StreamInfo:
+    """EXT-X-STREAM-INF attributes (subset of ``m3u8.StreamInfo``)"""
+    __slots__ = ('bandwidth', 'average_bandwidth', 'resolution', 'codecs', 'frame_rate', 'audio')
+
+    def __init__(self, attributes):
+        self.bandwidth = int(attributes.get('BANDWIDTH', 0) or 0)
+        self.average_bandwidth = int(attributes['AVERAGE-BANDWIDTH']) if 'AVERAGE-BANDWIDTH' in attributes else None
+        self.codecs = attributes.get('CODECS')
+        self.audio = attributes.get('AUDIO')
+        self.frame_rate = float(attributes['FRAME-RATE']) if 'FRAME-RATE' in attributes else None
+        resolution = attributes.get('RESOLUTION')
+        if resolution and 'x' in resolution:
+            width, height = resolution.split('x', 1)
+            self.resolution = (int(width), int(height))
+        else:
+            self.resolution = None
+
+
+class Variant:
+    """Variant stream of a master playlist (subset of ``m3u8.Playlist``)"""
+    __slots__ = ('uri', 'stream_info')
+
+    def __init__(self, uri, stream_info):
+        self.uri = uri
+        self.stream_info = stream_info
+
+
+class ParsedPlaylist:
+    """Result of the fast parser, attribute-compatible with ``m3u8.M3U8``"""
+    __slots__ = ('segments', 'playlists', 'target_duration', 'media_sequence',
+                 'discontinuity_sequence', 'is_endlist', 'playlist_type')
+
+    def __init__(self):
+        self.segments = []
+        self.playlists = []
+        self.target_duration = None
+        self.media_sequence = 0
+        self.discontinuity_sequence = 0
+        self.is_endlist = False
+        self.playlist_type = None
+
+    @property
+    def is_variant(self):
+        return bool(self.playlists)
+
+
+def parse_playlist(text):
+    """Parse a playlist with the fast line scanner.
+
+    Other informational tags are skipped. Raises PlaylistParseError on
+    malformed input or an UNSUPPORTED_TAGS line so callers can fall back
+    to m3u8.
+    """
+    playlist = ParsedPlaylist()
+    segments = playlist.segments
+    lines = text.splitlines()
+
+    if not lines or not lines[0].lstrip('\ufeff').startswith('#EXTM3U'):
+        raise PlaylistParseError('Missing #EXTM3U header')
+
+    duration = None
+    title = None
+    discontinuity = False
+    program_date_time = None
+    init_section = None
+    stream_info = None
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        if line[0] != '#':
+            if stream_info is not None:
+                playlist.playlists.append(Variant(line, stream_info))
+                stream_info = None
+            elif duration is not None:
+                segments.append(Segment(line, duration, title, discontinuity, program_date_time, init_section))
+                duration = None
+                title = None
+                discontinuity = False
+                program_date_time = None
+            else:
+                raise PlaylistParseError(f'URI without EXTINF or STREAM-INF: {line}')
+            continue
+
+        # Most lines in a media playlist are EXTINF, so test it first
+        if line.startswith('#EXTINF:'):
+            value, _, title = line[8:].partition(',')
+            try:
+                duration = float(value)
+            except ValueError:
+                raise PlaylistParseError(f'Invalid EXTINF duration: {value}')
+            title = title or None
+        elif line.startswith('#EXT-X-PROGRAM-DATE-TIME:'):
+            program_date_time = line[25:]
+        elif line == '#EXT-X-DISCONTINUITY':
+            discontinuity = True
+        elif line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+            playlist.media_sequence = int(line[22:])
+        elif line.startswith('#EXT-X-TARGETDURATION:'):
+            playlist.target_duration = int(float(line[22:]))
+        elif line.startswith('#EXT-X-DISCONTINUITY-SEQUENCE:'):
+            playlist.discontinuity_sequence = int(line[30:])
+        elif line.startswith('#EXT-X-MAP:'):
+            init_section = InitSection(parse_attributes(line[11:]))
+        elif line.startswith('#EXT-X-STREAM-INF:'):
+            stream_info = StreamInfo(parse_attributes(line[18:]))
+        elif line == '#EXT-X-ENDLIST':
+            playlist.is_endlist = True
+        elif line.startswith('#EXT-X-PLAYLIST-TYPE:'):
+            playlist.playlist_type = line[21:].lower()
+        elif line.startswith(UNSUPPORTED_TAGS):
+            raise PlaylistParseError(f'Unsupported tag: {line.partition(":")[0]}')
+
+    return playlist
+
+
+def load_playlist(text, full=False):
+    """Parse a playlist, preferring the fast parser.
+
+    ``full=True`` (or a fast-parser failure) uses ``m3u8.loads``, e.g. when
+    the caller needs EXT-X-MEDIA groups or other tags the fast path skips.
+    """
+    if not full:
+        try:
+            return parse_playlist(text)
+        except (PlaylistParseError, ValueError) as e:
+            logging.debug(f"Fast playlist parser fell back to m3u8: {e}")
+    return m3u8.loads(text)
+
+
+def _benchmark(segment_count=10000, rounds=5):
+    import time
+
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:6',
+             '#EXT-X-MEDIA-SEQUENCE:1000', '#EXT-X-PLAYLIST-TYPE:EVENT']
+    for i in range(segment_count):
+        if i % 500 == 0:
+            lines.append('#EXT-X-DISCONTINUITY')
+        lines.append(f'#EXT-X-PROGRAM-DATE-TIME:2024-01-01T00:{(i // 10) % 60:02d}:{(i * 6) % 60:02d}.000Z')
+        lines.append('#EXTINF:6.000,')
+        lines.append(f'segment_{1000 + i}.ts')
+    text = '\n'.join(lines) + '\n'
+
+    def best_of(func):
+        best = None
+        for _ in range(rounds):
+            start = time.perf_counter()
+            result = func(text)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    fast_time, fast = best_of(parse_playlist)
+    full_time, full = best_of(m3u8.loads)
+    assert len(fast.segments) == len(full.segments) == segment_count
+    assert fast.media_sequence == full.media_sequence
+
+    print(f"Playlist: {segment_count} segments, {len(text) / 1024:.0f} KB")
+    print(f"  fast parser : {fast_time * 1000:8.2f} ms")
+    print(f"  m3u8.loads  : {full_time * 1000:8.2f} ms")
+    print(f"  speedup     : {full_time / fast_time:8.1f}x")
+
+
+if __name__ == '__main__':
+    _benchmark()
@@ -0,0 +1,240 @@
+"""
+Incremental media playlist tracking for HLS Stream Monitor
+
+Uses EXT-X-MEDIA-SEQUENCE to tell which segments are new since the last
+poll, so only those are processed, and keeps running aggregates for the
+sliding window instead of recomputing them over the whole playlist.
+
+Also measures the live edge: when each sequence number first appeared,
+how often the playlist advances compared to its target duration, whether
+it went stale, and (from EXT-X-PROGRAM-DATE-TIME) how far behind wall
+clock time the newest segment is. Latencies assume the origin clock is
+in sync with ours.
+"""
+
+import time
+from collections import deque
+
+STALE_FACTOR = 1.5  # Not advancing for 1.5x the target duration counts as stale
+LATENCY_ALPHA = 0.2  # EWMA smoothing for latency and update cadence
+
+
+class TrackedSegment:
+    """A segment seen in the playlist window, with its last check result"""
+    __slots__ = ('sequence', 'uri', 'duration', 'discontinuity',
+                 'status_code', 'response_time', 'checked_at', 'first_seen', 'program_date_time')
+
+    def __init__(self, sequence, uri, duration, discontinuity=False, first_seen=None,
+                 program_date_time=None):
+        self.sequence = sequence
+        self.uri = uri
+        self.duration = duration or 0
+        self.discontinuity = discontinuity
+        self.status_code = None
+        self.response_time = None
+        self.checked_at = None
+        self.first_seen = first_seen  # When this sequence number first appeared in a poll
+        self.program_date_time = program_date_time  # Epoch seconds of the segment start
+
+    def to_dict(self, index):
+        return {
+            'index': index,
+            'sequence': self.sequence,
+            'uri': self.uri,
+            'duration': self.duration,
+            'status_code': self.status_code if self.status_code is not None else 0,
+            'response_time': self.response_time or 0,
+            'timestamp': self.checked_at,
+            'first_seen': self.first_seen,
+            'program_date_time': self.program_date_time
+        }
+
+
+class PlaylistTracker:
+    """Tracks a media playlist across polls keyed by media sequence number"""
+    def __init__(self):
+        self.source = None
+        self.window = deque()
+        self.last_sequence = None
+        self.resets = 0
+        self.stale_events = 0
+        self._reset_aggregates()
+
+    def _reset_aggregates(self):
+        self.window.clear()
+        self.last_sequence = None
+        self.window_duration = 0.0
+        self.window_discontinuities = 0
+        self.total_duration = 0.0
+        self.segments_seen = 0
+        self.discontinuities = 0
+        self.gaps = 0
+        self.missed_segments = 0
+        self.advanced_at = None  # When the last new segment appeared
+        self.target_duration = None
+        self.update_interval = None  # Seconds between the last two advances
+        self.update_interval_ewma = None
+        self.publish_latency = None  # First seen minus PDT end of the newest segment
+        self.publish_latency_ewma = None
+        self.edge_latency = None  # Now minus PDT end of the newest segment, at the last poll
+        self.stale = False
+        self._next_pdt = None  # Expected PDT of the next sequence number
+
+    def update(self, media_sequence, segments, source=None, target_duration=None, ended=False):
+        """Fold a freshly fetched playlist into the tracker.
+
+        ``segments`` are the playlist's segment objects (anything with
+        ``uri``, ``duration`` and ``discontinuity``, optionally
+        ``program_date_time``); ``ended`` marks an EXT-X-ENDLIST playlist,
+        which is never stale. Returns the list of TrackedSegment entries
+        that were not in the previous poll.
+        """
+        media_sequence = media_sequence or 0
+        now = time.time()
+
+        # A different playlist or a sequence going backwards means the
+        # stream restarted; nothing from the old window applies any more
+        if source != self.source or (self.window and media_sequence < self.window[0].sequence):
+            if self.source is not None:
+                self.resets += 1
+            self.source = source
+            self._reset_aggregates()
+
+        # Drop segments that slid out of the window
+        while self.window and self.window[0].sequence < media_sequence:
+            expired = self.window.popleft()
+            self.window_duration -= expired.duration
+            if expired.discontinuity:
+                self.window_discontinuities -= 1
+
+        next_sequence = media_sequence if self.last_sequence is None else self.last_sequence + 1
+        if next_sequence < media_sequence:
+            # Segments were published and expired between two polls
+            self.gaps += 1
+            self.missed_segments += media_sequence - next_sequence
+            next_sequence = media_sequence
+            self._next_pdt = None  # Missed durations: can't carry the date forward
+
+        initial = self.last_sequence is None
+        new_entries = []
+        for offset in range(next_sequence - media_sequence, len(segments)):
+            segment = segments[offset]
+            entry = TrackedSegment(
+                media_sequence + offset, segment.uri, segment.duration,
+                bool(getattr(segment, 'discontinuity', False)), now,
+                self._segment_pdt(segment)
+            )
+            self.window.append(entry)
+            new_entries.append(entry)
+
+            self.window_duration += entry.duration
+            self.total_duration += entry.duration
+            self.segments_seen += 1
+            if entry.discontinuity:
+                self.window_discontinuities += 1
+                self.discontinuities += 1
+
+        if segments:
+            self.last_sequence = max(next_sequence - 1, media_sequence + len(segments) - 1)
+        self._update_live_edge(now, new_entries, initial, target_duration, ended)
+        return new_entries
+
+    def _segment_pdt(self, segment):
+        # The segment's own tag, else the previous segment's date plus its duration
+        pdt = None
+        try:
+            value = getattr(segment, 'program_date_time', None)
+            if value is not None:
+                pdt = value.timestamp()
+        except (ValueError, AttributeError):
+            pdt = None
+        if pdt is None:
+            pdt = self._next_pdt
+        self._next_pdt = pdt + (segment.duration or 0) if pdt is not None else None
+        return pdt
+
+    def _update_live_edge(self, now, new_entries, initial, target_duration, ended):
+        # O(1) per poll: only the newest entry and the previous advance are used
+        if target_duration:
+            self.target_duration = target_duration
+        if new_entries:
+            if self.advanced_at is not None and not initial:
+                self.update_interval = now - self.advanced_at
+                self.update_interval_ewma = _ewma(self.update_interval_ewma, self.update_interval)
+            self.advanced_at = now
+            edge = new_entries[-1]
+            if not initial and edge.program_date_time is not None:
+                # Segments of the first poll were published before we looked
+                self.publish_latency = now - (edge.program_date_time + edge.duration)
+                self.publish_latency_ewma = _ewma(self.publish_latency_ewma, self.publish_latency)
+
+        edge = self.window[-1] if self.window else None
+        if edge is not None and edge.program_date_time is not None:
+            self.edge_latency = now - (edge.program_date_time + edge.duration)
+        else:
+            self.edge_latency = None
+
+        stale = bool(not ended and self.target_duration and self.advanced_at is not None and
+                     now - self.advanced_at > STALE_FACTOR * self.target_duration)
+        if stale and not self.stale:
+            self.stale_events += 1
+        self.stale = stale
+
+    def playlist_age(self, now=None):
+        """Seconds since the media sequence last advanced"""
+        if self.advanced_at is None:
+            return None
+        return (now or time.time()) - self.advanced_at
+
+    def record_results(self, entries, results):
+        """Store check results (dicts with status_code/response_time) on entries"""
+        now = time.time()
+        for entry, result in zip(entries, results):
+            entry.status_code = result['status_code']
+            entry.response_time = result['response_time']
+            entry.checked_at = now
+
+    def recent(self, n):
+        """Last ``n`` segments of the window in playlist order"""
+        count = min(n, len(self.window))
+        return [self.window[i] for i in range(len(self.window) - count, len(self.window))]
+
+    def get_stats(self):
+        return {
+            'media_sequence': self.window[0].sequence if self.window else None,
+            'last_sequence': self.last_sequence,
+            'window_segments': len(self.window),
+            'window_duration': round(self.window_duration, 3),
+            'window_discontinuities': self.window_discontinuities,
+            'total_duration': round(self.total_duration, 3),
+            'segments_seen': self.segments_seen,
+            'discontinuities': self.discontinuities,
+            'gaps': self.gaps,
+            'missed_segments': self.missed_segments,
+            'resets': self.resets,
+            'live_edge': self.get_live_edge()
+        }
+
+    def get_live_edge(self):
+        age = self.playlist_age()
+        return {
+            'target_duration': self.target_duration,
+            'playlist_age': _round(age),
+            'stale': self.stale,
+            'stale_events': self.stale_events,
+            'update_interval': _round(self.update_interval),
+            'avg_update_interval': _round(self.update_interval_ewma),
+            'cadence_ratio': _round(self.update_interval_ewma / self.target_duration)
+            if self.update_interval_ewma is not None and self.target_duration else None,
+            'publish_latency': _round(self.publish_latency),
+            'avg_publish_latency': _round(self.publish_latency_ewma),
+            'edge_latency': _round(self.edge_latency)
+        }
+
+
+def _ewma(current, value):
+    return value if current is None else current + LATENCY_ALPHA * (value - current)
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
@@ -0,0 +1,29 @@
+"""
+Dedicated poller process for production deployments
+
+Owns all stream state (monitor, probes, history, events, metrics) and
+serves it to the web workers over a local socket, so the number of web
+workers never changes how often upstream playlists are polled.
+
+    HLS_POLLER_AUTHKEY=... python poller.py
+
+gunicorn.conf.py starts it automatically next to the web workers.
+"""
+
+import os
+import signal
+import sys
+
+os.environ['HLS_ROLE'] = 'poller'
+
+import app
+from service_ipc import serve
+
+
+def _terminate(signum, frame):
+    sys.exit(0)  # Runs the atexit hooks (monitor, probes, metrics log)
+
+
+if __name__ == '__main__':
+    signal.signal(signal.SIGTERM, _terminate)
+    serve(app.monitor_service, app.POLLER_ADDRESS, app.POLLER_AUTHKEY)
@@ -0,0 +1,240 @@
+"""
+Probe service for HLS Stream Monitor
+
+A persistent, bounded pool of probe workers fed by a priority queue, so
+slow ffprobe runs never block request handlers or monitor polls. In-flight
+probes for the same URL are deduplicated, queued jobs that go stale are
+cancelled, and every job records its queue wait and run time.
+"""
+
+import time
+import heapq
+import logging
+import itertools
+import threading
+
+from optimizations import CircularBuffer
+
+
+class ProbeJob:
+    """A queued or running probe; a minimal future"""
+    __slots__ = ('url', 'options', 'priority', 'deadline', 'submitted_at', 'started_at',
+                 'finished_at', 'status', 'result', 'error', '_done', '_callbacks', '_lock')
+
+    def __init__(self, url, priority, deadline, options=None):
+        self.url = url
+        self.options = options or {}  # Extra keyword arguments for probe_fn
+        self.priority = priority
+        self.deadline = deadline
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.status = 'queued'  # queued, running, done, failed, cancelled
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()  # Orders add_done_callback against _finish
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes (or timeout); returns the result or None"""
+        self._done.wait(timeout)
+        return self.result
+
+    def add_done_callback(self, callback):
+        with self._lock:
+            if not self.done():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _finish(self, status, result=None, error=None):
+        with self._lock:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        # Outside the lock: a callback may add callbacks or inspect the job
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                logging.error(f"Probe callback failed for {self.url}: {e}")
+
+    @property
+    def queue_wait(self):
+        end = self.started_at or self.finished_at
+        return end - self.submitted_at if end else None
+
+    @property
+    def run_time(self):
+        if self.started_at and self.finished_at:
+            return self.finished_at - self.started_at
+        return None
+
+
+class ProbeService:
+    """Bounded worker pool running probe_fn(url, **options) in priority order"""
+    PRIORITY_INTERACTIVE = 0  # A user is waiting on the answer
+    PRIORITY_LIVE_EDGE = 1    # Freshest segment of a monitored stream
+    PRIORITY_BACKGROUND = 2   # Anything that can wait
+
+    def __init__(self, probe_fn, workers=2, max_queue=256, max_age=30):
+        self.probe_fn = probe_fn
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_age = max_age  # Queued jobs older than this are cancelled
+        self._heap = []
+        self._queued = 0
+        self._inflight = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = False
+        self.stats = {
+            'submitted': 0,
+            'deduplicated': 0,
+            'completed': 0,
+            'failed': 0,
+            'cancelled': 0
+        }
+        self.wait_times = CircularBuffer(100)
+        self.run_times = CircularBuffer(100)
+
+    def _start(self):
+        self._running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"hls-probe-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _push(self, job):
+        # Newest first within a priority: the live edge moves on quickly
+        heapq.heappush(self._heap, ((job.priority, -job.submitted_at, next(self._seq)), job))
+
+    def submit(self, url, priority=PRIORITY_LIVE_EDGE, max_age=None, callback=None, options=None):
+        """Queue a probe for ``url``, joining an in-flight probe for the same URL"""
+        with self._cond:
+            if not self._running:
+                self._start()
+            self.stats['submitted'] += 1
+
+            job = self._inflight.get(url)
+            if job is not None and not job.done():
+                self.stats['deduplicated'] += 1
+                if job.status == 'queued' and priority < job.priority:
+                    # Re-queue at the better priority; the old entry is skipped
+                    job.priority = priority
+                    self._push(job)
+            else:
+                job = ProbeJob(url, priority, time.time() + (max_age or self.max_age), options)
+                if self._queued >= self.max_queue and not self._evict_for(job):
+                    job._finish('cancelled', error='Probe queue full')
+                    self.stats['cancelled'] += 1
+                else:
+                    self._inflight[url] = job
+                    self._queued += 1
+                    self._push(job)
+                    self._cond.notify()
+
+        if callback:
+            job.add_done_callback(callback)
+        return job
+
+    def _evict_for(self, job):
+        # Cancel the least urgent queued job if the new one outranks it
+        queued = [
+            entry for entry in self._heap
+            if entry[1].status == 'queued' and entry[0][0] == entry[1].priority
+        ]
+        if not queued:
+            return False
+        worst = max(queued, key=lambda entry: entry[0])
+        if worst[0][0] <= job.priority:
+            return False
+        self._cancel_queued(worst[1], 'Evicted by a higher-priority probe')
+        return True
+
+    def cancel(self, job):
+        """Cancel a job that has not started yet"""
+        with self._cond:
+            if job.status != 'queued':
+                return False
+            self._cancel_queued(job, 'Cancelled by caller')
+            return True
+
+    def _cancel_queued(self, job, reason):
+        self._queued -= 1
+        if self._inflight.get(job.url) is job:
+            del self._inflight[job.url]
+        job._finish('cancelled', error=reason)
+        self.stats['cancelled'] += 1
+
+    def _next_job(self):
+        with self._cond:
+            while self._running:
+                while self._heap:
+                    _, job = heapq.heappop(self._heap)
+                    if job.status != 'queued':
+                        continue  # Stale heap entry (re-prioritized or cancelled)
+                    if time.time() > job.deadline:
+                        self._cancel_queued(job, 'Stale before a worker was free')
+                        continue
+                    self._queued -= 1
+                    job.status = 'running'
+                    job.started_at = time.time()
+                    return job
+                self._cond.wait()
+            return None
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                result = self.probe_fn(job.url, **job.options)
+                status, error = 'done', None
+            except Exception as e:
+                result, status, error = None, 'failed', str(e)
+                logging.error(f"Probe failed for {job.url}: {e}")
+
+            with self._cond:
+                if self._inflight.get(job.url) is job:
+                    del self._inflight[job.url]
+                self.stats['completed' if status == 'done' else 'failed'] += 1
+            job._finish(status, result, error)
+            self.wait_times.append(job.queue_wait)
+            self.run_times.append(job.run_time)
+
+    def queue_depth(self):
+        """Jobs waiting for a worker"""
+        with self._cond:
+            return self._queued
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats['queued'] = self._queued
+            stats['running'] = len(self._inflight) - self._queued
+        stats['workers'] = self.workers
+        stats['avg_queue_wait'] = self.wait_times.mean()
+        stats['max_queue_wait'] = self.wait_times.max()
+        stats['avg_run_time'] = self.run_times.mean()
+        stats['max_run_time'] = self.run_times.max()
+        return stats
+
+    def shutdown(self):
+        with self._cond:
+            self._running = False
+            for _, job in self._heap:
+                if job.status == 'queued':
+                    job._finish('cancelled', error='Probe service shut down')
+            self._heap.clear()
+            self._queued = 0
+            self._cond.notify_all()
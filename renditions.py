@@ -0,0 +1,235 @@
+"""
+Per-rendition analysis for HLS Stream Monitor
+
+Fetches every media playlist referenced by a master playlist (video
+variants, I-frame playlists, audio/subtitle groups) concurrently on the
+shared async fetch engine and reports health and latency per rendition.
+
+With throughput sampling on, the live-edge segment of each rendition is
+also fetched with a ranged GET (the first few hundred KB) or, for a
+sampled fraction, in full, to compare delivery speed with the declared
+BANDWIDTH: can the CDN serve the whole ladder at real-time speed?
+"""
+
+import time
+import random
+import asyncio
+from urllib.parse import urljoin
+
+from fetch_engine import AsyncFetchEngine
+from playlist_parser import load_playlist
+
+# Seconds of the caller's budget left for cancelling stragglers and handing back the report
+HANDOFF_MARGIN = 0.1
+
+
+def list_renditions(master_url, master_playlist):
+    """Describe every media playlist referenced by a parsed master playlist"""
+    renditions = []
+
+    for variant in master_playlist.playlists:
+        info = variant.stream_info
+        renditions.append({
+            'type': 'VIDEO',
+            'url': urljoin(master_url, variant.uri),
+            'bandwidth': info.bandwidth if info else 0,
+            'resolution': f"{info.resolution[0]}x{info.resolution[1]}" if info and info.resolution else None,
+            'codecs': info.codecs if info else None
+        })
+
+    for variant in master_playlist.iframe_playlists:
+        info = variant.iframe_stream_info
+        renditions.append({
+            'type': 'IFRAME',
+            'url': urljoin(master_url, variant.uri),
+            'bandwidth': info.bandwidth if info else 0,
+            'resolution': f"{info.resolution[0]}x{info.resolution[1]}" if info and info.resolution else None,
+            'codecs': info.codecs if info else None
+        })
+
+    for media in master_playlist.media:
+        # Renditions without a URI are muxed into the variant streams
+        if not media.uri:
+            continue
+        renditions.append({
+            'type': media.type,
+            'url': urljoin(master_url, media.uri),
+            'group_id': media.group_id,
+            'name': media.name,
+            'language': media.language
+        })
+
+    # The same media playlist can be referenced by several groups
+    unique = {}
+    for rendition in renditions:
+        unique.setdefault(rendition['url'], rendition)
+    return list(unique.values())
+
+
+def throughput_metrics(sample, bandwidth=0, segment_duration=None, full=False):
+    """Delivery figures for one sample_download_async() result.
+
+    A timed-out sample is a measurement, not a gap: its speed is what
+    arrived before the deadline, so a stalled origin reports a ratio near 0.
+    """
+    ttfb = sample['ttfb']
+    timed_out = sample.get('timed_out', False)
+    # Over the whole request, TTFB included: what a player waiting for the
+    # segment sees, and stable for small ranges that arrive in one chunk
+    bits_per_second = sample['bytes'] * 8 / sample['duration'] if sample['duration'] > 0 else 0
+    ratio = None
+    if bandwidth and (bits_per_second or timed_out):
+        # >= 1: the origin delivers faster than the rendition's declared bitrate
+        ratio = round(bits_per_second / bandwidth, 3)
+    metrics = {
+        'mode': 'full' if full else 'range',
+        'status_code': sample['status_code'],
+        'bytes': sample['bytes'],
+        'timed_out': timed_out,
+        'ttfb_ms': round(ttfb * 1000, 2) if ttfb is not None else None,
+        'download_ms': round(sample['duration'] * 1000, 2),
+        'throughput_mbps': round(bits_per_second / 1_000_000, 3),
+        'bandwidth_ratio': ratio,
+        'realtime_factor': None
+    }
+    if full and segment_duration and sample['duration'] > 0 and (sample['bytes'] or timed_out):
+        # Seconds of media delivered per second of download; an upper
+        # bound when the download timed out before the segment was complete
+        metrics['realtime_factor'] = round(segment_duration / sample['duration'], 3)
+    return metrics
+
+
+async def _probe_rendition(engine, result):
+    """Playlist GET and live-edge HEAD; returns (segment url, duration) when healthy"""
+    status, text, elapsed = await engine.get_text_async(result['url'])
+    result['status_code'] = status
+    result['playlist_latency_ms'] = round(elapsed * 1000, 2)
+    if status != 200:
+        result['error'] = f"HTTP {status} when fetching playlist"
+        return None
+
+    # Large VOD/event playlists take milliseconds to parse: keep them off the shared loop
+    playlist = await asyncio.get_running_loop().run_in_executor(None, load_playlist, text)
+    result['segments'] = len(playlist.segments)
+    result['target_duration'] = playlist.target_duration
+    result['media_sequence'] = playlist.media_sequence
+    if not playlist.segments:
+        result['health'] = 'degraded'
+        result['error'] = 'Playlist has no segments'
+        return None
+
+    # The live edge is what players request next
+    segment_url = urljoin(result['url'], playlist.segments[-1].uri)
+    segment_status, segment_elapsed = await engine.head_async(segment_url)
+    result['last_segment_status'] = segment_status
+    result['last_segment_latency_ms'] = round(segment_elapsed * 1000, 2)
+    result['health'] = 'healthy' if segment_status == 200 else 'degraded'
+    if segment_status != 200:
+        result['error'] = f"Live-edge segment returned HTTP {segment_status}"
+        return None
+    return segment_url, playlist.segments[-1].duration
+
+
+async def _sample_rendition(engine, result, segment_url, segment_duration, sample_bytes, full_fraction, timeout):
+    full = random.random() < full_fraction
+    sample = await engine.sample_download_async(
+        segment_url, max_bytes=None if full else sample_bytes, timeout=timeout
+    )
+    result['throughput'] = throughput_metrics(sample, result.get('bandwidth'), segment_duration, full=full)
+    if sample['timed_out']:
+        result['health'] = 'degraded'
+        result['error'] = f"Throughput sample not delivered within {timeout}s"
+
+
+async def _analyze_rendition(engine, rendition, deadline, sample_bytes=0, full_fraction=0, sample_reserve=0):
+    result = dict(rendition)
+    result.update({
+        'status_code': 0,
+        'playlist_latency_ms': 0,
+        'segments': 0,
+        'target_duration': None,
+        'media_sequence': None,
+        'last_segment_status': None,
+        'last_segment_latency_ms': None,
+        'health': 'down',
+        'throughput': None,
+        'error': None
+    })
+    loop = asyncio.get_running_loop()
+
+    # The playlist GET and the live-edge HEAD must leave the sample its reserve
+    timeout = round(deadline - (sample_reserve if sample_bytes else 0) - loop.time(), 3)
+    try:
+        live_edge = await asyncio.wait_for(_probe_rendition(engine, result), timeout)
+    except asyncio.TimeoutError:
+        result['error'] = f"Timed out after {timeout}s"
+        return result
+    except Exception as e:
+        result['error'] = str(e)
+        return result
+
+    # The sample runs until the ladder's deadline: a full segment may take
+    # close to real time
+    timeout = round(deadline - loop.time(), 3)
+    if sample_bytes and live_edge is not None and timeout > 0:
+        segment_url, segment_duration = live_edge
+        try:
+            await _sample_rendition(engine, result, segment_url, segment_duration,
+                                    sample_bytes, full_fraction, timeout)
+        except Exception as e:
+            result['error'] = str(e)
+    return result
+
+
+async def analyze_renditions_async(master_url, master_playlist, timeout=10, sample_bytes=0, full_fraction=0,
+                                   sample_share=0.5):
+    """Analyze all renditions of a master playlist concurrently.
+
+    ``sample_bytes`` > 0 turns on throughput sampling of each live-edge
+    segment; ``full_fraction`` of the samples fetch the whole segment.
+    Everything, samples included, finishes within ``timeout``. The
+    playlist GET and HEAD get at most ``1 - sample_share`` of it; the
+    samples get the rest.
+    """
+    engine = AsyncFetchEngine()
+    start = time.perf_counter()
+    deadline = asyncio.get_running_loop().time() + timeout
+    sample_reserve = timeout * min(max(sample_share, 0), 1)
+
+    renditions = list_renditions(master_url, master_playlist)
+    results = await asyncio.gather(*(
+        _analyze_rendition(engine, r, deadline, sample_bytes, full_fraction, sample_reserve) for r in renditions
+    ))
+
+    health_counts = {'healthy': 0, 'degraded': 0, 'down': 0}
+    for result in results:
+        health_counts[result['health']] += 1
+    ratios = [r['throughput']['bandwidth_ratio'] for r in results
+              if r['throughput'] and r['throughput']['bandwidth_ratio'] is not None]
+
+    return {
+        'renditions': results,
+        'summary': {
+            'total': len(results),
+            'healthy': health_counts['healthy'],
+            'degraded': health_counts['degraded'],
+            'down': health_counts['down'],
+            'max_playlist_latency_ms': max((r['playlist_latency_ms'] for r in results), default=0),
+            'min_bandwidth_ratio': min(ratios, default=None),
+            'below_bandwidth': sum(1 for ratio in ratios if ratio < 1),
+            'sample_timeouts': sum(1 for r in results if r['throughput'] and r['throughput']['timed_out']),
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+        }
+    }
+
+
+def analyze_renditions(master_url, master_playlist, timeout=10, sample_bytes=0, full_fraction=0,
+                       sample_share=0.5):
+    """Synchronous wrapper for monitor workers and request handlers; returns within ``timeout``"""
+    engine = AsyncFetchEngine()
+    return engine.run(
+        analyze_renditions_async(master_url, master_playlist, timeout=max(timeout - HANDOFF_MARGIN, 0),
+                                 sample_bytes=sample_bytes, full_fraction=full_fraction,
+                                 sample_share=sample_share),
+        timeout=timeout
+    )
@@ -0,0 +1,174 @@
+"""
+Incremental time-bucketed rollups for chart history
+
+Every sample is folded into the open 1m, 5m and 1h bucket of each metric
+as it arrives (count, min, max, sum and a log-bucketed quantile sketch for
+p95). When a bucket closes only its summary is kept, in a TimeSeries ring
+per resolution, so queries over long windows return a small fixed number
+of points without touching raw samples.
+"""
+
+import math
+import threading
+
+from timeseries import TimeSeries
+
+# name -> (bucket seconds, buckets kept)
+ROLLUP_RESOLUTIONS = {
+    '1m': (60, 24 * 60),       # 24 hours
+    '5m': (300, 7 * 24 * 12),  # 7 days
+    '1h': (3600, 30 * 24)      # 30 days
+}
+ROLLUP_STATS = ('count', 'min', 'max', 'avg', 'p95')
+
+
+class QuantileSketch:
+    """Sparse log-bucketed histogram with bounded relative error"""
+    __slots__ = ('bins', 'zeros', 'count')
+
+    GAMMA = 1.02  # Bucket width: quantiles are within ~1% of the true value
+    LOG_GAMMA = math.log(GAMMA)
+
+    def __init__(self):
+        self.bins = {}
+        self.zeros = 0  # Values <= 0 (rates and durations are never negative)
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if value <= 0:
+            self.zeros += 1
+            return
+        index = math.ceil(math.log(value) / self.LOG_GAMMA)
+        self.bins[index] = self.bins.get(index, 0) + 1
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                # Midpoint of the bucket (GAMMA^(i-1), GAMMA^i]
+                return 2 * self.GAMMA ** index / (self.GAMMA + 1)
+        return 2 * self.GAMMA ** max(self.bins) / (self.GAMMA + 1)
+
+
+class _Bucket:
+    """Open bucket accumulating one metric"""
+    __slots__ = ('count', 'total', 'low', 'high', 'sketch')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.low = math.inf
+        self.high = -math.inf
+        self.sketch = QuantileSketch()
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.low = min(self.low, value)
+        self.high = max(self.high, value)
+        self.sketch.add(value)
+
+    def summary(self):
+        if not self.count:
+            return {stat: None for stat in ROLLUP_STATS}
+        p95 = self.sketch.quantile(0.95)
+        return {
+            'count': self.count,
+            'min': self.low,
+            'max': self.high,
+            'avg': self.total / self.count,
+            'p95': min(self.high, max(self.low, p95))
+        }
+
+
+class _Resolution:
+    """Open buckets plus closed-bucket summaries for one bucket size"""
+    def __init__(self, seconds, keep, metrics):
+        self.seconds = seconds
+        self.metrics = metrics
+        self.closed = TimeSeries(
+            [f"{metric}.{stat}" for metric in metrics for stat in ROLLUP_STATS], capacity=keep
+        )
+        self.start = None
+        self.buckets = None
+
+    def add(self, timestamp, values):
+        start = timestamp - timestamp % self.seconds
+        if start != self.start:
+            if self.start is not None and start < self.start:
+                return  # Late sample for a bucket that already closed
+            self._close()
+            self.start = start
+            self.buckets = {metric: _Bucket() for metric in self.metrics}
+        for metric, bucket in self.buckets.items():
+            value = values.get(metric)
+            if value is not None and value == value:
+                bucket.add(float(value))
+
+    def _close(self):
+        if self.start is None:
+            return
+        row = {}
+        for metric, bucket in self.buckets.items():
+            for stat, value in bucket.summary().items():
+                row[f"{metric}.{stat}"] = value
+        self.closed.append(self.start, row)
+
+    def query(self, start, end, metrics):
+        columns = [f"{metric}.{stat}" for metric in metrics for stat in ROLLUP_STATS]
+        # Include buckets that started before ``start`` but overlap it
+        first = start - self.seconds + 1e-6 if start is not None else None
+        data = self.closed.query(start=first, end=end, columns=columns)
+        timestamps = data.pop('timestamp')
+        series = {metric: {stat: data[f"{metric}.{stat}"] for stat in ROLLUP_STATS} for metric in metrics}
+
+        # The open bucket is summarized on the fly
+        if self.start is not None and (start is None or self.start + self.seconds > start) and (
+                end is None or self.start <= end):
+            timestamps.append(self.start)
+            for metric in metrics:
+                for stat, value in self.buckets[metric].summary().items():
+                    series[metric][stat].append(value)
+        return timestamps, series
+
+
+class StreamRollups:
+    """1m/5m/1h rollups of a stream's metrics, updated per sample"""
+    def __init__(self, metrics, resolutions=ROLLUP_RESOLUTIONS):
+        self.metrics = tuple(metrics)
+        self.resolutions = {
+            name: _Resolution(seconds, keep, self.metrics)
+            for name, (seconds, keep) in resolutions.items()
+        }
+        self._lock = threading.Lock()
+
+    def add(self, timestamp, values):
+        with self._lock:
+            for resolution in self.resolutions.values():
+                resolution.add(timestamp, values)
+
+    def pick_resolution(self, seconds, max_points):
+        """Finest resolution that covers ``seconds`` in at most ``max_points`` buckets"""
+        ordered = sorted(self.resolutions.items(), key=lambda item: item[1].seconds)
+        for name, resolution in ordered:
+            if seconds / resolution.seconds <= max_points:
+                return name
+        return ordered[-1][0]
+
+    def query(self, resolution, start=None, end=None, metrics=None):
+        metrics = [metric for metric in (metrics or self.metrics) if metric in self.metrics]
+        with self._lock:
+            timestamps, series = self.resolutions[resolution].query(start, end, metrics)
+        return {
+            'resolution': resolution,
+            'bucket_seconds': self.resolutions[resolution].seconds,
+            'timestamp': timestamps,
+            'metrics': series
+        }
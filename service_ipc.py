@@ -0,0 +1,78 @@
+"""
+Local-socket transport for the monitor service
+
+In production the poller process serves its MonitorService with a
+multiprocessing manager on a local socket (TCP on 127.0.0.1 or a Unix
+socket path); every web worker calls it through a ServiceClient. Only
+the poller polls upstream, however many web workers are running.
+"""
+
+import os
+import time
+import logging
+from multiprocessing.managers import BaseManager
+
+
+class _ServiceManager(BaseManager):
+    pass
+
+
+def parse_address(address):
+    """'host:port' -> (host, port); anything else is a Unix socket path"""
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit():
+        return host, int(port)
+    return address
+
+
+def serve(service, address, authkey):
+    """Serve ``service`` until the process is stopped (blocks)"""
+    _ServiceManager.register('get_service', callable=lambda: service)
+    address = parse_address(address)
+    if isinstance(address, str) and os.path.exists(address):
+        os.remove(address)  # Stale socket of a previous run
+    manager = _ServiceManager(address=address, authkey=authkey)
+    server = manager.get_server()
+    logging.info(f"Monitor service listening on {address}")
+    server.serve_forever()
+
+
+class ServiceClient:
+    """Forwards method calls to a served MonitorService, reconnecting after a restart"""
+    def __init__(self, address, authkey, connect_timeout=30):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.connect_timeout = connect_timeout
+        self._proxy = None
+
+    def _connect(self):
+        _ServiceManager.register('get_service')
+        deadline = time.time() + self.connect_timeout
+        while True:
+            manager = _ServiceManager(address=self.address, authkey=self.authkey)
+            try:
+                manager.connect()
+                return manager.get_service()
+            except (ConnectionError, FileNotFoundError):
+                # The poller may still be starting
+                if time.time() >= deadline:
+                    raise
+                time.sleep(0.5)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            for attempt in range(2):
+                proxy = self._proxy
+                if proxy is None:
+                    proxy = self._proxy = self._connect()
+                try:
+                    return getattr(proxy, name)(*args, **kwargs)
+                except (EOFError, ConnectionError):
+                    self._proxy = None
+                    if attempt:
+                        raise
+                    logging.warning("Lost the monitor service connection, reconnecting")
+        return call
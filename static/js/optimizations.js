@@ -169,6 +169,18 @@ class OptimizedChartManager {
         chart.update('none');
     }
 
+    seedChart(chartId, values) {
+        // Replace the buffer with historical points (e.g. rollups from /api/history)
+        const chart = this.charts.get(chartId);
+        if (!chart || !values.length) return;
+
+        const buffer = values.slice(-this.maxDataPoints);
+        this.dataBuffers.set(chartId, buffer);
+        chart.data.labels = buffer.map((_, index) => index);
+        chart.data.datasets[0].data = buffer;
+        chart.update('none');
+    }
+
     clearChart(chartId) {
         const buffer = this.dataBuffers.get(chartId);
         if (buffer) {
@@ -0,0 +1,165 @@
+"""
+Background system sampler for HLS Stream Monitor
+
+One daemon thread collects host and process metrics on a fixed interval
+into a ring buffer. /api/system-metrics, the health check and the
+'system' event topic read the latest sample instead of calling psutil
+per request (cpu_percent alone used to block a worker for 100 ms).
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+
+import psutil
+
+from optimizations import CircularBuffer
+
+
+class SystemSampler:
+    """Samples host, process and ffprobe child metrics every ``interval`` seconds"""
+    def __init__(self, interval=5, history=120, disk_path='/', on_sample=None, enabled=True):
+        self.interval = interval
+        self.enabled = enabled  # False: no thread, latest() samples inline when stale
+        self.disk_path = disk_path
+        self.on_sample = on_sample  # on_sample(sample) after each collection
+        self.samples = CircularBuffer(history)
+        self.errors = 0
+        self._process = psutil.Process(os.getpid())
+        self._previous_network = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+        # cpu_percent(interval=None) measures since the previous call; prime both
+        psutil.cpu_percent(interval=None)
+        self._process.cpu_percent(interval=None)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="hls-system-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.collect()
+            self._stop.wait(self.interval)
+
+    def collect(self):
+        """Take one sample and add it to the ring"""
+        try:
+            sample = self._sample()
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"System sampling failed: {e}")
+            return None
+        self.samples.append(sample)
+        if self.on_sample is not None:
+            try:
+                self.on_sample(sample)
+            except Exception as e:
+                logging.error(f"System sample hook failed: {e}")
+        return sample
+
+    def latest(self):
+        """Most recent sample; the first call samples inline and starts the thread"""
+        sample = self.samples.last()
+        if not self.enabled:
+            if sample is None or time.time() - sample['sampled_at'] >= self.interval:
+                sample = self.collect()
+            return sample
+        if sample is None:
+            sample = self.collect()
+        self.start()
+        return sample
+
+    def history(self, seconds=None):
+        samples = self.samples.get_recent()
+        if seconds is None:
+            return samples
+        cutoff = time.time() - seconds
+        return [sample for sample in samples if sample['sampled_at'] >= cutoff]
+
+    def _sample(self):
+        now = time.time()
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage(self.disk_path)
+
+        network = {}
+        try:
+            counters = psutil.net_io_counters()
+            network = {
+                'bytes_sent': counters.bytes_sent,
+                'bytes_recv': counters.bytes_recv,
+                'packets_sent': counters.packets_sent,
+                'packets_recv': counters.packets_recv
+            }
+            previous = self._previous_network
+            if previous is not None and now > previous[0]:
+                elapsed = now - previous[0]
+                network['sent_per_sec'] = max(0, counters.bytes_sent - previous[1].bytes_sent) / elapsed
+                network['recv_per_sec'] = max(0, counters.bytes_recv - previous[1].bytes_recv) / elapsed
+            self._previous_network = (now, counters)
+        except Exception:
+            pass
+
+        return {
+            'sampled_at': now,
+            'cpu': {
+                'usage_percent': psutil.cpu_percent(interval=None),
+                'count': psutil.cpu_count()
+            },
+            'memory': {
+                'total': memory.total,
+                'available': memory.available,
+                'percent': memory.percent,
+                'used': memory.used
+            },
+            'disk': {
+                'total': disk.total,
+                'used': disk.used,
+                'free': disk.free,
+                'percent': (disk.used / disk.total) * 100
+            },
+            'network': network,
+            'process': self._process_sample(),
+            'timestamp': datetime.fromtimestamp(now).isoformat()
+        }
+
+    def _process_sample(self):
+        process = self._process
+        with process.oneshot():
+            memory = process.memory_info()
+            info = {
+                'pid': process.pid,
+                'cpu_percent': process.cpu_percent(interval=None),
+                'rss': memory.rss,
+                'vms': memory.vms,
+                'threads': process.num_threads()
+            }
+            try:
+                info['open_fds'] = process.num_fds()
+            except (AttributeError, psutil.Error):
+                info['open_fds'] = None  # Not available on Windows
+
+        ffprobe = {'count': 0, 'rss': 0}
+        try:
+            for child in process.children(recursive=True):
+                try:
+                    if child.name().startswith('ffprobe'):
+                        ffprobe['count'] += 1
+                        ffprobe['rss'] += child.memory_info().rss
+                except psutil.Error:
+                    continue  # Exited between listing and inspecting
+        except psutil.Error:
+            pass
+        info['ffprobe'] = ffprobe
+        return info
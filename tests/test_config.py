@@ -0,0 +1,103 @@
+import json
+
+import pytest
+
+from config import OptimizedConfig, _coerce
+
+
+@pytest.mark.parametrize('default, raw, expected', [
+    (2, '4', 4),
+    (2, '4.0', 4),
+    (2, 4.0, 4),
+    (1.5, '3', 3.0),
+    (1.5, 3, 3.0),
+    (False, 'yes', True),
+    (True, 'off', False),
+    ({}, '{"http://a": 2}', {'http://a': 2}),
+    ('INFO', 'DEBUG', 'DEBUG'),
+])
+def test_coerce_to_default_type(default, raw, expected):
+    value = _coerce('KEY', default, raw)
+    assert value == expected
+    assert type(value) is type(expected)
+
+
+@pytest.mark.parametrize('default, raw', [
+    (2, '2.5'),
+    (2, 2.5),
+    (2, 'inf'),
+    (2, 'many'),
+    (2, True),
+    (1.5, 'fast'),
+    (False, 'maybe'),
+    (False, 1),
+    ({}, '[1, 2]'),
+])
+def test_coerce_rejects_invalid_values(default, raw):
+    with pytest.raises(ValueError, match='Invalid value for KEY'):
+        _coerce('KEY', default, raw)
+
+
+def write(path, values):
+    path.write_text(json.dumps(values))
+
+
+def test_environment_overrides_file(tmp_path):
+    path = tmp_path / 'hls.json'
+    write(path, {'PROBE_WORKERS': 3, 'CACHE_TTL': 10, 'UNKNOWN_SETTING': 1})
+    config = OptimizedConfig(str(path), environ={'HLS_PROBE_WORKERS': '5', 'HLS_SYSTEM_SAMPLE_INTERVAL': '2'})
+
+    assert config.PROBE_WORKERS == 5
+    assert config.CACHE_TTL == 10.0
+    assert config.SYSTEM_METRICS_INTERVAL == 2.0
+    assert config.sources == {
+        'PROBE_WORKERS': 'env', 'CACHE_TTL': 'file', 'SYSTEM_METRICS_INTERVAL': 'env'
+    }
+    assert not hasattr(config, 'UNKNOWN_SETTING')
+
+
+def test_reload_applies_changes_and_defers_restart_settings(tmp_path):
+    path = tmp_path / 'hls.json'
+    write(path, {'CACHE_TTL': 10})
+    config = OptimizedConfig(str(path), environ={})
+    changes = []
+    config.on_reload(changes.append)
+
+    write(path, {'CACHE_TTL': 20, 'PROBE_WORKERS': 6})
+    result = config.reload()
+
+    assert result == {'changed': {'CACHE_TTL': 20.0}, 'pending_restart': {'PROBE_WORKERS': 6}}
+    assert config.CACHE_TTL == 20.0
+    assert config.PROBE_WORKERS == OptimizedConfig.PROBE_WORKERS
+    assert changes == [{'CACHE_TTL': 20.0}]
+
+    # Reverting a restart-only setting clears it from pending
+    write(path, {'CACHE_TTL': 20})
+    assert config.reload() == {'changed': {}, 'pending_restart': {}}
+    assert changes == [{'CACHE_TTL': 20.0}]
+
+
+@pytest.mark.parametrize('content', ['{"CACHE_TTL": "soon"}', '{"CACHE_TTL": ', '[1]'])
+def test_invalid_reload_keeps_last_good_values(tmp_path, content):
+    path = tmp_path / 'hls.json'
+    write(path, {'CACHE_TTL': 10})
+    config = OptimizedConfig(str(path), environ={})
+
+    path.write_text(content)
+    with pytest.raises(ValueError):
+        config.reload()
+    assert config.CACHE_TTL == 10.0
+    assert config.sources == {'CACHE_TTL': 'file'}
+
+
+def test_failing_listener_does_not_block_others(tmp_path):
+    path = tmp_path / 'hls.json'
+    write(path, {})
+    config = OptimizedConfig(str(path), environ={})
+    seen = []
+    config.on_reload(lambda changed: 1 / 0)
+    config.on_reload(seen.append)
+
+    write(path, {'CACHE_TTL': 30})
+    config.reload()
+    assert seen == [{'CACHE_TTL': 30.0}]
@@ -0,0 +1,63 @@
+import json
+import threading
+
+from events import EventBroker, format_sse, snapshot_delta
+
+
+def test_snapshot_delta():
+    assert snapshot_delta(None, {'a': 1}) == ({'a': 1}, [])
+    assert snapshot_delta({'a': 1, 'b': 2, 'c': 3}, {'a': 1, 'b': 5, 'd': 4}) == ({'b': 5, 'd': 4}, ['c'])
+
+
+def test_format_sse():
+    message = format_sse('snapshot', {'value': 1}, event_id=7)
+    assert message == 'id: 7\nevent: snapshot\ndata: {"value":1}\n\n'
+    data = format_sse('system', {'when': object()}).split('data: ', 1)[1]
+    assert 'when' in json.loads(data)
+
+
+def test_publish_fans_out_to_topic_subscribers():
+    broker = EventBroker()
+    both = broker.subscribe(['stream:a', 'system'])
+    only_a = broker.subscribe(['stream:a'])
+
+    assert broker.publish('stream:a', 'snapshot', {'n': 1}) == 2
+    assert broker.publish('system', 'system', {'n': 2}) == 1
+    assert broker.publish('stream:b', 'snapshot', {'n': 3}) == 0
+
+    assert [(seq, topic) for seq, topic, _, _ in both.get(0)] == [(1, 'stream:a'), (2, 'system')]
+    assert [data for _, _, _, data in only_a.get(0)] == [{'n': 1}]
+    assert broker.get_stats()['connected'] == 2
+
+    both.close()
+    only_a.close()
+    assert not broker.has_subscribers('stream:a')
+    assert broker.get_stats()['topics'] == 0
+
+
+def test_slow_client_is_resynced_instead_of_backlogged():
+    broker = EventBroker(max_pending=3)
+    subscription = broker.subscribe(['t'])
+    for n in range(5):
+        broker.publish('t', 'snapshot', n)
+
+    assert subscription.resync
+    assert subscription.dropped == 3
+    assert [data for _, _, _, data in subscription.get(0)] == [3, 4]
+
+
+def test_get_waits_for_events_and_close_wakes_it():
+    broker = EventBroker()
+    subscription = broker.subscribe(['t'])
+    received = []
+    reader = threading.Thread(target=lambda: received.append(subscription.get(5)))
+    reader.start()
+    broker.publish('t', 'snapshot', 'hello')
+    reader.join(2)
+    assert [data for _, _, _, data in received[0]] == ['hello']
+
+    reader = threading.Thread(target=lambda: received.append(subscription.get(5)))
+    reader.start()
+    subscription.close()
+    reader.join(2)
+    assert not reader.is_alive() and received[1] == []
@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+import app as app_module
+
+
+class SlowService:
+    """Stands in for MonitorService.live_metrics, counting calls"""
+    def __init__(self, response):
+        self.response = response
+        self.calls = 0
+        self.release = threading.Event()
+
+    def live_metrics(self, playlist_url, all_variants=False):
+        self.calls += 1
+        self.release.wait(2)
+        return self.response
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = SlowService({'url': 'http://origin.example/live.m3u8', 'segments': 4})
+    monkeypatch.setattr(app_module, 'monitor_service', service)
+    app_module.live_metrics_cache.clear()
+    yield service
+    app_module.live_metrics_cache.clear()
+
+
+def get(path):
+    return app_module.app.test_client().get(path)
+
+
+def test_concurrent_requests_share_one_load(service):
+    cache = app_module.live_metrics_cache
+    coalesced = cache.coalesced
+    path = '/api/live-metrics/http%3A%2F%2Forigin.example%2Flive.m3u8'
+    responses = []
+    threads = [threading.Thread(target=lambda: responses.append(get(path))) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    while cache.coalesced - coalesced < 5:
+        time.sleep(0.001)
+    service.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert service.calls == 1
+    assert [response.get_json()['segments'] for response in responses] == [4] * 6
+    # Served from the cache until the TTL runs out
+    assert get(path).get_json()['segments'] == 4 and service.calls == 1
+
+
+def test_variant_mode_is_a_separate_entry(service):
+    service.release.set()
+    get('/api/live-metrics/http://origin.example/live.m3u8')
+    get('/api/live-metrics/http://origin.example/live.m3u8?all_variants=1')
+    assert service.calls == 2
+
+
+def test_pending_snapshot_is_not_cached(service):
+    service.response = None
+    service.release.set()
+    path = '/api/live-metrics/http://origin.example/live.m3u8'
+
+    assert get(path).get_json()['pending'] is True
+    assert get(path).get_json()['pending'] is True
+    assert service.calls == 2
+
+
+def test_zero_ttl_only_coalesces(service, monkeypatch):
+    monkeypatch.setattr(app_module.live_metrics_cache, 'ttl', 0)
+    service.release.set()
+    path = '/api/live-metrics/http://origin.example/live.m3u8'
+
+    get(path)
+    get(path)
+    assert service.calls == 2
+
+
+def test_web_worker_reports_its_own_cache(service, monkeypatch):
+    # Under gunicorn the poller's stats don't see the web worker's cache
+    service.performance_stats = lambda url=None: {'caches': {'live_metrics': {'hits': 0}}}
+    monkeypatch.setattr(app_module, 'SERVICE_ROLE', 'web')
+    service.release.set()
+    cache = app_module.live_metrics_cache
+    hits, misses = cache.hits, cache.misses
+    path = '/api/live-metrics/http://origin.example/live.m3u8'
+    get(path)
+    get(path)
+
+    stats = get('/api/performance-stats').get_json()['caches']['live_metrics']
+    assert (stats['hits'] - hits, stats['misses'] - misses) == (1, 1)
+    assert 'worker_pid' in stats
@@ -0,0 +1,166 @@
+import struct
+from fractions import Fraction
+
+from media_parser import _unescape_rbsp, detect_container, parse_h264_sps, parse_segment
+
+VIDEO_PID = 0x100
+AUDIO_PID = 0x101
+
+
+class BitWriter:
+    def __init__(self):
+        self.bits = []
+
+    def u(self, bits, value):
+        self.bits.extend((value >> shift) & 1 for shift in range(bits - 1, -1, -1))
+
+    def ue(self, value):
+        code = value + 1
+        self.u(code.bit_length() - 1, 0)
+        self.u(code.bit_length(), code)
+
+    def bytes(self):
+        bits = self.bits + [1]  # rbsp_stop_one_bit
+        bits += [0] * (-len(bits) % 8)
+        return bytes(int(''.join(map(str, bits[i:i + 8])), 2) for i in range(0, len(bits), 8))
+
+
+def h264_sps(width_mbs, height_mbs, crop_bottom=0):
+    """Baseline-profile SPS NAL unit (header byte included)"""
+    writer = BitWriter()
+    writer.u(8, 66)  # profile_idc
+    writer.u(16, 0x001F)  # constraint flags, level_idc
+    for value in (0, 0, 0, 0, 1):  # sps id, log2_max_frame_num, poc type, log2_max_poc_lsb, refs
+        writer.ue(value)
+    writer.u(1, 0)
+    writer.ue(width_mbs - 1)
+    writer.ue(height_mbs - 1)
+    writer.u(1, 1)  # frame_mbs_only_flag
+    writer.u(1, 1)  # direct_8x8_inference_flag
+    writer.u(1, 1 if crop_bottom else 0)
+    if crop_bottom:
+        for value in (0, 0, 0, crop_bottom):
+            writer.ue(value)
+    return b'\x67' + writer.bytes()
+
+
+# MPEG-TS
+
+def ts_packet(pid, payload, start=False):
+    header = bytes([0x47, (0x40 if start else 0) | pid >> 8, pid & 0xFF])
+    stuffing = 184 - len(payload)
+    if stuffing == 0:
+        return header + b'\x10' + payload
+    field = bytes([stuffing - 1]) + (b'\x00' + b'\xff' * (stuffing - 2) if stuffing > 1 else b'')
+    return header + b'\x30' + field + payload
+
+
+def psi(table_id, body):
+    length = len(body) + 4
+    return b'\x00' + bytes([table_id, 0xB0 | length >> 8, length & 0xFF]) + body + b'\x00' * 4
+
+
+def pes(stream_id, pts, data):
+    encoded = bytes([
+        0x21 | ((pts >> 30) & 0x07) << 1, (pts >> 22) & 0xFF,
+        ((pts >> 15) & 0x7F) << 1 | 1, (pts >> 7) & 0xFF, (pts & 0x7F) << 1 | 1
+    ])
+    return b'\x00\x00\x01' + bytes([stream_id, 0, 0, 0x80, 0x80, 5]) + encoded + data
+
+
+def ts_segment():
+    pat = psi(0x00, b'\x00\x01\xc1\x00\x00' + b'\x00\x01\xf0\x00')  # program 1 -> PMT PID 0x1000
+    pmt = psi(0x02, b'\x00\x01\xc1\x00\x00' + b'\xe1\x00\xf0\x00' +
+              b'\x1b\xe1\x00\xf0\x00' + b'\x0f\xe1\x01\xf0\x00')
+    adts = b'\xff\xf1\x4c\x80\x00\x1f\xfc' + b'\x00' * 20  # AAC LC, 48 kHz, 2 channels
+    packets = [ts_packet(0, pat, True), ts_packet(0x1000, pmt, True)]
+    for frame in range(3):
+        video = (b'\x00\x00\x00\x01' + h264_sps(120, 68, crop_bottom=4) if frame == 0 else b'') + \
+            b'\x00\x00\x00\x01\x65' + b'\x88' * 40
+        packets.append(ts_packet(VIDEO_PID, pes(0xE0, 900000 + frame * 3000, video), True))
+        packets.append(ts_packet(AUDIO_PID, pes(0xC0, 900000 + frame * 1920, adts), True))
+    return b''.join(packets)
+
+
+def test_ts_segment_without_ffprobe():
+    data = ts_segment()
+    assert detect_container(data) == 'mpegts'
+
+    result = parse_segment(data)
+    video, audio = result['streams']
+    assert (video['codec_name'], video['width'], video['height']) == ('h264', 1920, 1080)
+    assert Fraction(video['r_frame_rate']) == 30
+    assert (audio['codec_name'], audio['sample_rate'], audio['channels']) == ('aac', '48000', 2)
+    assert result['format']['format_name'] == 'mpegts'
+    assert float(result['format']['start_time']) == 10.0
+    assert float(result['format']['duration']) == 0.1
+
+
+def test_ts_lost_sync_falls_back():
+    data = bytearray(ts_segment())
+    data[188 * 3] = 0
+    assert parse_segment(bytes(data)) is None
+
+
+# Fragmented MP4
+
+def box(box_type, *payload):
+    body = b''.join(payload)
+    return struct.pack('>I', 8 + len(body)) + box_type.encode('latin-1') + body
+
+
+def full_box(box_type, version, flags, *payload):
+    return box(box_type, struct.pack('>I', version << 24 | flags), *payload)
+
+
+def fmp4_init(width=640, height=360, timescale=90000):
+    sample_entry = box('avc1', b'\x00' * 6 + b'\x00\x01' + b'\x00' * 16 + struct.pack('>HH', width, height) +
+                       b'\x00' * 50)
+    trak = box('trak',
+               full_box('tkhd', 0, 3, b'\x00' * 8 + struct.pack('>I', 1) + b'\x00' * 68),
+               box('mdia',
+                   full_box('mdhd', 0, 0, b'\x00' * 8 + struct.pack('>II', timescale, 0) + b'\x00' * 4),
+                   full_box('hdlr', 0, 0, b'\x00' * 4 + b'vide' + b'\x00' * 13),
+                   box('minf', box('stbl', full_box('stsd', 0, 0, struct.pack('>I', 1), sample_entry)))))
+    mvex = box('mvex', full_box('trex', 0, 0, struct.pack('>IIII', 1, 1, 3000, 0) + b'\x00' * 4))
+    return box('ftyp', b'isom\x00\x00\x02\x00') + box('moov', trak, mvex)
+
+
+def fmp4_segment(samples=3, duration=3000, size=1000, decode_time=180000):
+    trun = full_box('trun', 0, 0x300, struct.pack('>I', samples) + struct.pack('>II', duration, size) * samples)
+    traf = box('traf', full_box('tfhd', 0, 0x020000, struct.pack('>I', 1)),
+               full_box('tfdt', 1, 0, struct.pack('>Q', decode_time)), trun)
+    return box('styp', b'msdh\x00\x00\x00\x00') + box('moof', traf) + box('mdat', b'\x00' * samples * size)
+
+
+def test_fmp4_segment_with_init_section():
+    data = fmp4_segment()
+    assert detect_container(data) == 'mp4'
+
+    result = parse_segment(data, fmp4_init())
+    (video,) = result['streams']
+    assert (video['codec_name'], video['width'], video['height']) == ('h264', 640, 360)
+    assert Fraction(video['r_frame_rate']) == 30
+    assert video['bit_rate'] == str(int(3000 * 8 / 0.1))
+    assert float(result['format']['start_time']) == 2.0
+    assert float(result['format']['duration']) == 0.1
+
+
+def test_fmp4_without_init_section_falls_back():
+    assert parse_segment(fmp4_segment()) is None
+
+
+def test_unknown_bytes_fall_back():
+    assert detect_container(b'<html>not a segment</html>') is None
+    assert parse_segment(b'<html>not a segment</html>') is None
+
+
+# Parameter sets
+
+def test_sps_cropping_and_emulation_prevention():
+    assert parse_h264_sps(h264_sps(80, 45)) == (1280, 720)
+    assert parse_h264_sps(h264_sps(120, 68, crop_bottom=4)) == (1920, 1080)
+
+    assert _unescape_rbsp(b'\x00\x00\x03\x01\x00\x00\x03\x00') == bytearray(b'\x00\x00\x01\x00\x00\x00')
+    plain = b'\x12\x00\x00\x01'
+    assert _unescape_rbsp(plain) is plain
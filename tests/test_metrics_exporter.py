@@ -0,0 +1,47 @@
+from metrics_exporter import MetricsExporter, define_metrics
+
+
+def test_defined_families_render_before_first_use():
+    exporter = MetricsExporter()
+    define_metrics(exporter)
+    text = exporter.render()
+
+    assert '# TYPE hls_playlist_fetch_seconds histogram' in text
+    assert '# TYPE hls_stream_polls_total counter' in text
+    assert 'hls_stream_polls_total{' not in text
+
+
+def test_histogram_buckets_are_cumulative():
+    exporter = MetricsExporter()
+    exporter.define('fetch_seconds', 'histogram', 'Fetch time', buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        exporter.observe('fetch_seconds', {'stream': 'a'}, value)
+
+    lines = exporter.render().splitlines()
+    assert 'hls_fetch_seconds_bucket{stream="a",le="0.1"} 1' in lines
+    assert 'hls_fetch_seconds_bucket{stream="a",le="1"} 2' in lines
+    assert 'hls_fetch_seconds_bucket{stream="a",le="+Inf"} 3' in lines
+    assert 'hls_fetch_seconds_count{stream="a"} 3' in lines
+
+
+def test_cached_lines_follow_updates():
+    exporter = MetricsExporter()
+    exporter.define('streams', 'gauge', 'Streams')
+    exporter.set('streams', None, 1)
+    assert 'hls_streams 1' in exporter.render()
+    exporter.set('streams', None, 2)
+    assert 'hls_streams 2' in exporter.render()
+
+
+def test_remove_narrows_by_labels():
+    exporter = MetricsExporter()
+    exporter.define('ratio', 'gauge', 'Ratio')
+    exporter.set('ratio', {'stream': 's1', 'rendition': 'r1'}, 1)
+    exporter.set('ratio', {'stream': 's1', 'rendition': 'r2'}, 1)
+    exporter.set('ratio', {'stream': 's2', 'rendition': 'r1'}, 1)
+
+    exporter.remove('rendition', 'r1', stream='s1')
+    assert exporter.label_values('rendition') == {'r1', 'r2'}
+    assert exporter.label_values('stream') == {'s1', 's2'}
+    exporter.remove('stream', 's1')
+    assert exporter.label_values('stream') == {'s2'}
@@ -0,0 +1,100 @@
+import os
+import random
+import struct
+
+import pytest
+
+from metrics_log import BLOCK_RECORDS, MetricsLog
+from timeseries import summarize
+
+URL = 'http://origin.example/live.m3u8'
+COLUMNS = ('rate', 'error')
+
+
+def test_round_trip(tmp_path):
+    log = MetricsLog(str(tmp_path), COLUMNS)
+    for i in range(10):
+        log.append(URL, 1000.123 + i, {'rate': i * 1.5, 'error': 1 if i == 3 else None})
+
+    # No start: the first record is returned even though file names are rounded
+    result = log.query(URL, end=2000)
+    assert result['timestamp'][0] == pytest.approx(1000.123)
+    assert len(result['timestamp']) == 10
+    assert result['rate'][:3] == [0.0, 1.5, 3.0]
+    assert result['error'][3] == 1.0 and result['error'][4] is None
+
+    result = log.query(URL, start=1003.0, end=1005.5, columns=['rate', 'unknown'])
+    assert set(result) == {'timestamp', 'rate'}
+    assert result['rate'] == [4.5, 6.0, 7.5]
+    log.close()
+
+
+def test_rotation_and_downsampling(tmp_path):
+    record_size = 8 + 4 * len(COLUMNS)
+    log = MetricsLog(str(tmp_path), COLUMNS, max_file_bytes=512 + 10 * record_size, max_file_age=1e9)
+    for i in range(100):
+        log.append(URL, 1000.0 + i, {'rate': i})
+
+    directory = next(path for path in tmp_path.iterdir() if path.is_dir())
+    assert len([name for name in os.listdir(directory) if name.endswith('.log')]) == 10
+    assert log.query(URL, start=1000, end=1099)['rate'] == list(range(100))
+
+    thinned = log.query(URL, start=1000, end=1100, max_points=10)
+    assert thinned['rate'] == list(range(0, 100, 10))
+    log.close()
+
+
+def test_retention_prunes_old_files(tmp_path):
+    log = MetricsLog(str(tmp_path), COLUMNS, max_file_age=10, retention=100)
+    for i in range(0, 300, 5):
+        log.append(URL, 1000.0 + i, {'rate': i})
+
+    timestamps = log.query(URL, end=2000)['timestamp']
+    assert timestamps[-1] == 1295.0
+    assert timestamps[0] >= 1295.0 - 100 - 15
+    log.close()
+
+
+def test_released_streams_stay_readable(tmp_path):
+    log = MetricsLog(str(tmp_path), COLUMNS)
+    log.append(URL, 1000.0, {'rate': 1})
+    log.release(URL)
+
+    assert log.query(URL, end=2000)['rate'] == [1.0]
+    assert URL not in log._streams  # Reading doesn't reopen it for appending
+    assert log.query('http://origin.example/other.m3u8') == {'timestamp': [], 'rate': [], 'error': []}
+
+    # A new process over the same directory sees the history too
+    assert MetricsLog(str(tmp_path), COLUMNS).query(URL, end=2000)['rate'] == [1.0]
+
+
+def test_aggregate_uses_block_index(tmp_path):
+    record_size = 8 + 4 * len(COLUMNS)
+    rows = BLOCK_RECORDS * 5 + 17
+    log = MetricsLog(str(tmp_path), COLUMNS, max_file_bytes=512 + BLOCK_RECORDS * 3 * record_size, max_file_age=1e9)
+    generator = random.Random(3)
+    for i in range(rows):
+        log.append(URL, 1000.0 + i, {'rate': generator.uniform(0, 100), 'error': 1 if i % 7 == 0 else None})
+
+    for start, end in ((None, 5000), (1000.0 + 100, 1000.0 + 1200.5), (1000.0 + 300, 1000.0 + 310)):
+        logged = log.query(URL, start=start, end=end)
+        aggregates, span = log.aggregate(URL, start=start, end=end)
+        assert span == (logged['timestamp'][0], logged['timestamp'][-1])
+        for column in COLUMNS:
+            expected = summarize(logged[column])
+            assert aggregates[column] == dict(expected, avg=pytest.approx(expected['avg']))
+
+    # Indexed blocks are not read again: corrupt their records on disk
+    directory = next(path for path in tmp_path.iterdir() if path.is_dir())
+    first = min(path for path in directory.iterdir() if path.suffix == '.log')
+    with open(first, 'r+b') as f:
+        f.seek(512 + BLOCK_RECORDS * record_size + 8)
+        f.write(struct.pack('<f', 1e9))
+    aggregates, _ = log.aggregate(URL, start=1000.0 + 10, end=5000)
+    assert aggregates['rate']['max'] <= 100
+
+    # Without the index, records are read
+    os.remove(first.with_suffix('.idx'))
+    aggregates, _ = log.aggregate(URL, start=1000.0 + 10, end=5000)
+    assert aggregates['rate']['max'] == pytest.approx(1e9)
+    log.close()
@@ -0,0 +1,66 @@
+import threading
+import time
+
+import pytest
+
+from monitor import MonitorEngine, MonitoredStream, PollScheduler, poll_phase
+
+
+def test_poll_phase_is_stable_and_spread():
+    urls = [f"http://origin.example/live/{i}/index.m3u8" for i in range(200)]
+    phases = [poll_phase(url) for url in urls]
+
+    assert phases == [poll_phase(url) for url in urls]
+    assert all(0 <= phase < 1 for phase in phases)
+    # Every tenth of the interval gets some of the streams
+    assert len({int(phase * 10) for phase in phases}) == 10
+
+
+def test_next_poll_snaps_to_phase_grid():
+    engine = MonitorEngine(lambda url, stream: {})
+    stream = MonitoredStream('http://origin.example/a.m3u8')
+    interval = 6.0
+
+    for updated_at in (1000.0, 1000.4, 1003.9, 1010.25):
+        stream.updated_at = updated_at
+        due = engine._next_poll_at(stream, interval)
+        ticks = (due - stream.phase * interval) / interval
+        assert abs(ticks - round(ticks)) < 1e-9
+        assert updated_at + interval / 2 <= due <= updated_at + interval * 1.5
+
+    # A poll that took a while doesn't push the cadence back
+    stream.updated_at = 1000.0
+    first = engine._next_poll_at(stream, interval)
+    stream.updated_at = first + 0.8
+    assert engine._next_poll_at(stream, interval) == pytest.approx(first + interval)
+
+
+def test_scheduler_runs_callbacks_in_due_order():
+    scheduler = PollScheduler(max_workers=1)
+    order = []
+    done = threading.Event()
+    now = time.time()
+    try:
+        scheduler.schedule(now + 0.06, lambda: (order.append('c'), done.set()))
+        scheduler.schedule(now + 0.02, lambda: order.append('a'))
+        scheduler.schedule(now + 0.04, lambda: order.append('b'))
+        assert done.wait(2)
+        assert order == ['a', 'b', 'c']
+        assert scheduler.pending() == 0
+    finally:
+        scheduler.shutdown()
+
+
+def test_pinned_streams_start_at_their_phase():
+    polled = {}
+    engine = MonitorEngine(lambda url, stream: polled.setdefault(url, time.time()) and {},
+                           first_poll_spread=0.5)
+    try:
+        start = time.time()
+        on_demand = engine.register('http://origin.example/viewer.m3u8')
+        pinned = engine.register('http://origin.example/pinned.m3u8', pinned=True)
+        assert on_demand.ready.wait(2) and pinned.ready.wait(2)
+        assert polled[on_demand.url] - start < 0.2
+        assert polled[pinned.url] - start >= pinned.phase * 0.5 - 0.02
+    finally:
+        engine.stop_all()
@@ -0,0 +1,181 @@
+import random
+import threading
+import time
+
+import pytest
+
+from optimizations import CircularBuffer, LatencyHistogram, TTLCache, timed_cache
+
+
+def test_latency_quantiles_within_bucket_error():
+    histogram = LatencyHistogram()
+    for i in range(1, 1001):
+        histogram.record(i / 1000)
+
+    summary = histogram.summary()
+    assert summary['count'] == 1000
+    assert summary['max'] == 1.0
+    assert summary['p50'] == pytest.approx(0.5, rel=LatencyHistogram.GAMMA - 1)
+    assert summary['p99'] == pytest.approx(0.99, rel=LatencyHistogram.GAMMA - 1)
+
+
+def test_latency_merges_thread_shards():
+    histogram = LatencyHistogram()
+
+    def record():
+        for _ in range(100):
+            histogram.record(0.01)
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    histogram.record(0.02)  # Folds the finished threads' shards
+    assert histogram.summary()['count'] == 401
+
+
+def test_latency_window_rotates():
+    histogram = LatencyHistogram(window=0.05)
+    histogram.record(5.0)
+    time.sleep(0.06)
+    histogram.record(0.1)
+    # One rotation: the previous window is still reported
+    assert histogram.summary()['count'] == 2
+
+    time.sleep(0.06)
+    histogram.record(0.1)
+    summary = histogram.summary()
+    assert summary['count'] == 2
+    assert summary['max'] == pytest.approx(0.1)
+
+    time.sleep(0.11)
+    assert histogram.summary()['count'] == 0
+
+
+def test_cache_expires_entries():
+    cache = TTLCache(ttl=60)
+    cache.set('fresh', 1)
+    cache.set('stale', 2, ttl=0)
+
+    assert cache.get('fresh') == 1
+    assert cache.get('stale') is None
+    stats = cache.get_stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1 and stats['expirations'] == 1
+    assert len(cache) == 1
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.evictions == 1
+
+
+def test_cache_byte_budget():
+    cache = TTLCache(max_bytes=100)
+    cache.set('a', b'x' * 60)
+    cache.set('b', b'y' * 60)
+    assert cache.get('a') is None and cache.get('b') is not None
+
+    cache.set('huge', b'z' * 200)  # Never worth evicting everything for one entry
+    assert cache.get('huge') is None and cache.get('b') is not None
+
+
+def test_cache_coalesces_concurrent_misses():
+    cache = TTLCache()
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        release.wait(2)
+        return 'value'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('key', loader)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while cache.coalesced < 7:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert results == ['value'] * 8
+    assert cache.get_or_load('key', loader) == 'value' and calls == [1]
+
+
+def test_cache_failed_load_reaches_waiters_and_is_not_cached():
+    cache = TTLCache()
+
+    def loader():
+        raise ValueError('upstream down')
+
+    with pytest.raises(ValueError):
+        cache.get_or_load('key', loader)
+    assert cache.get_or_load('key', lambda: 'recovered') == 'recovered'
+
+
+def test_timed_cache_keys_on_arguments():
+    calls = []
+
+    @timed_cache(seconds=60)
+    def double(value, factor=2):
+        calls.append(value)
+        return value * factor
+
+    assert double(2) == 4 and double(2) == 4
+    assert double(2, factor=3) == 6
+    assert double([1]) == [1, 1]  # Unhashable arguments fall back to repr keys
+    assert calls == [2, 2, [1]]
+    assert double.cache.hits == 1
+
+
+def test_circular_buffer_keeps_insertion_order():
+    buffer = CircularBuffer(3)
+    for value in range(5):
+        buffer.append(value)
+
+    assert buffer.get_recent() == [2, 3, 4]
+    assert buffer.get_recent(2) == [3, 4]
+    assert buffer.get_recent(0) == []
+    assert list(buffer) == [2, 3, 4]
+    assert buffer.last() == 4 and len(buffer) == 3
+
+
+def test_circular_buffer_aggregates_match_window():
+    generator = random.Random(7)
+    buffer = CircularBuffer(10)
+    window = []
+    for _ in range(500):
+        value = generator.choice([generator.uniform(0, 100), generator.randint(-5, 5), None])
+        buffer.append(value)
+        window = (window + [value])[-10:]
+        numbers = [item for item in window if item is not None]
+        if numbers:
+            assert buffer.mean() == pytest.approx(sum(numbers) / len(numbers))
+            assert buffer.min() == min(numbers)
+            assert buffer.max() == max(numbers)
+
+
+def test_circular_buffer_ewma_and_clear():
+    buffer = CircularBuffer(5, alpha=0.5)
+    assert buffer.mean() == 0 and buffer.ewma == 0
+    buffer.append(10)
+    buffer.append(20)
+    buffer.append(True)  # Stored, but not a number for the aggregates
+    assert buffer.ewma == 15
+    assert buffer.mean() == 15
+
+    buffer.clear()
+    assert len(buffer) == 0 and buffer.get_recent() == []
+    buffer.append(3)
+    assert buffer.min() == buffer.max() == 3
@@ -0,0 +1,101 @@
+import m3u8
+import pytest
+
+from playlist_parser import (
+    ParsedPlaylist, PlaylistParseError, load_playlist, parse_playlist, parse_program_date_time
+)
+
+MEDIA = """#EXTM3U
+#EXT-X-VERSION:7
+#EXT-X-TARGETDURATION:6
+#EXT-X-MEDIA-SEQUENCE:1200
+#EXT-X-DISCONTINUITY-SEQUENCE:3
+#EXT-X-MAP:URI="init.mp4"
+#EXT-X-PROGRAM-DATE-TIME:2024-01-01T00:00:00.000Z
+#EXTINF:6.000,first
+seg1200.m4s
+#EXTINF:5.5,
+seg1201.m4s
+#EXT-X-DISCONTINUITY
+#EXT-X-MAP:URI="init2.mp4",BYTERANGE="720@0"
+#EXT-X-PROGRAM-DATE-TIME:2024-01-01T00:00:11.5+00:00
+#EXTINF:6.000,
+seg1202.m4s
+#EXT-X-ENDLIST
+"""
+
+MASTER = """#EXTM3U
+#EXT-X-STREAM-INF:BANDWIDTH=1280000,AVERAGE-BANDWIDTH=1000000,RESOLUTION=1280x720,CODECS="avc1.4d401f,mp4a.40.2",FRAME-RATE=29.970
+v720.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=640000,RESOLUTION=640x360
+v360.m3u8
+"""
+
+
+def test_media_playlist_matches_m3u8():
+    fast = parse_playlist(MEDIA)
+    full = m3u8.loads(MEDIA)
+
+    assert fast.media_sequence == full.media_sequence == 1200
+    assert fast.discontinuity_sequence == full.discontinuity_sequence == 3
+    assert fast.target_duration == full.target_duration
+    assert fast.is_endlist and full.is_endlist
+    assert [s.uri for s in fast.segments] == [s.uri for s in full.segments]
+    assert [s.duration for s in fast.segments] == [s.duration for s in full.segments]
+    assert [s.discontinuity for s in fast.segments] == [s.discontinuity for s in full.segments]
+    assert [s.program_date_time for s in fast.segments] == [s.program_date_time for s in full.segments]
+    assert [s.init_section.uri for s in fast.segments] == [s.init_section.uri for s in full.segments]
+    assert fast.segments[2].init_section.byterange == '720@0'
+    assert fast.segments[0].title == 'first'
+
+
+def test_master_playlist_matches_m3u8():
+    fast = parse_playlist(MASTER)
+    full = m3u8.loads(MASTER)
+
+    assert fast.is_variant and full.is_variant
+    for fast_variant, full_variant in zip(fast.playlists, full.playlists):
+        assert fast_variant.uri == full_variant.uri
+        assert fast_variant.stream_info.bandwidth == full_variant.stream_info.bandwidth
+        assert fast_variant.stream_info.resolution == full_variant.stream_info.resolution
+    info = fast.playlists[0].stream_info
+    assert info.average_bandwidth == 1000000
+    assert info.codecs == 'avc1.4d401f,mp4a.40.2'
+    assert info.frame_rate == pytest.approx(29.97)
+
+
+@pytest.mark.parametrize('text', [
+    '',
+    '#EXT-X-VERSION:3\n#EXTINF:6,\nseg.ts\n',
+    '#EXTM3U\nseg.ts\n',
+    '#EXTM3U\n#EXTINF:abc,\nseg.ts\n',
+])
+def test_malformed_playlists_raise(text):
+    with pytest.raises(PlaylistParseError):
+        parse_playlist(text)
+
+
+@pytest.mark.parametrize('tag', [
+    '#EXT-X-BYTERANGE:1000@0',
+    '#EXT-X-KEY:METHOD=AES-128,URI="key.bin"',
+    '#EXT-X-SESSION-KEY:METHOD=AES-128,URI="key.bin"',
+    '#EXT-X-PART:DURATION=1.0,URI="part0.m4s"',
+])
+def test_unsupported_tags_fall_back_to_m3u8(tag):
+    text = f"#EXTM3U\n#EXT-X-TARGETDURATION:6\n{tag}\n#EXTINF:6.0,\nseg.ts\n"
+    with pytest.raises(PlaylistParseError):
+        parse_playlist(text)
+
+    playlist = load_playlist(text)
+    assert isinstance(playlist, m3u8.M3U8)
+    assert [s.uri for s in playlist.segments] == ['seg.ts']
+
+
+def test_load_playlist_prefers_fast_parser():
+    assert isinstance(load_playlist(MEDIA), ParsedPlaylist)
+    assert isinstance(load_playlist(MEDIA, full=True), m3u8.M3U8)
+
+
+def test_program_date_time_fraction_lengths():
+    assert parse_program_date_time('2024-01-01T00:00:00.5Z').microsecond == 500000
+    assert parse_program_date_time('2024-01-01T00:00:00.123456789Z').microsecond == 123456
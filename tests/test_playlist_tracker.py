@@ -0,0 +1,112 @@
+import types
+
+import pytest
+
+import playlist_tracker
+from playlist_parser import Segment, parse_program_date_time
+from playlist_tracker import PlaylistTracker
+
+START_PDT = '2024-01-01T00:00:00Z'
+START = parse_program_date_time(START_PDT).timestamp()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = types.SimpleNamespace(value=START + 100)
+    monkeypatch.setattr(playlist_tracker, 'time', types.SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def window(first, count, duration=4.0, pdt_at=None, discontinuity_at=None):
+    """Segments ``first``..``first + count - 1``; only ``pdt_at`` carries a date (START)"""
+    segments = []
+    for sequence in range(first, first + count):
+        pdt = START_PDT if sequence == pdt_at else None
+        segments.append(Segment(f'seg{sequence}.ts', duration, None, sequence == discontinuity_at, pdt))
+    return segments
+
+
+def test_only_new_segments_are_returned(clock):
+    tracker = PlaylistTracker()
+    first = tracker.update(100, window(100, 5), source='a')
+    second = tracker.update(101, window(101, 6), source='a')
+
+    assert [entry.sequence for entry in first] == [100, 101, 102, 103, 104]
+    assert [entry.sequence for entry in second] == [105, 106]
+    stats = tracker.get_stats()
+    assert stats['media_sequence'] == 101 and stats['last_sequence'] == 106
+    assert stats['window_segments'] == 6 and stats['window_duration'] == 24.0
+    assert stats['segments_seen'] == 7 and stats['total_duration'] == 28.0
+    assert [entry.uri for entry in tracker.recent(2)] == ['seg105.ts', 'seg106.ts']
+
+
+def test_gap_counts_missed_segments(clock):
+    tracker = PlaylistTracker()
+    tracker.update(100, window(100, 5), source='a')
+    new = tracker.update(110, window(110, 3, discontinuity_at=111), source='a')
+
+    assert [entry.sequence for entry in new] == [110, 111, 112]
+    stats = tracker.get_stats()
+    assert stats['gaps'] == 1 and stats['missed_segments'] == 5
+    assert stats['window_segments'] == 3
+    assert stats['window_discontinuities'] == stats['discontinuities'] == 1
+
+
+@pytest.mark.parametrize('media_sequence, source', [(90, 'a'), (105, 'b')])
+def test_restart_resets_the_window(clock, media_sequence, source):
+    tracker = PlaylistTracker()
+    tracker.update(100, window(100, 5), source='a')
+    new = tracker.update(media_sequence, window(media_sequence, 3), source=source)
+
+    assert len(new) == 3
+    stats = tracker.get_stats()
+    assert stats['resets'] == 1
+    assert stats['segments_seen'] == 3 and stats['gaps'] == 0
+
+
+def test_staleness_after_one_and_a_half_target_durations(clock):
+    tracker = PlaylistTracker()
+    tracker.update(100, window(100, 3), source='a', target_duration=4)
+
+    clock.value += 5
+    tracker.update(100, window(100, 3), source='a', target_duration=4)
+    assert not tracker.stale
+
+    clock.value += 2
+    tracker.update(100, window(100, 3), source='a', target_duration=4)
+    assert tracker.stale and tracker.stale_events == 1
+    assert tracker.playlist_age() == pytest.approx(7)
+
+    clock.value += 1
+    tracker.update(101, window(101, 3), source='a', target_duration=4)
+    assert not tracker.stale
+    assert tracker.update_interval == pytest.approx(8)
+    assert tracker.get_live_edge()['cadence_ratio'] == 2.0
+
+    clock.value += 100
+    tracker.update(101, window(101, 3), source='a', target_duration=4, ended=True)
+    assert not tracker.stale and tracker.stale_events == 1
+
+
+def test_program_date_time_carries_forward(clock):
+    tracker = PlaylistTracker()
+    entries = tracker.update(100, window(100, 3, pdt_at=100), source='a')
+
+    assert [entry.program_date_time for entry in entries] == [START, START + 4, START + 8]
+    # Newest segment ends at START + 12; the first poll has no publish latency
+    assert tracker.edge_latency == pytest.approx(88)
+    assert tracker.publish_latency is None
+
+    clock.value += 4
+    (entry,) = tracker.update(101, window(101, 3), source='a')
+    assert entry.program_date_time == START + 12
+    assert tracker.publish_latency == pytest.approx(88)
+
+
+def test_gap_drops_the_carried_date(clock):
+    tracker = PlaylistTracker()
+    tracker.update(100, window(100, 3, pdt_at=100), source='a')
+    entries = tracker.update(105, window(105, 2), source='a')
+
+    assert [entry.program_date_time for entry in entries] == [None, None]
+    assert tracker.edge_latency is None
@@ -0,0 +1,101 @@
+import threading
+
+from probe_service import ProbeJob, ProbeService
+
+
+def test_callback_added_after_finish_runs_immediately():
+    job = ProbeJob('http://example.com/a.ts', ProbeService.PRIORITY_LIVE_EDGE, deadline=0)
+    job._finish('done', result={'ok': True})
+    seen = []
+    job.add_done_callback(lambda finished: seen.append(finished.result))
+    assert seen == [{'ok': True}]
+
+
+def test_callbacks_race_finish_and_run_exactly_once():
+    for _ in range(500):
+        job = ProbeJob('http://example.com/a.ts', ProbeService.PRIORITY_LIVE_EDGE, deadline=0)
+        calls = []
+        start = threading.Barrier(3)
+
+        def add():
+            start.wait()
+            for _ in range(20):
+                job.add_done_callback(lambda finished: calls.append(finished.status))
+
+        def finish():
+            start.wait()
+            job._finish('done', result=1)
+
+        threads = [threading.Thread(target=add), threading.Thread(target=add), threading.Thread(target=finish)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert calls == ['done'] * 40
+
+
+class _PausingJob(ProbeJob):
+    """Pauses the adding thread right after it has checked done()"""
+    __slots__ = ('adder', 'checked', 'resume')
+
+    def done(self):
+        done = super().done()
+        if threading.current_thread() is self.adder:
+            self.checked.set()
+            self.resume.wait(5)
+        return done
+
+
+def test_callback_added_while_finishing_is_not_lost():
+    job = _PausingJob('http://example.com/a.ts', ProbeService.PRIORITY_LIVE_EDGE, deadline=0)
+    job.checked, job.resume = threading.Event(), threading.Event()
+    calls = []
+    job.adder = threading.Thread(target=job.add_done_callback, args=(lambda finished: calls.append(1),))
+    job.adder.start()
+    job.checked.wait(5)
+
+    # _finish runs while add_done_callback is between its check and its append
+    finisher = threading.Thread(target=job._finish, args=('done',))
+    finisher.start()
+    finisher.join(0.2)
+    job.resume.set()
+    job.adder.join(5)
+    finisher.join(5)
+    assert calls == [1]
+
+
+def test_failing_callback_does_not_block_others():
+    job = ProbeJob('http://example.com/a.ts', ProbeService.PRIORITY_LIVE_EDGE, deadline=0)
+    seen = []
+    job.add_done_callback(lambda finished: 1 / 0)
+    job.add_done_callback(lambda finished: seen.append(finished.status))
+    job._finish('failed', error='boom')
+    assert seen == ['failed']
+
+
+def test_submit_deduplicates_inflight_url():
+    release = threading.Event()
+    service = ProbeService(lambda url: release.wait(5) and url, workers=1)
+    try:
+        first = service.submit('http://example.com/a.ts')
+        second = service.submit('http://example.com/a.ts')
+        assert first is second
+        release.set()
+        assert first.wait(5) == 'http://example.com/a.ts'
+        assert service.get_stats()['deduplicated'] == 1
+    finally:
+        service.shutdown()
+
+
+def test_queue_depth_counts_jobs_waiting_for_a_worker():
+    started, release = threading.Event(), threading.Event()
+    service = ProbeService(lambda url: started.set() or release.wait(5), workers=1)
+    try:
+        service.submit('http://example.com/a.ts')
+        assert started.wait(5)
+        service.submit('http://example.com/b.ts')
+        service.submit('http://example.com/c.ts')
+        assert service.queue_depth() == 2 == service.get_stats()['queued']
+    finally:
+        release.set()
+        service.shutdown()
@@ -0,0 +1,160 @@
+import asyncio
+import http.server
+import threading
+import time
+
+import m3u8
+import pytest
+
+from fetch_engine import AsyncFetchEngine
+from renditions import analyze_renditions, list_renditions, throughput_metrics
+
+MASTER = """#EXTM3U
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aud",NAME="en",LANGUAGE="en",URI="audio.m3u8"
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aud2",NAME="en",LANGUAGE="en",URI="audio.m3u8"
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="muxed",NAME="main"
+#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360,AUDIO="aud"
+fast.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=1280x720,AUDIO="aud"
+slow.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=1920x1080,AUDIO="aud"
+missing.m3u8
+#EXT-X-I-FRAME-STREAM-INF:BANDWIDTH=90000,URI="iframes.m3u8"
+"""
+
+LADDER = """#EXTM3U
+#EXT-X-STREAM-INF:BANDWIDTH=800000
+fast.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=800000
+slow.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=800000
+stalled.m3u8
+"""
+
+
+def media_playlist(segment):
+    return f"#EXTM3U\n#EXT-X-TARGETDURATION:4\n#EXT-X-MEDIA-SEQUENCE:7\n#EXTINF:4.0,\n{segment}\n"
+
+
+class Origin(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        name = self.path.lstrip('/')
+        if name == 'stalled.m3u8':
+            time.sleep(3)
+            self._send(404, b'')
+        elif name.endswith('.m3u8') and name != 'missing.m3u8':
+            self._send(200, media_playlist(name.replace('.m3u8', '.ts')).encode())
+        elif name == 'slow.ts':
+            # Headers and a first chunk, then the body stalls past the sample deadline
+            self.send_response(200)
+            self.send_header('Content-Length', '100000')
+            self.end_headers()
+            self.wfile.write(b'\x00' * 1000)
+            self.wfile.flush()
+            time.sleep(1.5)
+        elif name.endswith('.ts'):
+            self._send(200, b'\x00' * 50000)
+        else:
+            self._send(404, b'')
+
+    def do_HEAD(self):
+        self._send(200 if self.path.endswith('.ts') else 404, b'', head=True)
+
+    def _send(self, status, body, head=False):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def origin():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Origin)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+
+
+def test_list_renditions_dedupes_shared_media_playlists():
+    renditions = list_renditions('http://origin.example/live/master.m3u8', m3u8.loads(MASTER))
+
+    assert [(r['type'], r['url'].rsplit('/', 1)[1]) for r in renditions] == [
+        ('VIDEO', 'fast.m3u8'), ('VIDEO', 'slow.m3u8'), ('VIDEO', 'missing.m3u8'),
+        ('IFRAME', 'iframes.m3u8'), ('AUDIO', 'audio.m3u8')
+    ]
+    assert renditions[0]['resolution'] == '640x360' and renditions[0]['bandwidth'] == 800000
+
+
+def test_throughput_metrics():
+    sample = {'status_code': 206, 'bytes': 100000, 'ttfb': 0.01, 'duration': 0.1, 'timed_out': False}
+    metrics = throughput_metrics(sample, bandwidth=4000000)
+    assert metrics['throughput_mbps'] == 8.0 and metrics['bandwidth_ratio'] == 2.0
+    assert metrics['mode'] == 'range' and metrics['realtime_factor'] is None
+
+    full = throughput_metrics(sample, bandwidth=4000000, segment_duration=4, full=True)
+    assert full['realtime_factor'] == 40.0
+
+    stalled = throughput_metrics(dict(sample, bytes=0, ttfb=None, timed_out=True), bandwidth=4000000)
+    assert stalled['bandwidth_ratio'] == 0 and stalled['ttfb_ms'] is None
+
+
+def test_analyze_renditions(origin):
+    report = analyze_renditions(origin + 'master.m3u8', m3u8.loads(MASTER), timeout=1,
+                                sample_bytes=200000, full_fraction=0, sample_share=0.5)
+    results = {r['url'].rsplit('/', 1)[1]: r for r in report['renditions']}
+
+    fast = results['fast.m3u8']
+    assert fast['health'] == 'healthy' and fast['media_sequence'] == 7
+    assert fast['throughput']['bytes'] == 50000 and not fast['throughput']['timed_out']
+
+    slow = results['slow.m3u8']
+    assert slow['health'] == 'degraded' and slow['throughput']['timed_out']
+    assert slow['throughput']['bandwidth_ratio'] < 1
+
+    assert results['missing.m3u8']['health'] == 'down'
+    assert results['missing.m3u8']['error'] == 'HTTP 404 when fetching playlist'
+
+    summary = report['summary']
+    assert summary['total'] == 5 and summary['down'] == 1
+    assert summary['sample_timeouts'] == 1 and summary['below_bandwidth'] >= 1
+
+
+def test_analyze_renditions_returns_within_budget(origin):
+    # A stalled playlist and a stalled sample both outlast the budget
+    start = time.perf_counter()
+    report = analyze_renditions(origin + 'master.m3u8', m3u8.loads(LADDER), timeout=1.0,
+                                sample_bytes=200000, full_fraction=0, sample_share=0.5)
+    assert time.perf_counter() - start <= 1.0
+
+    results = {r['url'].rsplit('/', 1)[1]: r for r in report['renditions']}
+    assert results['fast.m3u8']['health'] == 'healthy'
+    assert results['slow.m3u8']['throughput']['timed_out']
+    assert results['stalled.m3u8']['health'] == 'down'
+    assert results['stalled.m3u8']['error'].startswith('Timed out')
+
+
+def test_fetch_times_exclude_the_semaphore_wait(origin):
+    engine = AsyncFetchEngine()
+    url = origin + 'fast.ts'
+
+    async def queued_behind_a_held_semaphore():
+        semaphore = engine._host_semaphore(url)
+        for _ in range(engine.PER_HOST_LIMIT):
+            await semaphore.acquire()
+        head = asyncio.ensure_future(engine.head_async(url))
+        sample = asyncio.ensure_future(engine.sample_download_async(url))
+        cut_off = asyncio.ensure_future(engine.sample_download_async(url, timeout=0.2))
+        await asyncio.sleep(0.5)
+        for _ in range(engine.PER_HOST_LIMIT):
+            semaphore.release()
+        return await head, await sample, await cut_off
+
+    (status, elapsed), sample, cut_off = engine.run(queued_behind_a_held_semaphore(), timeout=5)
+    assert status == 200 and elapsed < 0.5
+    assert sample['bytes'] == 50000 and sample['duration'] < 0.5 and sample['ttfb'] < 0.5
+    assert cut_off['timed_out'] and cut_off['bytes'] == 0 and cut_off['duration'] == 0
@@ -0,0 +1,60 @@
+import pytest
+
+from rollups import QuantileSketch, StreamRollups
+
+
+def test_quantile_sketch_relative_error():
+    sketch = QuantileSketch()
+    for value in range(1, 1001):
+        sketch.add(float(value))
+    sketch.add(0)
+
+    assert sketch.quantile(0) == 0.0
+    assert sketch.quantile(0.5) == pytest.approx(500, rel=0.02)
+    assert sketch.quantile(0.95) == pytest.approx(950, rel=0.02)
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def test_buckets_close_into_summaries():
+    rollups = StreamRollups(('rate',), resolutions={'1m': (60, 10)})
+    for second in range(0, 180, 10):
+        rollups.add(1200.0 + second, {'rate': second % 60, 'other': 1})
+    rollups.add(1200.0 + 185, {'rate': None})
+
+    result = rollups.query('1m')
+    # The last bucket is still open and has no values yet
+    assert result['timestamp'] == [1200.0, 1260.0, 1320.0, 1380.0]
+    assert result['bucket_seconds'] == 60
+    rate = result['metrics']['rate']
+    assert rate['count'] == [6, 6, 6, None]
+    assert rate['min'][:3] == [0, 0, 0] and rate['max'][:3] == [50, 50, 50]
+    assert rate['avg'][:3] == [25, 25, 25]
+    assert all(0 <= p95 <= 50 for p95 in rate['p95'][:3])
+
+
+def test_query_range_includes_overlapping_buckets():
+    rollups = StreamRollups(('rate',), resolutions={'1m': (60, 10)})
+    for minute in range(5):
+        rollups.add(minute * 60.0 + 1, {'rate': minute})
+
+    result = rollups.query('1m', start=130, end=200)
+    assert result['timestamp'] == [120.0, 180.0]
+    assert result['metrics']['rate']['avg'] == [2, 3]
+    # The open bucket is summarized on the fly
+    result = rollups.query('1m', start=250)
+    assert result['timestamp'] == [240.0]
+    assert result['metrics']['rate']['avg'] == [4]
+
+
+def test_late_samples_are_dropped():
+    rollups = StreamRollups(('rate',), resolutions={'1m': (60, 10)})
+    rollups.add(130.0, {'rate': 1})
+    rollups.add(10.0, {'rate': 100})
+    assert rollups.query('1m')['metrics']['rate']['max'] == [1]
+
+
+def test_pick_resolution():
+    rollups = StreamRollups(('rate',))
+    assert rollups.pick_resolution(3600, 300) == '1m'
+    assert rollups.pick_resolution(86400, 300) == '5m'
+    assert rollups.pick_resolution(30 * 86400, 300) == '1h'
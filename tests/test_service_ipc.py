@@ -0,0 +1,60 @@
+import multiprocessing
+import time
+
+import pytest
+
+from service_ipc import ServiceClient, parse_address, serve
+
+
+class FakeService:
+    def __init__(self):
+        self.calls = []
+
+    def get_stream(self, url, pinned=False):
+        self.calls.append(url)
+        return {'url': url, 'pinned': pinned, 'calls': len(self.calls)}
+
+
+def serve_fake(address):
+    serve(FakeService(), address, b'secret')
+
+
+def test_parse_address():
+    assert parse_address('127.0.0.1:9100') == ('127.0.0.1', 9100)
+    assert parse_address('/run/hls/monitor.sock') == '/run/hls/monitor.sock'
+    assert parse_address('relative.sock') == 'relative.sock'
+
+
+def test_client_calls_served_service(tmp_path):
+    address = str(tmp_path / 'monitor.sock')
+    (tmp_path / 'monitor.sock').write_text('stale')  # Left behind by a previous run
+    # The poller serves from its own process, as under gunicorn
+    poller = multiprocessing.Process(target=serve_fake, args=(address,), daemon=True)
+    poller.start()
+    try:
+        client = ServiceClient(address, b'secret', connect_timeout=5)
+        assert client.get_stream('http://origin.example/a.m3u8', pinned=True) == \
+            {'url': 'http://origin.example/a.m3u8', 'pinned': True, 'calls': 1}
+        second = client.get_stream('http://origin.example/b.m3u8')
+        assert (second['pinned'], second['calls']) == (False, 2)
+
+        with pytest.raises(AttributeError):
+            client._private
+
+        # A restarted poller is picked up on the next call
+        poller.terminate()
+        poller.join(5)
+        poller = multiprocessing.Process(target=serve_fake, args=(address,), daemon=True)
+        poller.start()
+        assert client.get_stream('http://origin.example/c.m3u8')['calls'] == 1
+    finally:
+        poller.terminate()
+        poller.join(5)
+
+
+def test_client_gives_up_after_connect_timeout(tmp_path):
+    client = ServiceClient(str(tmp_path / 'missing.sock'), b'secret', connect_timeout=0.6)
+    start = time.time()
+    with pytest.raises(FileNotFoundError):
+        client.get_stream('http://origin.example/a.m3u8')
+    assert time.time() - start >= 0.5
@@ -0,0 +1,59 @@
+import os
+import time
+
+from system_sampler import SystemSampler
+
+
+def test_collect_samples_host_and_process():
+    seen = []
+    sampler = SystemSampler(interval=60, history=3, on_sample=seen.append)
+
+    sample = sampler.collect()
+    assert seen == [sample]
+    assert sample['process']['pid'] == os.getpid()
+    assert sample['process']['rss'] > 0
+    assert 0 <= sample['memory']['percent'] <= 100
+
+    second = sampler.collect()
+    assert 'recv_per_sec' in second['network'] or not second['network']
+
+
+def test_history_is_a_bounded_ring():
+    sampler = SystemSampler(interval=60, history=3)
+    for _ in range(5):
+        sampler.collect()
+
+    assert len(sampler.history()) == 3
+    assert sampler.history(seconds=3600) == sampler.history()
+    sampler.samples.get_recent()[0]['sampled_at'] = time.time() - 7200
+    assert len(sampler.history(seconds=3600)) == 2
+
+
+def test_latest_samples_inline_then_runs_in_background():
+    sampler = SystemSampler(interval=0.02, history=10)
+    try:
+        assert sampler.latest() is not None
+        deadline = time.time() + 2
+        while len(sampler.samples) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        assert len(sampler.samples) >= 3
+    finally:
+        sampler.stop()
+
+
+def test_disabled_sampler_samples_on_request_without_a_thread():
+    sampler = SystemSampler(interval=60, history=10, enabled=False)
+    first = sampler.latest()
+    assert first is not None
+    assert sampler.latest() is first
+    assert sampler._thread is None
+
+    first['sampled_at'] -= 120
+    assert sampler.latest() is not first
+    assert len(sampler.samples) == 2 and sampler._thread is None
+
+
+def test_failing_hook_keeps_the_sample():
+    sampler = SystemSampler(interval=60, on_sample=lambda sample: 1 / 0)
+    assert sampler.collect() is not None
+    assert len(sampler.samples) == 1 and sampler.errors == 0
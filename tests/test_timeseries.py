@@ -0,0 +1,65 @@
+import pytest
+
+from timeseries import TimeSeries, summarize
+
+
+def filled(capacity, count):
+    series = TimeSeries(('rate', 'error'), capacity=capacity, typecode='d')
+    for i in range(count):
+        series.append(float(i), {'rate': i * 10, 'error': 1 if i % 3 == 0 else None})
+    return series
+
+
+def test_query_before_wrap():
+    series = filled(10, 4)
+
+    result = series.query()
+    assert result['timestamp'] == [0.0, 1.0, 2.0, 3.0]
+    assert result['rate'] == [0.0, 10.0, 20.0, 30.0]
+    assert result['error'] == [1.0, None, None, 1.0]
+
+
+def test_ring_keeps_newest_in_order():
+    series = filled(5, 13)
+
+    assert len(series) == 5
+    assert series.span() == (8.0, 12.0)
+    assert series.query()['timestamp'] == [8.0, 9.0, 10.0, 11.0, 12.0]
+    # A range straddling the physical end of the arrays
+    assert series.query(start=9.5, end=11.0, columns=['rate']) == {
+        'timestamp': [10.0, 11.0], 'rate': [100.0, 110.0]
+    }
+
+
+def test_query_bounds_are_inclusive_and_thinned():
+    series = filled(100, 50)
+
+    assert series.query(start=10, end=12)['timestamp'] == [10.0, 11.0, 12.0]
+    assert series.query(start=60)['timestamp'] == []
+    assert len(series.query(max_points=10)['timestamp']) == 10
+    assert 'unknown' not in series.query(columns=['rate', 'unknown'])
+
+
+def test_aggregate_ignores_missing_values():
+    series = filled(100, 7)
+
+    assert series.aggregate('rate', start=2, end=4) == {
+        'count': 3, 'min': 20.0, 'max': 40.0, 'avg': 30.0, 'last': 40.0
+    }
+    assert series.aggregate('error')['count'] == 3
+    assert summarize([None, float('nan')])['count'] == 0
+
+
+def test_capacity_from_memory_budget():
+    series = TimeSeries(('a', 'b'), max_bytes=1600)
+    assert series.capacity == 1600 // (8 + 2 * 4)
+    series.append(1.0, {'a': 'not a number'})
+    assert series.query()['a'] == [None]
+    assert series.memory_bytes == 16
+    assert TimeSeries(('a',)).span() == (None, None)
+
+
+def test_float32_columns_round_values():
+    series = TimeSeries(('a',), capacity=4)
+    series.append(1.0, {'a': 0.1})
+    assert series.query()['a'][0] == pytest.approx(0.1, rel=1e-6)
@@ -0,0 +1,65 @@
+import http.server
+import threading
+
+import requests
+
+from transport import DNSCache, PoolStats, TrackingHTTPAdapter, origin_of, sync_pool_stats
+
+
+def test_origin_drops_default_ports():
+    assert origin_of('https://cdn.example/live/a.m3u8') == 'https://cdn.example'
+    assert origin_of('https://cdn.example:443/a.m3u8') == 'https://cdn.example'
+    assert origin_of('http://cdn.example:8080/a.m3u8') == 'http://cdn.example:8080'
+
+
+def test_dns_cache_hits_until_invalidated():
+    cache = DNSCache(ttl=60)
+    address = cache.resolve('localhost', 80)
+    assert cache.resolve('localhost', 80) == address
+    cache.invalidate('localhost', 80)
+    cache.resolve('localhost', 80)
+    assert cache.get_stats() == {'entries': 1, 'hits': 1, 'misses': 2, 'ttl': 60}
+
+
+def test_pool_stats_reuse_ratio():
+    stats = PoolStats()
+    assert stats.get_stats() == {}
+    stats.incr('http://a', 'requests', 4)
+    stats.incr('http://a', 'reused', 3)
+    stats.incr('http://a', 'wait_time', 0.123456)
+    counters = stats.get_stats()['http://a']
+    assert counters['reuse_ratio'] == 0.75 and counters['wait_time'] == 0.1235
+    assert counters['overflow'] == 0
+
+
+class Origin(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so connections can be reused
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+def test_session_counts_new_and_reused_connections():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Origin)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/segment.ts"
+    session = requests.Session()
+    session.mount('http://', TrackingHTTPAdapter())
+    try:
+        for _ in range(5):
+            assert session.get(url, timeout=5).content == b'ok'
+    finally:
+        session.close()
+        server.shutdown()
+
+    counters = sync_pool_stats.get_stats()[origin_of(url)]
+    assert counters['requests'] == 5
+    assert counters['new_connections'] == 1 and counters['reused'] == 4
+    assert counters['in_use'] == 0
@@ -0,0 +1,135 @@
+"""
+Columnar time-series store for per-stream metric history
+
+Each metric is a typed ``array`` column sharing one timestamp column, so
+a sample costs a few bytes per metric instead of a whole snapshot dict.
+Columns grow until the stream's memory budget is reached and then wrap
+as a ring. Range queries binary-search the timestamps and slice whole
+columns (at most two slices per column) rather than walking Python objects.
+"""
+
+import math
+import threading
+from array import array
+
+MISSING = float('nan')  # Stored when a sample has no value for a column
+
+
+class TimeSeries:
+    """Fixed-budget ring of float columns indexed by timestamp"""
+    def __init__(self, columns, capacity=None, max_bytes=4 * 1024 * 1024, typecode='f'):
+        self.columns = tuple(columns)
+        self.typecode = typecode
+        row_bytes = array('d').itemsize + len(self.columns) * array(typecode).itemsize
+        self.capacity = capacity or max(1, max_bytes // row_bytes)
+        self._times = array('d')
+        self._values = {name: array(typecode) for name in self.columns}
+        self._start = 0  # Physical index of the oldest sample once wrapped
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._times)
+
+    @property
+    def memory_bytes(self):
+        return len(self._times) * (self._times.itemsize + sum(
+            column.itemsize for column in self._values.values()))
+
+    def append(self, timestamp, values):
+        """Add a sample; ``values`` maps column names to numbers (missing -> NaN)"""
+        with self._lock:
+            if len(self._times) < self.capacity:
+                self._times.append(timestamp)
+                for name, column in self._values.items():
+                    column.append(_number(values.get(name)))
+            else:
+                index = self._start
+                self._times[index] = timestamp
+                for name, column in self._values.items():
+                    column[index] = _number(values.get(name))
+                self._start = (index + 1) % self.capacity
+
+    def _physical(self, logical):
+        return (self._start + logical) % len(self._times)
+
+    def _bisect(self, timestamp, right=False):
+        # First logical index whose timestamp is >= ``timestamp`` (> if right)
+        low, high = 0, len(self._times)
+        while low < high:
+            middle = (low + high) // 2
+            value = self._times[self._physical(middle)]
+            if value < timestamp or (right and value == timestamp):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _slice(self, column, low, high):
+        # Chronological slice [low, high) of a column as one array
+        if low >= high:
+            return array(column.typecode)
+        first = self._physical(low)
+        last = self._physical(high - 1)
+        if first <= last:
+            return column[first:last + 1]
+        return column[first:] + column[:last + 1]
+
+    def _bounds(self, start, end):
+        low = self._bisect(start) if start is not None else 0
+        high = self._bisect(end, right=True) if end is not None else len(self._times)
+        return low, high
+
+    def query(self, start=None, end=None, columns=None, max_points=None):
+        """Samples in [start, end] as {'timestamp': [...], column: [...]}.
+
+        ``max_points`` thins the result with a fixed stride for charting.
+        """
+        columns = self.columns if columns is None else [name for name in columns if name in self._values]
+        with self._lock:
+            low, high = self._bounds(start, end)
+            result = {'timestamp': self._slice(self._times, low, high)}
+            for name in columns:
+                result[name] = self._slice(self._values[name], low, high)
+
+        step = max(1, -(-len(result['timestamp']) // max_points)) if max_points else 1
+        return {
+            name: [None if value != value else value for value in column[::step]]
+            for name, column in result.items()
+        }
+
+    def aggregate(self, column, start=None, end=None):
+        """count/min/max/avg/last over [start, end], ignoring missing values"""
+        with self._lock:
+            low, high = self._bounds(start, end)
+            values = self._slice(self._values[column], low, high)
+        return summarize(values)
+
+    def span(self):
+        """(oldest, newest) timestamps, or (None, None) when empty"""
+        with self._lock:
+            if not self._times:
+                return None, None
+            return self._times[self._physical(0)], self._times[self._physical(len(self._times) - 1)]
+
+
+def summarize(values):
+    """count/min/max/avg/last of a column, ignoring missing values (None or NaN)"""
+    present = [value for value in values if value is not None and value == value]
+    if not present:
+        return {'count': 0, 'min': None, 'max': None, 'avg': None, 'last': None}
+    return {
+        'count': len(present),
+        'min': min(present),
+        'max': max(present),
+        'avg': math.fsum(present) / len(present),
+        'last': present[-1]
+    }
+
+
+def _number(value):
+    if value is None:
+        return MISSING
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return MISSING
@@ -0,0 +1,304 @@
+"""
+HTTP transport instrumentation for HLS Stream Monitor
+
+Connection pools with per-origin limits, a TTL cache for DNS lookups and
+pool utilisation metrics (requests, new connections vs reuse, in use,
+waits, pool overflow) for both the pooled requests session and the
+aiohttp fetch engine. HTTP/2 is used for HTTPS origins when the optional
+``httpx[http2]`` package is installed and HTTP2_ENABLED is set in the config.
+"""
+
+import time
+import socket
+import threading
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+try:
+    import httpx
+    import h2  # noqa: F401  (httpx needs it for http2=True)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTP2_AVAILABLE = False
+
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def origin_key(scheme, host, port=None):
+    """scheme://host[:port], the port only when it isn't the scheme's default"""
+    if port and port != DEFAULT_PORTS.get(scheme):
+        return f"{scheme}://{host}:{port}"
+    return f"{scheme}://{host}"
+
+
+def origin_of(url):
+    """Origin of a URL, the key for per-origin limits and stats"""
+    parsed = urlparse(url)
+    return origin_key(parsed.scheme, parsed.hostname, parsed.port)
+
+
+class DNSCache:
+    """getaddrinfo results cached for a fixed TTL (the resolver's TTL isn't visible)"""
+    def __init__(self, ttl=60, maxsize=1000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host, port):
+        """First address for ``host`` (an IP string), resolving on a miss"""
+        key = (host, port)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        address = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0][4][0]
+        with self._lock:
+            if len(self._entries) >= self.maxsize:
+                self._entries.clear()
+            self._entries[key] = (address, now + self.ttl)
+        return address
+
+    def invalidate(self, host, port):
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+    def get_stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses, 'ttl': self.ttl}
+
+
+class PoolStats:
+    """Per-origin connection pool counters"""
+    FIELDS = ('requests', 'new_connections', 'reused', 'in_use', 'waits', 'wait_time', 'overflow', 'http2')
+
+    def __init__(self):
+        self._origins = {}
+        self._lock = threading.Lock()
+
+    def incr(self, origin, field, amount=1):
+        with self._lock:
+            counters = self._origins.get(origin)
+            if counters is None:
+                counters = self._origins[origin] = dict.fromkeys(self.FIELDS, 0)
+            counters[field] += amount
+
+    def get_stats(self):
+        with self._lock:
+            origins = {origin: dict(counters) for origin, counters in self._origins.items()}
+        for counters in origins.values():
+            counters['wait_time'] = round(counters['wait_time'], 4)
+            requests = counters['requests']
+            counters['reuse_ratio'] = round(counters['reused'] / requests, 4) if requests else None
+        return origins
+
+
+# Shared by every pool of the requests session
+dns_cache = DNSCache()
+sync_pool_stats = PoolStats()
+
+
+class _TrackedConnectionMixin:
+    def _new_conn(self):
+        # Connect to a cached address; Host header and SNI still use self.host
+        host = self._dns_host
+        try:
+            self._dns_host = dns_cache.resolve(host, self.port)
+        except OSError:
+            self._dns_host = host  # Let urllib3 resolve and report the error
+        try:
+            sock = super()._new_conn()
+        except Exception:
+            dns_cache.invalidate(host, self.port)
+            raise
+        finally:
+            self._dns_host = host
+        sync_pool_stats.incr(self._origin, 'new_connections')
+        return sock
+
+
+class TrackedHTTPConnection(_TrackedConnectionMixin, HTTPConnection):
+    @property
+    def _origin(self):
+        return origin_key('http', self.host, self.port)
+
+
+class TrackedHTTPSConnection(_TrackedConnectionMixin, HTTPSConnection):
+    @property
+    def _origin(self):
+        return origin_key('https', self.host, self.port)
+
+
+class _TrackedPoolMixin:
+    def _get_conn(self, timeout=None):
+        origin = origin_key(self.scheme, self.host, self.port)
+        start = time.perf_counter()
+        conn = super()._get_conn(timeout)
+        waited = time.perf_counter() - start
+        sync_pool_stats.incr(origin, 'requests')
+        sync_pool_stats.incr(origin, 'in_use')
+        if conn.sock is not None:
+            sync_pool_stats.incr(origin, 'reused')
+        if waited > 0.001:
+            # Only a blocking pool at its limit makes a caller wait
+            sync_pool_stats.incr(origin, 'waits')
+            sync_pool_stats.incr(origin, 'wait_time', waited)
+        return conn
+
+    def _put_conn(self, conn):
+        origin = origin_key(self.scheme, self.host, self.port)
+        sync_pool_stats.incr(origin, 'in_use', -1)
+        if conn is not None and self.pool is not None and self.pool.full():
+            # A non-blocking pool at its limit closes this connection
+            sync_pool_stats.incr(origin, 'overflow')
+        super()._put_conn(conn)
+
+
+class TrackedHTTPConnectionPool(_TrackedPoolMixin, HTTPConnectionPool):
+    ConnectionCls = TrackedHTTPConnection
+
+
+class TrackedHTTPSConnectionPool(_TrackedPoolMixin, HTTPSConnectionPool):
+    ConnectionCls = TrackedHTTPSConnection
+
+
+class TrackingHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools use the DNS cache and report pool stats"""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TrackedHTTPConnectionPool,
+            'https': TrackedHTTPSConnectionPool
+        }
+
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)  # Retried by both the pooled session and the HTTP/2 client
+
+
+def create_http2_client(max_connections, timeout=(5, 10), retries=3, stats=None, verify=False):
+    """httpx client negotiating HTTP/2 via ALPN, or None when httpx[http2] is missing.
+
+    Requests through it count into ``stats`` (default: sync_pool_stats)
+    like the pooled session's; it resolves names itself, without the DNS cache.
+    """
+    if not HTTP2_AVAILABLE:
+        return None
+    transport = httpx.HTTPTransport(
+        http2=True,
+        verify=verify,  # Off by default for HLS streams (config.VERIFY_SSL)
+        retries=retries,  # Connect failures; status retries are up to the caller
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    )
+    return httpx.Client(
+        transport=_TrackedHTTPXTransport(transport, stats or sync_pool_stats),
+        follow_redirects=True,
+        timeout=httpx_timeout(timeout)
+    )
+
+
+if HTTP2_AVAILABLE:
+    class _ReleasingStream(httpx.SyncByteStream):
+        """Response body that runs ``release`` once when closed"""
+        def __init__(self, stream, release):
+            self._stream = stream
+            self._release = release
+
+        def __iter__(self):
+            yield from self._stream
+
+        def close(self):
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+            self._stream.close()
+
+    class _TrackedHTTPXTransport(httpx.BaseTransport):
+        """Counts requests, new vs reused connections and HTTP/2 use into a PoolStats.
+
+        in_use counts open responses; on HTTP/2 several share one connection.
+        """
+        def __init__(self, transport, stats):
+            self._transport = transport
+            self._stats = stats
+
+        def handle_request(self, request):
+            origin = origin_key(request.url.scheme, request.url.host, request.url.port)
+            connected = []
+
+            def trace(event, info):
+                if event == 'connection.connect_tcp.complete':
+                    connected.append(event)
+
+            request.extensions = dict(request.extensions, trace=trace)
+            stats = self._stats
+            stats.incr(origin, 'requests')
+            stats.incr(origin, 'in_use')
+            try:
+                response = self._transport.handle_request(request)
+            except Exception:
+                stats.incr(origin, 'in_use', -1)
+                raise
+            stats.incr(origin, 'new_connections' if connected else 'reused')
+            if response.extensions.get('http_version') == b'HTTP/2':
+                stats.incr(origin, 'http2')
+            response.stream = _ReleasingStream(response.stream, lambda: stats.incr(origin, 'in_use', -1))
+            return response
+
+        def close(self):
+            self._transport.close()
+
+
+def httpx_timeout(timeout):
+    """requests-style (connect, read) tuple or number -> httpx.Timeout"""
+    if isinstance(timeout, tuple):
+        return httpx.Timeout(timeout[1], connect=timeout[0])
+    return httpx.Timeout(timeout)
+
+
+def aiohttp_trace_config(stats):
+    """aiohttp TraceConfig feeding a PoolStats (requests, queueing, new vs reused)"""
+    import aiohttp
+
+    def origin(params):
+        return origin_of(str(params.url))
+
+    async def on_request_start(session, context, params):
+        context.origin = origin(params)
+        stats.incr(context.origin, 'requests')
+        stats.incr(context.origin, 'in_use')
+
+    async def on_request_done(session, context, params):
+        stats.incr(context.origin, 'in_use', -1)
+
+    async def on_queued_start(session, context, params):
+        context.queued_at = time.perf_counter()
+
+    async def on_queued_end(session, context, params):
+        stats.incr(context.origin, 'waits')
+        stats.incr(context.origin, 'wait_time', time.perf_counter() - context.queued_at)
+
+    async def on_create_end(session, context, params):
+        stats.incr(context.origin, 'new_connections')
+
+    async def on_reuse(session, context, params):
+        stats.incr(context.origin, 'reused')
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_done)
+    trace.on_request_exception.append(on_request_done)
+    trace.on_connection_queued_start.append(on_queued_start)
+    trace.on_connection_queued_end.append(on_queued_end)
+    trace.on_connection_create_end.append(on_create_end)
+    trace.on_connection_reuseconn.append(on_reuse)
+    return trace
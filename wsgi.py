@@ -0,0 +1,10 @@
+"""
+WSGI entry point for HLS Stream Monitor
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+With gunicorn.conf.py the workers run as 'web' processes reading from one
+poller process; without it each process polls on its own (HLS_ROLE=all).
+"""
+
+from app import app